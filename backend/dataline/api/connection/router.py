@@ -15,6 +15,8 @@ from dataline.models.connection.schema import (
     GetConnectionOut,
     SampleOut,
 )
+from dataline.models.query_cache.schema import QueryCacheOut
+from dataline.models.table_profile.schema import TableProfileOut
 from dataline.old_models import SuccessListResponse, SuccessResponse
 from dataline.repositories.base import AsyncSession, get_session
 from dataline.services.connection import ConnectionService
@@ -81,6 +83,12 @@ async def connect_db_from_file(
         connection = await connection_service.create_sas7bdat_connection(session, file, name)
         return SuccessResponse(data=connection)
 
+    elif type == FileConnectionType.duckdb:
+        # Load CSV or Parquet into a DuckDB database and create connection
+        connection = await connection_service.create_duckdb_connection(session, file, name)
+        return SuccessResponse(data=connection)
+
+
 @router.get("/connection/{connection_id}")
 async def get_connection(
     connection_id: UUID,
@@ -138,6 +146,46 @@ async def update_connection(
     )
 
 
+@router.get("/connection/{connection_id}/profiles")
+async def get_connection_profiles(
+    connection_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    connection_service: ConnectionService = Depends(ConnectionService),
+) -> SuccessListResponse[TableProfileOut]:
+    profiles = await connection_service.get_table_profiles(session, connection_id)
+    return SuccessListResponse(data=profiles)
+
+
+@router.post("/connection/{connection_id}/profiles")
+async def refresh_connection_profiles(
+    connection_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    connection_service: ConnectionService = Depends(ConnectionService),
+) -> SuccessListResponse[TableProfileOut]:
+    profiles = await connection_service.refresh_table_profiles(session, connection_id)
+    return SuccessListResponse(data=profiles)
+
+
+@router.get("/connection/{connection_id}/query-cache")
+async def get_connection_query_cache(
+    connection_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    connection_service: ConnectionService = Depends(ConnectionService),
+) -> SuccessListResponse[QueryCacheOut]:
+    entries = await connection_service.get_query_cache(session, connection_id)
+    return SuccessListResponse(data=entries)
+
+
+@router.delete("/connection/{connection_id}/query-cache")
+async def clear_connection_query_cache(
+    connection_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    connection_service: ConnectionService = Depends(ConnectionService),
+) -> SuccessResponse[None]:
+    await connection_service.clear_query_cache(session, connection_id)
+    return SuccessResponse()
+
+
 @router.get("/samples")
 async def get_sample_connections() -> SuccessListResponse[SampleOut]:
     return SuccessListResponse(
@@ -1,11 +1,13 @@
+import asyncio
 import logging
+from datetime import date
 from typing import Annotated, AsyncGenerator
 from uuid import UUID
 
-from fastapi import APIRouter, Body, Depends
-from fastapi.responses import StreamingResponse
-from langchain_community.utilities.sql_database import SQLDatabase
+from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
+from dataline.errors import UserFacingError
 from dataline.models.conversation.schema import (
     ConversationOut,
     ConversationWithMessagesWithResultsOut,
@@ -13,14 +15,20 @@ from dataline.models.conversation.schema import (
     UpdateConversationRequest,
 )
 from dataline.models.llm_flow.schema import SQLQueryRunResult
-from dataline.models.message.schema import MessageOptions, MessageWithResultsOut
-from dataline.models.result.schema import ResultOut
+from dataline.models.message.schema import (
+    MessageOptions,
+    MessageWithResultsOut,
+    TokenUsageOut,
+)
+from dataline.models.result.schema import ConversationChartRefreshOut, ResultOut
 from dataline.old_models import SuccessListResponse, SuccessResponse
 from dataline.repositories.base import AsyncSession, get_session
 from dataline.services.connection import ConnectionService
 from dataline.services.conversation import ConversationService
-from dataline.services.llm_flow.toolkit import execute_sql_query
-from dataline.utils.utils import generate_with_errors
+from dataline.services.export import ARROW_STREAM_MEDIA_TYPE, accepts_arrow, encode_arrow_result, require_pyarrow
+from dataline.services.llm_flow.query_execution import RunException
+from dataline.services.result import ResultService, run_sql_query
+from dataline.utils.utils import cancel_on_disconnect, generate_with_errors
 
 logger = logging.getLogger(__name__)
 
@@ -95,16 +103,30 @@ async def delete_conversation(
     return await conversation_service.delete_conversation(session, conversation_id)
 
 
+@router.get("/usage")
+async def get_token_usage(
+    connection_id: UUID | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    session: AsyncSession = Depends(get_session),
+    conversation_service: ConversationService = Depends(),
+) -> SuccessListResponse[TokenUsageOut]:
+    """OpenAI token usage and cost per connection and day, start and end dates included."""
+    usage = await conversation_service.get_token_usage(session, connection_id=connection_id, start=start, end=end)
+    return SuccessListResponse(data=usage)
+
+
 @router.post("/conversation/{conversation_id}/query")
 def query(
     conversation_id: UUID,
     query: str,
     message_options: Annotated[MessageOptions, Body(embed=True)],
+    use_cache: bool = True,
     session: AsyncSession = Depends(get_session),
     conversation_service: ConversationService = Depends(),
 ):
     response_generator = conversation_service.query(
-        session, conversation_id, query, secure_data=message_options.secure_data
+        session, conversation_id, query, secure_data=message_options.secure_data, use_cache=use_cache
     )
     return StreamingResponse(
         generate_with_errors(response_generator),
@@ -112,17 +134,36 @@ def query(
     )
 
 
-@router.get("/conversation/{conversation_id}/run-sql")
+@router.post("/conversation/{conversation_id}/refresh-charts")
+async def refresh_conversation_charts(
+    conversation_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    conversation_service: ConversationService = Depends(ConversationService),
+    result_service: ResultService = Depends(ResultService),
+) -> SuccessListResponse[ConversationChartRefreshOut]:
+    # Will raise error that's auto captured by middleware if not exists
+    await conversation_service.get_conversation(session, conversation_id=conversation_id)
+    charts = await result_service.refresh_conversation_charts(session, conversation_id)
+    return SuccessListResponse(data=charts)
+
+
+@router.get("/conversation/{conversation_id}/run-sql", response_model=SuccessResponse[ResultOut])
 async def execute_sql(
+    request: Request,
     conversation_id: UUID,
     sql: str,
     linked_id: UUID,
-    limit: int = 10,
+    limit: int | None = Query(default=None, ge=1),
     execute: bool = True,
     session: AsyncSession = Depends(get_session),
     conversation_service: ConversationService = Depends(ConversationService),
     connection_service: ConnectionService = Depends(ConnectionService),
-) -> SuccessResponse[ResultOut]:
+) -> SuccessResponse[ResultOut] | Response:
+    """Rows are sent as Arrow IPC instead of JSON if requested with Accept: application/vnd.apache.arrow.stream"""
+    arrow = accepts_arrow(request.headers.get("accept"))
+    if arrow:
+        require_pyarrow()
+
     # Get conversation
     # Will raise error that's auto captured by middleware if not exists
     conversation = await conversation_service.get_conversation(session, conversation_id=conversation_id)
@@ -131,19 +172,32 @@ async def execute_sql(
     connection_id = conversation.connection_id
     connection = await connection_service.get_connection(session, connection_id)
 
-    # Refresh chart data
-    db = SQLDatabase.from_uri(connection.dsn)
-    query_run_data = execute_sql_query(
-        db,
-        sql,
-    )
+    try:
+        query_run_data = await cancel_on_disconnect(
+            request,
+            run_sql_query(
+                connection.dsn, sql, statement_timeout_seconds=connection.statement_timeout_seconds, limit=limit
+            ),
+        )
+    except RunException as e:
+        # ex. the statement timeout, or a query writing to the read only database
+        raise UserFacingError(e.message)
 
     # Execute query
     result = SQLQueryRunResult(
         columns=query_run_data.columns,
         rows=query_run_data.rows,
+        truncated=query_run_data.truncated,
+        total_rows_estimate=query_run_data.total_rows_estimate,
         for_chart=False,
         linked_id=linked_id,
     )
-
-    return SuccessResponse(data=result.serialize_result())
+    serialized = result.serialize_result()
+
+    if arrow:
+        content = dict(serialized.content)
+        columns, rows = content.pop("columns"), content.pop("rows")
+        metadata = {**serialized.model_dump(mode="json", exclude={"content"}), "content": content}
+        body = await asyncio.to_thread(encode_arrow_result, columns, rows, metadata)
+        return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE)
+    return SuccessResponse(data=serialized)
@@ -2,11 +2,15 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import APIRouter, Body, Depends
+from fastapi.responses import StreamingResponse
 
-from dataline.models.result.schema import ChartRefreshOut
-from dataline.old_models import SuccessResponse
+from dataline.models.result.schema import ChartRefreshOut, ExportFormat
+from dataline.models.schedule.schema import ScheduleIn, ScheduleOut
+from dataline.old_models import SuccessListResponse, SuccessResponse
 from dataline.repositories.base import AsyncSession, get_session
+from dataline.services.export import EXPORT_MEDIA_TYPES
 from dataline.services.result import ResultService
+from dataline.services.scheduler import ScheduleService
 
 router = APIRouter(tags=["results"])
 
@@ -33,3 +37,48 @@ async def refresh_chart_result_data(
 ) -> SuccessResponse[ChartRefreshOut]:
     chart_data = await result_service.refresh_chart_result_data(session, chart_id=result_id)
     return SuccessResponse(data=chart_data)
+
+
+@router.get("/result/{result_id}/export")
+async def export_result(
+    result_id: UUID,
+    format: ExportFormat = ExportFormat.csv,
+    session: AsyncSession = Depends(get_session),
+    result_service: ResultService = Depends(ResultService),
+) -> StreamingResponse:
+    chunks = await result_service.export_result(session, result_id, format)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="result-{result_id}.{format.value}"'},
+    )
+
+
+@router.get("/schedules")
+async def get_schedules(
+    session: AsyncSession = Depends(get_session),
+    schedule_service: ScheduleService = Depends(ScheduleService),
+) -> SuccessListResponse[ScheduleOut]:
+    schedules = await schedule_service.get_schedules(session)
+    return SuccessListResponse(data=schedules)
+
+
+@router.put("/result/{result_id}/schedule")
+async def set_result_schedule(
+    result_id: UUID,
+    schedule_in: ScheduleIn,
+    session: AsyncSession = Depends(get_session),
+    schedule_service: ScheduleService = Depends(ScheduleService),
+) -> SuccessResponse[ScheduleOut]:
+    schedule = await schedule_service.set_schedule(session, result_id, schedule_in)
+    return SuccessResponse(data=schedule)
+
+
+@router.delete("/result/{result_id}/schedule")
+async def delete_result_schedule(
+    result_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    schedule_service: ScheduleService = Depends(ScheduleService),
+) -> SuccessResponse[None]:
+    await schedule_service.delete_schedule(session, result_id)
+    return SuccessResponse()
@@ -3,7 +3,7 @@ import base64
 from fastapi import APIRouter, Depends, HTTPException, UploadFile
 
 from dataline.models.user.schema import AvatarOut, UserOut, UserUpdateIn
-from dataline.old_models import SuccessResponse
+from dataline.old_models import SuccessListResponse, SuccessResponse
 from dataline.repositories.base import AsyncSession, get_session
 from dataline.services.settings import SettingsService
 
@@ -49,3 +49,11 @@ async def get_info(
 ) -> SuccessResponse[UserOut]:
     user_info = await settings_service.get_user_info(session)
     return SuccessResponse(data=user_info)
+
+
+@router.get("/models")
+async def get_models(
+    settings_service: SettingsService = Depends(SettingsService), session: AsyncSession = Depends(get_session)
+) -> SuccessListResponse[str]:
+    models = await settings_service.get_available_models(session)
+    return SuccessListResponse(data=models)
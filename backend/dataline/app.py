@@ -1,20 +1,23 @@
 import logging
-from typing import Any, AsyncContextManager, Callable, Mapping, Self
+import time
+from typing import Any, AsyncContextManager, Awaitable, Callable, Mapping, Self
 
 import fastapi
 from fastapi import Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from dataline.api.auth.router import router as auth_router
 from dataline.api.connection.router import router as connection_router
 from dataline.api.conversation.router import router as conversation_router
+from dataline.api.metrics.router import router as metrics_router
 from dataline.api.result.router import router as result_router
 from dataline.api.settings.router import router as settings_router
 from dataline.auth import authenticate
 from dataline.config import config
 from dataline.errors import UserFacingError, ValidationError
 from dataline.repositories.base import NotFoundError, NotUniqueError
+from dataline.utils.metrics import HTTP_REQUEST_DURATION
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,24 @@ def handle_exceptions(request: Request, e: Exception) -> JSONResponse:
     return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"message": str(e)})
 
 
+async def record_request_metrics(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    start = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Route template rather than the path, to keep one series per endpoint
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code),
+        )
+
+
 class App(fastapi.FastAPI):
     def __init__(  # type: ignore[misc]
         self,
@@ -59,6 +80,10 @@ class App(fastapi.FastAPI):
         self.include_router(conversation_router, dependencies=common_dependencies)
         self.include_router(result_router, dependencies=common_dependencies)
 
+        if config.metrics_enabled:
+            self.middleware("http")(record_request_metrics)
+            self.include_router(metrics_router, dependencies=common_dependencies)
+
         # Handle 500s separately to play well with TestClient and allow re-raising in tests
         self.add_exception_handler(NotFoundError, handle_exceptions)
         self.add_exception_handler(NotUniqueError, handle_exceptions)
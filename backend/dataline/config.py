@@ -1,5 +1,6 @@
 import sys
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -26,18 +27,92 @@ class Config(BaseSettings):
     # This is where all uploaded files are stored (ex. uploaded sqlite DBs)
     data_directory: str = str(Path(USER_DATA_DIR) / "data")
 
+    # Post-ingestion optimization of uploaded files converted to SQLite (CSV, sas7bdat)
+    ingest_max_indexes: int = 8
+    ingest_vacuum: bool = False
+
+    # Column profiles (null fraction, distinct count, ranges, top values) of connected databases.
+    # They contain data values so they are only given to the model when not in secure mode.
+    inject_column_profiles: bool = True
+    profile_sample_rows: int = 100_000
+    profile_max_tables: int = 50
+    # Rows are counted up to this number, bigger tables take the row estimate of the query plan
+    profile_max_count_rows: int = 1_000_000
+    profile_top_k: int = 5
+    profile_histogram_bins: int = 10
+
+    # Background refresh of scheduled SQL query and chart results
+    scheduler_enabled: bool = True
+    scheduler_poll_seconds: int = 30
+    scheduler_min_interval_seconds: int = 60
+    scheduler_jitter_fraction: float = 0.1
+    scheduler_max_concurrency_per_connection: int = 2
+    # Concurrent queries when refreshing all the charts of a conversation
+    chart_refresh_concurrency: int = 4
+    # Queries on target databases are stopped after this time, unless set per connection (0 disables the timeout)
+    statement_timeout_seconds: int = 300
+    # Agent generated queries are checked for syntax errors and unknown tables or columns before they are run,
+    # optionally by EXPLAINing them on the database too
+    query_validation_enabled: bool = True
+    query_validation_explain: bool = False
+    # Agent generated queries are EXPLAINed first and sent back for a rewrite when the database estimates they process
+    # more rows, or cost more (in the unit of the database, ex. bytes scanned on Snowflake), than allowed. 0 disables
+    query_plan_check_enabled: bool = True
+    query_plan_max_rows: int = 100_000_000
+    query_plan_max_cost: float = 0
+    # Only single read statements are run on target databases, in read only sessions where the database supports it
+    read_only_queries: bool = True
+    # Rows read and written at a time when exporting the full results of a query
+    export_chunk_rows: int = 10_000
+    # Queries are rewritten to return at most this many rows, the total is estimated from the query plan when possible
+    query_max_rows: int = 1000
+    # Chart queries have a higher cap, their data is downsampled to chart_max_points when queried
+    chart_query_max_rows: int = 100_000
+
+    # Stored results larger than storage_compression_min_bytes are compressed ("zlib", or "zstd" if zstandard is
+    # installed). Compressed ones still larger than storage_blob_min_bytes go to a blob store in the data directory
+    storage_compression: Literal["zlib", "zstd"] = "zlib"
+    storage_compression_level: int = 6
+    storage_compression_min_bytes: int = 4096
+    storage_blob_min_bytes: int = 256 * 1024
+
     sample_dvdrental_path: str = str(Path(__file__).parent.parent / "samples" / "dvd_rental.sqlite3")
     sample_netflix_path: str = str(Path(__file__).parent.parent / "samples" / "netflix.sqlite3")
     sample_titanic_path: str = str(Path(__file__).parent.parent / "samples" / "titanic.sqlite3")
     sample_spotify_path: str = str(Path(__file__).parent.parent / "samples" / "spotify.sqlite3")
 
     default_model: str = "gpt-3.5-turbo"
+    # Models available to an OpenAI key are cached, listing them is a network call to OpenAI
+    openai_models_cache_ttl_seconds: int = 600
+    # Conversation memory: older messages are folded into a rolling summary, recent ones are replayed verbatim
+    summarize_history: bool = True
+    history_recent_messages: int = 4
+    history_max_messages: int = 10
+    # Opening questions asked before reuse their SQL instead of calling the LLM, after normalization (case, punctuation).
+    # Entries are dropped when the schema fingerprint of the connection changes.
+    query_cache_enabled: bool = True
+    # Also reuse the SQL of questions with the same words in another order or with other stopwords,
+    # and a rapidfuzz similarity (out of 100) of at least query_cache_min_similarity
+    query_cache_fuzzy_matching: bool = False
+    query_cache_min_similarity: float = 95
+    query_cache_fingerprint_ttl_seconds: int = 300
+    # Chart configs are built locally, set to True to have the LLM design them instead (one more call per chart)
+    llm_chart_generation: bool = False
+    # Line charts are downsampled (LTTB) and bar/doughnut charts bucket their smallest categories into "Other"
+    chart_max_points: int = 1000
+    chart_max_categories: int = 30
     templates_path: Path = Path(__file__).parent.parent / "templates"
     assets_path: Path = Path(__file__).parent.parent / "assets"
 
     environment: str = EnvironmentType.development if not IS_BUNDLED else EnvironmentType.production
     release: str | None = None
 
+    # Prometheus metrics served at /metrics. Stage timings (LLM calls, tool calls, SQL queries...) are recorded
+    # for a metrics_sample_rate fraction of the calls, the Sentry traces_sample_rate when Sentry is enabled
+    metrics_enabled: bool = True
+    metrics_sample_rate: float = 1.0
+    sentry_traces_sample_rate: float = 1.0
+
     # HTTP Basic Authentication
     auth_username: str | None = None
     auth_password: str | None = None
@@ -1,7 +1,11 @@
+import asyncio
 import json
 import logging
+import re
 import socket
+import sqlite3
 import sys
+import time
 import webbrowser
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -12,23 +16,68 @@ from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from alembic import command
-from alembic.config import Config
 from dataline.app import App
 from dataline.config import IS_BUNDLED, config
 from dataline.old_models import SuccessResponse
 from dataline.sentry import maybe_init_sentry
+from dataline.services.result import delete_unreferenced_result_blobs
+from dataline.services.scheduler import run_scheduler
 
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
 
-def run_migrations() -> None:
+REVISION_PATTERN = re.compile(r'^(revision|down_revision)\b[^=]*=\s*(?:"(\w+)"|None)', re.MULTILINE)
+
+
+def get_alembic_ini_path() -> Path:
     if IS_BUNDLED:
-        path = Path(__file__).parent / "alembic.ini"
-    else:
-        path = Path(__file__).parent.parent / "alembic.ini"
+        return Path(__file__).parent / "alembic.ini"
+    return Path(__file__).parent.parent / "alembic.ini"
+
+
+def get_head_revision(versions_path: Path) -> str | None:
+    """
+    Head revision of the packaged migrations, read from the revision files without importing them.
+    None if it can't be determined (ex. several heads), Alembic will figure it out.
+    """
+    revisions: set[str] = set()
+    down_revisions: set[str] = set()
+    for revision_file in versions_path.glob("*.py"):
+        for name, revision in REVISION_PATTERN.findall(revision_file.read_text()):
+            if revision:
+                (revisions if name == "revision" else down_revisions).add(revision)
+
+    heads = revisions - down_revisions
+    return heads.pop() if len(heads) == 1 else None
+
+
+def get_database_revision(sqlite_path: str) -> str | None:
+    if not Path(sqlite_path).exists():
+        return None
+
+    try:
+        conn = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT version_num FROM alembic_version").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def run_migrations() -> None:
+    path = get_alembic_ini_path()
+    head_revision = get_head_revision(path.parent / "alembic" / "versions")
+    if head_revision is not None and head_revision == get_database_revision(config.sqlite_path):
+        logger.info(f"Database is up to date (revision {head_revision}), skipping migrations")
+        return
+
+    # Only needed when there is something to migrate, alembic is slow to import
+    from alembic import command
+    from alembic.config import Config
 
     alembic_cfg = Config(path)
     loc = alembic_cfg.get_main_option("script_location")
@@ -47,16 +96,43 @@ def run_migrations() -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    # On startup
+    # On startup, timing each phase
+    timings: dict[str, float] = {}
+    start = phase_start = time.perf_counter()
+
+    def end_phase(name: str) -> None:
+        nonlocal phase_start
+        now = time.perf_counter()
+        timings[name] = now - phase_start
+        phase_start = now
+
     # Create data directory if not exists
     Path(config.data_directory).mkdir(parents=True, exist_ok=True)
+    end_phase("data_directory")
     if IS_BUNDLED or config.spa_mode:
         run_migrations()
+        end_phase("migrations")
         webbrowser.open("http://localhost:7377", new=2)
+        end_phase("browser")
 
     await maybe_init_sentry()
+    end_phase("sentry")
+    scheduler_task = asyncio.create_task(run_scheduler()) if config.scheduler_enabled else None
+    end_phase("scheduler")
+    # In the background, results are only deleted with their conversation so there is no hurry
+    blob_cleanup_task = asyncio.create_task(delete_unreferenced_result_blobs())
+    logger.info(
+        f"Startup took {time.perf_counter() - start:.3f}s ("
+        + ", ".join(f"{name}: {seconds:.3f}s" for name, seconds in timings.items())
+        + ")"
+    )
     yield
     # On shutdown
+    background_tasks = [task for task in (scheduler_task, blob_cleanup_task) if task is not None]
+    for task in background_tasks:
+        task.cancel()
+    # Wait for the tasks to unwind, they may be closing sessions or connections
+    await asyncio.gather(*background_tasks, return_exceptions=True)
 
 
 app = App(lifespan=lifespan)
@@ -3,7 +3,10 @@ from dataline.models.connection.model import ConnectionModel
 from dataline.models.conversation.model import ConversationModel
 from dataline.models.media.model import MediaModel
 from dataline.models.message.model import MessageModel
+from dataline.models.query_cache.model import QueryCacheModel
 from dataline.models.result.model import ResultModel
+from dataline.models.schedule.model import ScheduleModel
+from dataline.models.table_profile.model import TableProfileModel
 from dataline.models.user.model import UserModel
 
 __all__ = [
@@ -12,6 +15,9 @@ __all__ = [
     "ConversationModel",
     "MediaModel",
     "MessageModel",
+    "QueryCacheModel",
     "ResultModel",
+    "ScheduleModel",
+    "TableProfileModel",
     "UserModel",
 ]
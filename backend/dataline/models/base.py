@@ -1,10 +1,12 @@
 import uuid
 from uuid import UUID
 
-from sqlalchemy import MetaData
+from sqlalchemy import Dialect, MetaData, Text, TypeDecorator
 from sqlalchemy import Uuid as DB_UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column
 
+from dataline.utils.storage import decode_payload, encode_payload
+
 
 class DBModel(MappedAsDataclass, DeclarativeBase, init=False, kw_only=True):
     __abstract__ = True
@@ -45,5 +47,21 @@ class CustomUUIDType(DB_UUID):  # type: ignore
             return None
 
 
+class CompressedText(TypeDecorator[str]):
+    """
+    Text column for large payloads: stored compressed, or as a reference to the blob store for the largest ones.
+    Values stored as plain text (small ones, or written before compression) are read as is.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect: Dialect) -> str | bytes | None:
+        return encode_payload(value) if value is not None else None
+
+    def process_result_value(self, value: str | bytes | None, dialect: Dialect) -> str | None:
+        return decode_payload(value) if value is not None else None
+
+
 class UUIDMixin(MappedAsDataclass, init=False, kw_only=True):
     id: Mapped[UUID] = mapped_column("id", CustomUUIDType, primary_key=True, insert_default=uuid.uuid4, init=False)
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, String
+from sqlalchemy import Boolean, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from dataline.models.base import DBModel, UUIDMixin
@@ -16,6 +16,8 @@ class ConnectionModel(DBModel, UUIDMixin, kw_only=True):
     name: Mapped[str | None] = mapped_column("name", String)
     dialect: Mapped[str | None] = mapped_column("dialect", String)
     is_sample: Mapped[bool] = mapped_column("is_sample", Boolean, nullable=False, default=False, server_default="false")
+    # Null to use the default statement timeout, 0 for no timeout
+    statement_timeout_seconds: Mapped[int | None] = mapped_column("statement_timeout_seconds", Integer, nullable=True)
 
     # Relationships
     conversations: Mapped[list["ConversationModel"]] = relationship("ConversationModel", back_populates="connection")
@@ -17,6 +17,7 @@ class Connection(BaseModel):
     database: str
     dialect: str
     is_sample: bool
+    statement_timeout_seconds: Optional[int] = None
 
 
 class ConnectionOut(Connection):
@@ -80,9 +81,9 @@ class SampleOut(BaseModel):
 
 def validate_dsn(value: str) -> str:
     # Regular expression pattern for matching DSNs
-    # Try sqlite first
-    sqlite_pattern = r"^sqlite://(/.+?)(:(.+))?$"
-    if re.match(sqlite_pattern, value):
+    # Try file based databases first (sqlite, duckdb)
+    file_db_pattern = r"^(sqlite|duckdb)://(/.+?)(:(.+))?$"
+    if re.match(file_db_pattern, value):
         return value
 
     dsn_pattern = (
@@ -133,6 +134,8 @@ class ConnectRequest(BaseModel):
 class ConnectionUpdateIn(BaseModel):
     name: Optional[str] = None
     dsn: Optional[str] = None
+    # Set to null to go back to the default timeout
+    statement_timeout_seconds: Optional[int] = Field(default=None, ge=0)
 
     @field_validator("dsn")
     def validate_dsn_format(cls, value: str) -> str:
@@ -143,6 +146,8 @@ class FileConnectionType(Enum):
     sqlite = "sqlite"
     csv = "csv"
     sas7bdat = "sas7bdat"
+    # CSV or Parquet file loaded into a DuckDB database for faster analytical queries
+    duckdb = "duckdb"
 
 
 class SampleName(Enum):
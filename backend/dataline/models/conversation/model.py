@@ -4,7 +4,7 @@ from uuid import UUID
 
 from dataline.models.base import DBModel, UUIDMixin
 from dataline.models.connection.model import ConnectionModel
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 if TYPE_CHECKING:
@@ -16,6 +16,10 @@ class ConversationModel(DBModel, UUIDMixin, kw_only=True):
     connection_id: Mapped[UUID] = mapped_column(ForeignKey(ConnectionModel.id, ondelete="CASCADE"))
     name: Mapped[str] = mapped_column("name", String, nullable=False)
     created_at: Mapped[datetime] = mapped_column("created_at", String)
+    # Rolling summary of the messages older than the ones replayed verbatim to the LLM
+    summary: Mapped[str | None] = mapped_column("summary", Text, nullable=True)
+    # Creation date of the last message included in the summary
+    summarized_until: Mapped[datetime | None] = mapped_column("summarized_until", String, nullable=True)
 
     # Relationships
     messages: Mapped[list["MessageModel"]] = relationship("MessageModel", back_populates="conversation")
@@ -7,6 +7,7 @@ from pydantic import BaseModel, ConfigDict
 from dataline.models.llm_flow.enums import QueryResultType
 from dataline.models.llm_flow.schema import (
     ChartGenerationResult,
+    QueryRunData,
     SelectedTablesResult,
     SQLQueryRunResult,
     SQLQueryStringResult,
@@ -45,6 +46,16 @@ class UpdateConversationRequest(BaseModel):
 
 
 def render_stored_results(results: list[ResultModel]) -> list[ResultOut]:
+    # Charts are stored without data, they share the data of the SQL run result linked to the same query
+    chart_data: dict[UUID, QueryRunData] = {}
+    for result in results:
+        if result.type == QueryResultType.SQL_QUERY_RUN_RESULT.value and result.linked_id:
+            run_result = SQLQueryRunResult.deserialize(result)
+            if run_result.for_chart:
+                chart_data[result.linked_id] = QueryRunData(
+                    columns=run_result.columns, rows=run_result.rows, total_points=run_result.total_points
+                )
+
     rendered_results = []
     for result in results:
         if result.type not in QueryResultType.__members__:
@@ -55,7 +66,8 @@ def render_stored_results(results: list[ResultModel]) -> list[ResultOut]:
         elif QueryResultType(result.type) == QueryResultType.SELECTED_TABLES:
             rendered_results.append(SelectedTablesResult.deserialize(result).serialize_result())
         elif QueryResultType(result.type) == QueryResultType.CHART_GENERATION_RESULT:
-            rendered_results.append(ChartGenerationResult.deserialize(result).serialize_result())
+            data = chart_data.get(result.linked_id) if result.linked_id else None
+            rendered_results.append(ChartGenerationResult.deserialize(result, data=data).serialize_result())
         elif QueryResultType(result.type) == QueryResultType.SQL_QUERY_RUN_RESULT:
             rendered_results.append(SQLQueryRunResult.deserialize(result).serialize_result())
 
@@ -12,3 +12,11 @@ class QueryStreamingEventType(str, Enum):
     STORED_MESSAGES = "stored_messages_event"
     ADD_RESULT = "add_result_event"
     ERROR = "error_event"
+
+
+class ChartType(Enum):
+    bar = "bar"
+    doughnut = "doughnut"
+    line = "line"
+    # bubble = "bubble"
+    # radar = "radar"
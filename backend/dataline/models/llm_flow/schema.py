@@ -7,11 +7,13 @@ from langchain_core.pydantic_v1 import BaseModel as BaseModelV1
 from langchain_core.pydantic_v1 import SecretStr as SecretStrV1
 from pydantic import BaseModel, Field
 
+from dataline.config import config
 from dataline.models.llm_flow.enums import QueryResultType
 from dataline.models.result.model import ResultModel
 from dataline.models.result.schema import ResultCreate, ResultOut
 from dataline.repositories.base import AsyncSession
 from dataline.repositories.result import ResultRepository
+from dataline.utils.charts import render_chart_json
 
 
 # Need to use pydantic v1 due to langchain
@@ -64,6 +66,11 @@ class RenderableResultMixin(abc.ABC):
 class QueryRunData(BaseModel):  # type: ignore[misc]
     columns: list[str]
     rows: list[list[Any] | Any]  # type: ignore[misc]
+    # More rows than the row limit were returned, total_rows_estimate is the database estimate if available
+    truncated: bool = False
+    total_rows_estimate: int | None = None
+    # Chart data only: number of points before the rows were downsampled, None if they were not
+    total_points: int | None = None
 
 
 class SQLQueryRunResultContent(BaseModel):
@@ -81,8 +88,13 @@ class SQLQueryRunResult(QueryRunData, QueryResultSchema, RenderableResultMixin,
     for_chart: bool = False
 
     def serialize_result(self) -> ResultOut:
+        content = self.model_dump(exclude={"ephemeral_id", "linked_id", "created_at"})
+        if self.for_chart and len(self.rows) > config.query_max_rows:
+            # Charts render from the stored rows, the table shows as many rows as any other result
+            content["rows"] = content["rows"][: config.query_max_rows]
+            content["truncated"] = True
         return ResultOut(
-            content=self.model_dump(exclude={"ephemeral_id", "linked_id", "created_at"}),
+            content=content,
             type=self.result_type.value,
             linked_id=self.linked_id,
             created_at=datetime.now(),
@@ -93,7 +105,13 @@ class SQLQueryRunResult(QueryRunData, QueryResultSchema, RenderableResultMixin,
     ) -> ResultModel:
         create = ResultCreate(
             content=SQLQueryRunResultContent(
-                data=QueryRunData(columns=self.columns, rows=self.rows),
+                data=QueryRunData(
+                    columns=self.columns,
+                    rows=self.rows,
+                    truncated=self.truncated,
+                    total_rows_estimate=self.total_rows_estimate,
+                    total_points=self.total_points,
+                ),
                 is_secure=self.is_secure,
                 for_chart=self.for_chart,
             ).model_dump_json(),
@@ -115,6 +133,9 @@ class SQLQueryRunResult(QueryRunData, QueryResultSchema, RenderableResultMixin,
         return cls(
             columns=content.data.columns,
             rows=content.data.rows,
+            truncated=content.data.truncated,
+            total_rows_estimate=content.data.total_rows_estimate,
+            total_points=content.data.total_points,
             is_secure=content.is_secure,
             for_chart=content.for_chart,
             result_id=result.id,
@@ -124,6 +145,7 @@ class SQLQueryRunResult(QueryRunData, QueryResultSchema, RenderableResultMixin,
 
 
 class ChartGenerationResultContent(BaseModel):
+    # Chart config without data, the data comes from the linked SQL query run result when rendering
     chartjs_json: str
     chart_type: str
 
@@ -133,6 +155,8 @@ class ChartGenerationResult(QueryResultSchema, StorableResultMixin, RenderableRe
     linked_id: UUID
     chartjs_json: str
     chart_type: str
+    # Only the template is stored, see ChartGenerationResultContent
+    chartjs_template: str | None = None
 
     # Implement storage for chart generation results with data
     async def store_result(
@@ -140,7 +164,7 @@ class ChartGenerationResult(QueryResultSchema, StorableResultMixin, RenderableRe
     ) -> ResultModel:
         create = ResultCreate(
             content=ChartGenerationResultContent(
-                chartjs_json=self.chartjs_json, chart_type=self.chart_type
+                chartjs_json=self.chartjs_template or self.chartjs_json, chart_type=self.chart_type
             ).model_dump_json(),
             type=self.result_type.value,
             message_id=message_id,
@@ -152,12 +176,20 @@ class ChartGenerationResult(QueryResultSchema, StorableResultMixin, RenderableRe
         return stored_result
 
     @classmethod
-    def deserialize(cls, result: ResultModel) -> Self:
+    def deserialize(cls, result: ResultModel, data: QueryRunData | None = None) -> Self:
+        """
+        Merge the stored chart template with the data of the linked SQL query run result.
+        Charts stored before templates were introduced have their data embedded, they are rendered as is.
+        """
         if not result.linked_id:
             raise ValueError("Attempting to deserialize a chart generation result without a linked_id")
         content = ChartGenerationResultContent.model_validate_json(result.content)
+        chartjs_json = content.chartjs_json
+        if data is not None:
+            chartjs_json = render_chart_json(content.chartjs_json, content.chart_type, data.rows, data.total_points)
         return cls(
-            chartjs_json=content.chartjs_json,
+            chartjs_json=chartjs_json,
+            chartjs_template=content.chartjs_json,
             result_id=result.id,
             linked_id=result.linked_id,
             created_at=result.created_at,
@@ -166,7 +198,9 @@ class ChartGenerationResult(QueryResultSchema, StorableResultMixin, RenderableRe
 
     def serialize_result(self) -> ResultOut:
         return ResultOut(
-            content=self.model_dump(exclude={"result_id", "ephemeral_id", "linked_id", "created_at"}),
+            content=self.model_dump(
+                exclude={"result_id", "ephemeral_id", "linked_id", "created_at", "chartjs_template"}
+            ),
             type=self.result_type.value,
             result_id=self.result_id,
             linked_id=self.linked_id,
@@ -4,7 +4,7 @@ from uuid import UUID
 
 from dataline.models.base import DBModel, UUIDMixin
 from dataline.models.conversation.model import ConversationModel
-from sqlalchemy import JSON, ForeignKey, String, Text
+from sqlalchemy import JSON, Float, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 if TYPE_CHECKING:
@@ -18,6 +18,10 @@ class MessageModel(DBModel, UUIDMixin, kw_only=True):  # type: ignore[misc]
     created_at: Mapped[datetime | None] = mapped_column("created_at", String)
     conversation_id: Mapped[UUID] = mapped_column(ForeignKey(ConversationModel.id, ondelete="CASCADE"))
     options: Mapped[dict[str, Any] | None] = mapped_column("options", JSON, nullable=True)  # type: ignore[misc]
+    # OpenAI usage of the turn, on AI messages. Null on messages stored before usage was tracked
+    prompt_tokens: Mapped[int | None] = mapped_column("prompt_tokens", Integer, nullable=True)
+    completion_tokens: Mapped[int | None] = mapped_column("completion_tokens", Integer, nullable=True)
+    cost_usd: Mapped[float | None] = mapped_column("cost_usd", Float, nullable=True)
 
     # Relationships
     conversation: Mapped[ConversationModel] = relationship("ConversationModel", back_populates="messages")
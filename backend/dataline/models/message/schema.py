@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 from typing import Literal, Optional
 from uuid import UUID
@@ -27,6 +27,10 @@ class MessageCreate(BaseModel):
 
     options: Optional[MessageOptions] = None
 
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
+
 
 class MessageUpdate(BaseModel):
     content: str
@@ -44,6 +48,10 @@ class MessageOut(BaseModel):
 
     options: Optional[MessageOptions]
 
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
+
 
 class MessageWithResultsOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -57,3 +65,12 @@ class QueryOut(BaseModel):
 
     human_message: MessageOut
     ai_message: MessageWithResultsOut
+
+
+class TokenUsageOut(BaseModel):
+    connection_id: UUID
+    day: date
+    messages: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
@@ -0,0 +1,22 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from dataline.models.base import DBModel, UUIDMixin
+from dataline.models.connection.model import ConnectionModel
+
+
+class QueryCacheModel(DBModel, UUIDMixin, kw_only=True):
+    __tablename__ = "query_cache"
+    connection_id: Mapped[UUID] = mapped_column(ForeignKey(ConnectionModel.id, ondelete="CASCADE"))
+    question: Mapped[str] = mapped_column("question", Text, nullable=False)
+    # Lowercase question without punctuation, used for matching
+    normalized_question: Mapped[str] = mapped_column("normalized_question", Text, nullable=False)
+    sql: Mapped[str] = mapped_column("sql", Text, nullable=False)
+    # Hash of the tables and columns of the connection when the SQL was generated
+    schema_fingerprint: Mapped[str] = mapped_column("schema_fingerprint", String, nullable=False)
+    hits: Mapped[int] = mapped_column("hits", Integer, nullable=False, default=0)
+    created_at: Mapped[datetime | None] = mapped_column("created_at", String)
+    last_used_at: Mapped[datetime | None] = mapped_column("last_used_at", String, nullable=True)
@@ -0,0 +1,31 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class QueryCacheCreate(BaseModel):
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    connection_id: UUID
+    question: str
+    normalized_question: str
+    sql: str
+    schema_fingerprint: str
+    hits: int = 0
+
+
+class QueryCacheUpdate(BaseModel):
+    hits: int | None = None
+    last_used_at: datetime | None = None
+
+
+class QueryCacheOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    question: str
+    sql: str
+    hits: int
+    created_at: datetime | None = None
+    last_used_at: datetime | None = None
@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from typing import Any
 from uuid import UUID
 
@@ -46,3 +47,17 @@ class ChartRefreshOut(BaseModel):
 
     created_at: datetime
     chartjs_json: str
+
+
+class ConversationChartRefreshOut(BaseModel):
+    result_id: UUID
+    created_at: datetime | None = None
+    # None if the chart could not be refreshed
+    chartjs_json: str | None = None
+    error: str | None = None
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    parquet = "parquet"
+    arrow = "arrow"
@@ -0,0 +1,19 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from dataline.models.base import DBModel, UUIDMixin
+from dataline.models.result.model import ResultModel
+
+
+class ScheduleModel(DBModel, UUIDMixin, kw_only=True):
+    __tablename__ = "schedules"
+    # SQL query string or chart result to refresh
+    result_id: Mapped[UUID] = mapped_column(ForeignKey(ResultModel.id, ondelete="CASCADE"), unique=True)
+    interval_seconds: Mapped[int] = mapped_column("interval_seconds", Integer, nullable=False)
+    next_run_at: Mapped[datetime] = mapped_column("next_run_at", String, nullable=False)
+    last_run_at: Mapped[datetime | None] = mapped_column("last_run_at", String, nullable=True)
+    last_error: Mapped[str | None] = mapped_column("last_error", Text, nullable=True)
+    created_at: Mapped[datetime | None] = mapped_column("created_at", String)
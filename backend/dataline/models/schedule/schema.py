@@ -0,0 +1,35 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ScheduleIn(BaseModel):
+    interval_seconds: int = Field(gt=0)
+
+
+class ScheduleCreate(BaseModel):
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    result_id: UUID
+    interval_seconds: int
+    next_run_at: datetime
+
+
+class ScheduleUpdate(BaseModel):
+    interval_seconds: int | None = None
+    next_run_at: datetime | None = None
+    last_run_at: datetime | None = None
+    last_error: str | None = None
+
+
+class ScheduleOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    result_id: UUID
+    interval_seconds: int
+    next_run_at: datetime
+    last_run_at: datetime | None = None
+    last_error: str | None = None
+    created_at: datetime | None = None
@@ -0,0 +1,18 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from dataline.models.base import DBModel, UUIDMixin
+from dataline.models.connection.model import ConnectionModel
+
+
+class TableProfileModel(DBModel, UUIDMixin, kw_only=True):
+    __tablename__ = "table_profiles"
+    connection_id: Mapped[UUID] = mapped_column(ForeignKey(ConnectionModel.id, ondelete="CASCADE"))
+    table_name: Mapped[str] = mapped_column("table_name", String, nullable=False)
+    row_count: Mapped[int] = mapped_column("row_count", Integer, nullable=False)
+    # JSON dump of TableProfile
+    content: Mapped[str] = mapped_column("content", Text, nullable=False)
+    created_at: Mapped[datetime | None] = mapped_column("created_at", String)
@@ -0,0 +1,77 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class TopValue(BaseModel):
+    value: str
+    fraction: float
+
+
+class HistogramBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class ColumnProfile(BaseModel):
+    name: str
+    type: str
+    null_fraction: float
+    distinct_count: int
+    # True if the distinct count was extrapolated from a sample
+    distinct_is_estimate: bool = False
+    min: str | float | None = None
+    max: str | float | None = None
+    top_values: list[TopValue] = Field(default_factory=list)
+    histogram: list[HistogramBin] = Field(default_factory=list)
+
+    def render(self) -> str:
+        parts = [
+            f"{self.null_fraction:.0%} null",
+            f"{'~' if self.distinct_is_estimate else ''}{self.distinct_count} distinct",
+        ]
+        if self.min is not None and self.max is not None:
+            parts.append(f"range [{self.min}, {self.max}]")
+        if self.top_values:
+            top = ", ".join(f"{top_value.value!r} ({top_value.fraction:.0%})" for top_value in self.top_values)
+            parts.append(f"top values: {top}")
+        if self.histogram:
+            parts.append(f"histogram counts: {[histogram_bin.count for histogram_bin in self.histogram]}")
+        return f"- {self.name} ({self.type}): " + ", ".join(parts)
+
+
+class TableProfile(BaseModel):
+    table_name: str
+    row_count: int
+    # Number of rows the profile was computed on, lower than row_count for big tables
+    sampled_rows: int
+    columns: list[ColumnProfile]
+
+    def render(self) -> str:
+        header = f"Column profile of {self.table_name} ({self.row_count} rows"
+        if self.sampled_rows < self.row_count:
+            header += f", computed on a sample of {self.sampled_rows} rows"
+        header += "):"
+        return "\n".join([header, *(column.render() for column in self.columns)])
+
+
+class TableProfileCreate(BaseModel):
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    connection_id: UUID
+    table_name: str
+    row_count: int
+    content: str
+
+
+class TableProfileUpdate(BaseModel):
+    row_count: int | None = None
+    content: str | None = None
+
+
+class TableProfileOut(TableProfile):
+    model_config = ConfigDict(from_attributes=True)
+
+    created_at: datetime | None = None
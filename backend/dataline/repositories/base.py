@@ -1,5 +1,6 @@
+import time
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, Generic, Iterable, Protocol, Sequence, Type, TypeVar
+from typing import Any, AsyncGenerator, Callable, Generic, Iterable, Protocol, Sequence, Type, TypeVar
 from uuid import UUID
 
 from asyncpg import (  # type: ignore[import-untyped]
@@ -7,20 +8,33 @@ from asyncpg import (  # type: ignore[import-untyped]
     UniqueViolationError,
 )
 from pydantic import BaseModel
-from sqlalchemy import Delete, Select, Update, delete, insert, select, text, update
+from sqlalchemy import Connection, Delete, Select, Update, delete, event, insert, select, text, update
 from sqlalchemy.exc import IntegrityError, MultipleResultsFound, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession as _AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, SessionTransaction
 
 from dataline.config import config
 
 # Load all sqlalchemy models
 from dataline.models import *  # noqa: F401, F403
 from dataline.models.base import DBModel
+from dataline.utils.metrics import observe_stage
 from dataline.utils.utils import get_sqlite_dsn_async
 
 engine = create_async_engine(get_sqlite_dsn_async(config.sqlite_path))
 
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn: Connection, *args: Any) -> None:  # type: ignore[misc]
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _record_query_time(conn: Connection, *args: Any) -> None:  # type: ignore[misc]
+    observe_stage("metadata_db_query", time.perf_counter() - conn.info["query_start_times"].pop())
+
+
 # We set expire_on_commit to False so that subsequent access to objects that came from a session do not
 # need to emit new SQL queries to refresh the objects if the transaction has been committed already
 SessionCreator = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
@@ -53,6 +67,27 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+
+def run_after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run a callback once the transaction of the session is committed, never if it is rolled back."""
+    session.sync_session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session: Session) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, []):
+        callback()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_after_commit_callbacks(session: Session, transaction: SessionTransaction) -> None:
+    # Rolled back or closed without committing
+    if transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_KEY, None)
+
+
 class ConstraintViolationError(Exception): ...
 
 
@@ -25,6 +25,7 @@ class ConnectionUpdate(BaseModel):
     name: str | None = None
     dialect: str | None = None
     is_sample: bool | None = None
+    statement_timeout_seconds: int | None = None
 
 
 class ConnectionRepository(BaseRepository[ConnectionModel, ConnectionCreate, ConnectionUpdate]):
@@ -24,6 +24,8 @@ class ConversationUpdate(BaseModel):
 
     connection_id: UUID | None = None
     name: str | None = None
+    summary: str | None = None
+    summarized_until: datetime | None = None
 
 
 class ConversationRepository(BaseRepository[ConversationModel, ConversationCreate, ConversationUpdate]):
@@ -31,6 +33,12 @@ class ConversationRepository(BaseRepository[ConversationModel, ConversationCreat
     def model(self) -> Type[ConversationModel]:
         return ConversationModel
 
+    async def get_with_connection(self, session: AsyncSession, conversation_id: UUID) -> ConversationModel:
+        query = (
+            select(ConversationModel).filter_by(id=conversation_id).options(joinedload(ConversationModel.connection))
+        )
+        return await self.get_unique(session, query)
+
     async def get_with_messages_with_results(self, session: AsyncSession, conversation_id: UUID) -> ConversationModel:
         query = (
             select(ConversationModel)
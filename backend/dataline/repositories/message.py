@@ -1,9 +1,11 @@
+from datetime import date, datetime
 from typing import Sequence, Type
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Row, Select, func, select, update
 from sqlalchemy.orm import contains_eager
 
+from dataline.models.conversation.model import ConversationModel
 from dataline.models.llm_flow.enums import QueryResultType
 from dataline.models.message.model import MessageModel
 from dataline.models.message.schema import MessageCreate, MessageUpdate
@@ -23,16 +25,80 @@ class MessageRepository(BaseRepository[MessageModel, MessageCreate, MessageUpdat
     async def get_by_conversation_with_sql_results(
         self, session: AsyncSession, conversation_id: UUID, n: int = 10
     ) -> Sequence[MessageModel]:
-        query = (
-            select(MessageModel)
+        # Limit on messages, not on joined (message, result) rows
+        last_message_ids = (
+            select(MessageModel.id)
             .filter_by(conversation_id=conversation_id)
-            .outerjoin(
-                ResultModel,
-                onclause=(ResultModel.message_id == MessageModel.id)
-                & (ResultModel.type == QueryResultType.SQL_QUERY_STRING_RESULT.value),
-            )
-            .options(contains_eager(MessageModel.results))
             .order_by(MessageModel.created_at.desc())
             .limit(n)
+            .scalar_subquery()
         )
+        query = self._with_sql_results(select(MessageModel).where(MessageModel.id.in_(last_message_ids))).order_by(
+            MessageModel.created_at.desc()
+        )
+        return await self.list_unique(session, query=query)
+
+    async def get_by_conversation_with_sql_results_after(
+        self, session: AsyncSession, conversation_id: UUID, created_after: datetime | None = None
+    ) -> Sequence[MessageModel]:
+        """Messages created after a date (all if None), oldest first."""
+        query = select(MessageModel).filter_by(conversation_id=conversation_id)
+        if created_after is not None:
+            query = query.where(MessageModel.created_at > created_after)
+        query = self._with_sql_results(query).order_by(MessageModel.created_at)
         return await self.list_unique(session, query=query)
+
+    async def add_usage(
+        self, session: AsyncSession, message_id: UUID, prompt_tokens: int, completion_tokens: int, cost_usd: float
+    ) -> MessageModel:
+        query = (
+            update(MessageModel)
+            .filter_by(id=message_id)
+            .values(
+                prompt_tokens=func.coalesce(MessageModel.prompt_tokens, 0) + prompt_tokens,
+                completion_tokens=func.coalesce(MessageModel.completion_tokens, 0) + completion_tokens,
+                cost_usd=func.coalesce(MessageModel.cost_usd, 0) + cost_usd,
+            )
+            .returning(MessageModel)
+        )
+        return await self.update_one(session, query)
+
+    async def get_usage_by_connection_and_day(
+        self,
+        session: AsyncSession,
+        connection_id: UUID | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> Sequence[Row[tuple[UUID, str, int, int, int, float]]]:
+        """Token usage summed per connection and day, for messages with tracked usage. Dates are inclusive."""
+        day = func.date(MessageModel.created_at)
+        query = (
+            select(
+                ConversationModel.connection_id,
+                day.label("day"),
+                func.count(MessageModel.id).label("messages"),
+                func.sum(MessageModel.prompt_tokens).label("prompt_tokens"),
+                func.sum(MessageModel.completion_tokens).label("completion_tokens"),
+                func.sum(MessageModel.cost_usd).label("cost_usd"),
+            )
+            .join(ConversationModel, ConversationModel.id == MessageModel.conversation_id)
+            .where(MessageModel.prompt_tokens.is_not(None))
+            .group_by(ConversationModel.connection_id, day)
+            .order_by(day, ConversationModel.connection_id)
+        )
+        if connection_id is not None:
+            query = query.where(ConversationModel.connection_id == connection_id)
+        if start is not None:
+            query = query.where(day >= start.isoformat())
+        if end is not None:
+            query = query.where(day <= end.isoformat())
+        result = await session.execute(query)
+        return result.all()
+
+    @staticmethod
+    def _with_sql_results(query: Select[tuple[MessageModel]]) -> Select[tuple[MessageModel]]:
+        return query.outerjoin(
+            ResultModel,
+            onclause=(ResultModel.message_id == MessageModel.id)
+            & (ResultModel.type == QueryResultType.SQL_QUERY_STRING_RESULT.value),
+        ).options(contains_eager(MessageModel.results))
@@ -0,0 +1,33 @@
+from typing import Sequence, Type
+from uuid import UUID
+
+from sqlalchemy import delete, select
+
+from dataline.models.query_cache.model import QueryCacheModel
+from dataline.models.query_cache.schema import QueryCacheCreate, QueryCacheUpdate
+from dataline.repositories.base import AsyncSession, BaseRepository
+
+
+class QueryCacheRepository(BaseRepository[QueryCacheModel, QueryCacheCreate, QueryCacheUpdate]):
+    @property
+    def model(self) -> Type[QueryCacheModel]:
+        return QueryCacheModel
+
+    async def list_by_connection(self, session: AsyncSession, connection_id: UUID) -> Sequence[QueryCacheModel]:
+        query = select(self.model).filter_by(connection_id=connection_id).order_by(self.model.created_at.desc())
+        return await self.list(session, query)
+
+    async def delete_by_connection(self, session: AsyncSession, connection_id: UUID) -> None:
+        query = delete(self.model).filter_by(connection_id=connection_id)
+        await session.execute(query)
+        await session.flush()
+
+    async def delete_stale(self, session: AsyncSession, connection_id: UUID, schema_fingerprint: str) -> None:
+        """Delete entries generated for another version of the connection schema."""
+        query = (
+            delete(self.model)
+            .filter_by(connection_id=connection_id)
+            .where(self.model.schema_fingerprint != schema_fingerprint)
+        )
+        await session.execute(query)
+        await session.flush()
@@ -1,7 +1,9 @@
-from typing import Type
+from datetime import datetime
+from typing import Sequence, Type
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Row, Text, select, type_coerce, update
+from sqlalchemy.orm import aliased
 
 from dataline.models.connection.model import ConnectionModel
 from dataline.models.conversation.model import ConversationModel
@@ -10,6 +12,7 @@ from dataline.models.message.model import MessageModel
 from dataline.models.result.model import ResultModel
 from dataline.models.result.schema import ResultCreate, ResultUpdate
 from dataline.repositories.base import AsyncSession, BaseRepository, NotFoundError
+from dataline.utils.storage import BLOB_REFERENCE_PREFIX
 
 
 class ResultRepository(BaseRepository[ResultModel, ResultCreate, ResultUpdate]):
@@ -17,20 +20,20 @@ class ResultRepository(BaseRepository[ResultModel, ResultCreate, ResultUpdate]):
     def model(self) -> Type[ResultModel]:
         return ResultModel
 
-    async def get_dsn_from_result(self, session: AsyncSession, result_id: UUID) -> str:
+    async def get_connection_from_result(self, session: AsyncSession, result_id: UUID) -> ConnectionModel:
         query = (
-            select(ConnectionModel.dsn)
+            select(ConnectionModel)
             .join(ConversationModel)
             .join(MessageModel)
             .join(ResultModel)
             .where(ResultModel.id == result_id)
         )
         result = await session.execute(query)
-        dsn = result.fetchone()
-        if not dsn:
-            raise ValueError(f"Could not find DSN for result_id: {result_id}")
+        connection = result.fetchone()
+        if not connection:
+            raise ValueError(f"Could not find connection for result_id: {result_id}")
 
-        return dsn[0]
+        return connection[0]
 
     async def get_chart_from_sql_query(self, session: AsyncSession, sql_string_result_id: UUID) -> ResultModel:
         query = (
@@ -44,3 +47,60 @@ class ResultRepository(BaseRepository[ResultModel, ResultCreate, ResultUpdate]):
             raise NotFoundError(f"Could not find chart for result_id: {sql_string_result_id}")
 
         return chart[0]
+
+    async def get_run_result_from_sql_query(
+        self, session: AsyncSession, sql_string_result_id: UUID
+    ) -> ResultModel | None:
+        query = (
+            select(ResultModel)
+            .filter_by(linked_id=sql_string_result_id)
+            .filter(ResultModel.type == QueryResultType.SQL_QUERY_RUN_RESULT.value)
+            .order_by(ResultModel.created_at.desc())
+        )
+        result = await session.execute(query)
+        return result.scalars().first()
+
+    async def list_charts_with_sql_by_conversation(
+        self, session: AsyncSession, conversation_id: UUID
+    ) -> Sequence[Row[tuple[ResultModel, ResultModel, ResultModel | None, ConnectionModel]]]:
+        """
+        Fetch every chart of a conversation with its SQL query string result, its data (SQL run result, if any)
+        and its connection in a single query.
+        """
+        chart = aliased(ResultModel)
+        sql_string = aliased(ResultModel)
+        sql_run = aliased(ResultModel)
+        query = (
+            select(chart, sql_string, sql_run, ConnectionModel)
+            .join(MessageModel, chart.message_id == MessageModel.id)
+            .join(ConversationModel, MessageModel.conversation_id == ConversationModel.id)
+            .join(ConnectionModel, ConversationModel.connection_id == ConnectionModel.id)
+            .join(sql_string, chart.linked_id == sql_string.id)
+            .outerjoin(
+                sql_run,
+                (sql_run.linked_id == sql_string.id) & (sql_run.type == QueryResultType.SQL_QUERY_RUN_RESULT.value),
+            )
+            .where(ConversationModel.id == conversation_id)
+            .where(chart.type == QueryResultType.CHART_GENERATION_RESULT.value)
+        )
+        result = await session.execute(query)
+        return result.all()
+
+    async def update_contents(self, session: AsyncSession, contents: dict[UUID, str]) -> None:
+        """Bulk update the content of several results, in one executemany."""
+        if contents:
+            await session.execute(
+                update(ResultModel), [{"id": result_id, "content": content} for result_id, content in contents.items()]
+            )
+
+    async def update_created_at(self, session: AsyncSession, result_ids: list[UUID], created_at: datetime) -> None:
+        if result_ids:
+            await session.execute(
+                update(ResultModel).where(ResultModel.id.in_(result_ids)).values(created_at=created_at)
+            )
+
+    async def list_blob_references(self, session: AsyncSession) -> Sequence[str]:
+        """References to the blob store of the stored contents, read without loading the blobs."""
+        raw_content = type_coerce(ResultModel.content, Text)
+        query = select(raw_content).where(raw_content.startswith(BLOB_REFERENCE_PREFIX))
+        return (await session.scalars(query)).all()
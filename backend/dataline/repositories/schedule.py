@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Sequence, Type
+from uuid import UUID
+
+from sqlalchemy import select
+
+from dataline.models.schedule.model import ScheduleModel
+from dataline.models.schedule.schema import ScheduleCreate, ScheduleUpdate
+from dataline.repositories.base import AsyncSession, BaseRepository, NotFoundError
+
+
+class ScheduleRepository(BaseRepository[ScheduleModel, ScheduleCreate, ScheduleUpdate]):
+    @property
+    def model(self) -> Type[ScheduleModel]:
+        return ScheduleModel
+
+    async def get_by_result_id_or_none(self, session: AsyncSession, result_id: UUID) -> ScheduleModel | None:
+        query = select(self.model).filter_by(result_id=result_id)
+        try:
+            return await self.first(session, query=query)
+        except NotFoundError:
+            return None
+
+    async def list_due(self, session: AsyncSession, now: datetime) -> Sequence[ScheduleModel]:
+        # Dates are stored as strings, compare them once parsed
+        schedules = await self.list_all(session)
+        return [schedule for schedule in schedules if datetime.fromisoformat(str(schedule.next_run_at)) <= now]
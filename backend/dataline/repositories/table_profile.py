@@ -0,0 +1,23 @@
+from typing import Sequence, Type
+from uuid import UUID
+
+from sqlalchemy import delete, select
+
+from dataline.models.table_profile.model import TableProfileModel
+from dataline.models.table_profile.schema import TableProfileCreate, TableProfileUpdate
+from dataline.repositories.base import AsyncSession, BaseRepository
+
+
+class TableProfileRepository(BaseRepository[TableProfileModel, TableProfileCreate, TableProfileUpdate]):
+    @property
+    def model(self) -> Type[TableProfileModel]:
+        return TableProfileModel
+
+    async def list_by_connection(self, session: AsyncSession, connection_id: UUID) -> Sequence[TableProfileModel]:
+        query = select(self.model).filter_by(connection_id=connection_id).order_by(self.model.table_name)
+        return await self.list(session, query)
+
+    async def delete_by_connection(self, session: AsyncSession, connection_id: UUID) -> None:
+        query = delete(self.model).filter_by(connection_id=connection_id)
+        await session.execute(query)
+        await session.flush()
@@ -18,7 +18,7 @@ def setup_sentry() -> None:
         release="v1.0.8",
         enable_tracing=True,
         integrations=[FastApiIntegration()],
-        traces_sample_rate=1.0,
+        traces_sample_rate=config.sentry_traces_sample_rate,
         include_local_variables=False,
         ignore_errors=[KeyboardInterrupt],
     )
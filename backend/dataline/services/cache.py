@@ -0,0 +1,67 @@
+"""
+In-process caches of the rows read on every request: user settings, connections and conversation headers.
+DataLine runs as a single process, so the services writing these rows keep the caches up to date.
+Updates are applied once the session commits and dropped if it rolls back, so the caches only hold committed rows.
+"""
+
+from uuid import UUID
+
+from dataline.models.connection.schema import ConnectionOut
+from dataline.models.conversation.schema import ConversationOut
+from dataline.models.user.schema import UserOut
+from dataline.repositories.base import AsyncSession, run_after_commit
+
+# Single user app, the key is always the same
+_USER_KEY = "user"
+_users: dict[str, UserOut] = {}
+_connections: dict[UUID, ConnectionOut] = {}
+_conversations: dict[UUID, ConversationOut] = {}
+
+
+def get_user() -> UserOut | None:
+    return _users.get(_USER_KEY)
+
+
+def set_user(session: AsyncSession, user: UserOut) -> None:
+    run_after_commit(session, lambda: _users.update({_USER_KEY: user}))
+
+
+def get_connection(connection_id: UUID) -> ConnectionOut | None:
+    return _connections.get(connection_id)
+
+
+def set_connection(session: AsyncSession, connection: ConnectionOut) -> None:
+    run_after_commit(session, lambda: _connections.update({connection.id: connection}))
+
+
+def invalidate_connection(session: AsyncSession, connection_id: UUID) -> None:
+    _invalidate_connection(connection_id)
+    # Again after the commit, in case another request cached the row in the meantime
+    run_after_commit(session, lambda: _invalidate_connection(connection_id))
+
+
+def _invalidate_connection(connection_id: UUID) -> None:
+    _connections.pop(connection_id, None)
+    # Conversations are deleted with their connection
+    for conversation in list(_conversations.values()):
+        if conversation.connection_id == connection_id:
+            _conversations.pop(conversation.id, None)
+
+
+def get_conversation(conversation_id: UUID) -> ConversationOut | None:
+    return _conversations.get(conversation_id)
+
+
+def set_conversation(session: AsyncSession, conversation: ConversationOut) -> None:
+    run_after_commit(session, lambda: _conversations.update({conversation.id: conversation}))
+
+
+def invalidate_conversation(session: AsyncSession, conversation_id: UUID) -> None:
+    _conversations.pop(conversation_id, None)
+    run_after_commit(session, lambda: _conversations.pop(conversation_id, None))
+
+
+def clear() -> None:
+    _users.clear()
+    _connections.clear()
+    _conversations.clear()
@@ -6,8 +6,6 @@ from pathlib import Path
 from typing import BinaryIO
 from uuid import UUID
 
-import pandas as pd
-import pyreadstat
 from fastapi import Depends, UploadFile
 from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
@@ -16,16 +14,23 @@ from dataline.config import config
 from dataline.errors import ValidationError
 from dataline.models.connection.model import ConnectionModel
 from dataline.models.connection.schema import ConnectionOut, ConnectionUpdateIn
+from dataline.models.query_cache.schema import QueryCacheOut
+from dataline.models.table_profile.schema import TableProfileOut
 from dataline.repositories.base import AsyncSession, NotFoundError, NotUniqueError
 from dataline.repositories.connection import (
     ConnectionCreate,
     ConnectionRepository,
     ConnectionUpdate,
 )
+from dataline.services import cache
+from dataline.services.profiling import ProfilingService
+from dataline.services.query_cache import QueryCacheService
 from dataline.utils.utils import (
     forward_connection_errors,
     generate_short_uuid,
+    get_duckdb_dsn,
     get_sqlite_dsn,
+    is_parquet_file,
 )
 
 logger = logging.getLogger(__name__)
@@ -33,9 +38,18 @@ logger = logging.getLogger(__name__)
 
 class ConnectionService:
     connection_repo: ConnectionRepository
+    profiling_service: ProfilingService
+    query_cache_service: QueryCacheService
 
-    def __init__(self, connection_repo: ConnectionRepository = Depends(ConnectionRepository)) -> None:
+    def __init__(
+        self,
+        connection_repo: ConnectionRepository = Depends(ConnectionRepository),
+        profiling_service: ProfilingService = Depends(ProfilingService),
+        query_cache_service: QueryCacheService = Depends(QueryCacheService),
+    ) -> None:
         self.connection_repo = connection_repo
+        self.profiling_service = profiling_service
+        self.query_cache_service = query_cache_service
 
     async def create_connection(
         self,
@@ -56,8 +70,13 @@ class ConnectionService:
         return ConnectionOut.model_validate(connection)
 
     async def get_connection(self, session: AsyncSession, connection_id: UUID) -> ConnectionOut:
-        connection = await self.connection_repo.get_by_uuid(session, connection_id)
-        return ConnectionOut.model_validate(connection)
+        cached_connection = cache.get_connection(connection_id)
+        if cached_connection is not None:
+            return cached_connection
+
+        connection = ConnectionOut.model_validate(await self.connection_repo.get_by_uuid(session, connection_id))
+        cache.set_connection(session, connection)
+        return connection
 
     async def get_connection_from_dsn(self, session: AsyncSession, dsn: str) -> ConnectionOut:
         connection = await self.connection_repo.get_by_dsn(session, dsn=dsn)
@@ -69,6 +88,7 @@ class ConnectionService:
 
     async def delete_connection(self, session: AsyncSession, connection_id: UUID) -> None:
         await self.connection_repo.delete_by_uuid(session, connection_id)
+        cache.invalidate_connection(session, connection_id)
 
     async def get_connection_details(self, dsn: str) -> tuple[str, str]:
         # Check if connection can be established before saving it
@@ -140,8 +160,36 @@ class ConnectionService:
         if data.name:
             update.name = data.name
 
+        if "statement_timeout_seconds" in data.model_fields_set:
+            update.statement_timeout_seconds = data.statement_timeout_seconds
+
         updated_connection = await self.connection_repo.update_by_uuid(session, connection_uuid, update)
-        return ConnectionOut.model_validate(updated_connection)
+        if update.dsn:
+            # Profiles and cached queries of the previous database are stale
+            await self.profiling_service.delete_table_profiles(session, connection_uuid)
+            await self.query_cache_service.clear(session, connection_uuid)
+
+        connection = ConnectionOut.model_validate(updated_connection)
+        cache.set_connection(session, connection)
+        return connection
+
+    async def get_table_profiles(self, session: AsyncSession, connection_id: UUID) -> list[TableProfileOut]:
+        await self.get_connection(session, connection_id)
+        return await self.profiling_service.get_table_profiles(session, connection_id)
+
+    async def refresh_table_profiles(self, session: AsyncSession, connection_id: UUID) -> list[TableProfileOut]:
+        connection = await self.get_connection(session, connection_id)
+        return await self.profiling_service.refresh_table_profiles(
+            session, connection_id, connection.dsn, connection.statement_timeout_seconds
+        )
+
+    async def get_query_cache(self, session: AsyncSession, connection_id: UUID) -> list[QueryCacheOut]:
+        await self.get_connection(session, connection_id)
+        return await self.query_cache_service.get_entries(session, connection_id)
+
+    async def clear_query_cache(self, session: AsyncSession, connection_id: UUID) -> None:
+        await self.get_connection(session, connection_id)
+        await self.query_cache_service.clear(session, connection_id)
 
     async def create_sqlite_connection(
         self, session: AsyncSession, file: BinaryIO, name: str, is_sample: bool = False
@@ -156,6 +204,11 @@ class ConnectionService:
         return await self.create_connection(session, dsn=dsn, name=name, is_sample=is_sample)
 
     async def create_csv_connection(self, session: AsyncSession, file: UploadFile, name: str) -> ConnectionOut:
+        # File ingestion dependencies are imported on upload, they are slow to import and rarely used
+        import pandas as pd
+
+        from dataline.utils.ingestion import optimize_sqlite_table
+
         generated_name = generate_short_uuid() + ".sqlite"
         file_path = Path(config.data_directory) / generated_name
 
@@ -166,8 +219,12 @@ class ConnectionService:
         # Write the dataframe to the SQLite database
         table_name = name.lower().replace(" ", "_")
         data_df.to_sql(table_name, conn, if_exists="replace", index=False)
-        # Commit and close connection to new SQLite database
         conn.commit()
+        # Index likely filter/join keys and collect statistics for the query planner
+        optimize_sqlite_table(
+            conn, table_name, data_df, max_indexes=config.ingest_max_indexes, vacuum=config.ingest_vacuum
+        )
+        # Close connection to new SQLite database
         conn.close()
 
         # Create connection with the locally copied file
@@ -175,6 +232,10 @@ class ConnectionService:
         return await self.create_connection(session, dsn=dsn, name=name, is_sample=False)
 
     async def create_sas7bdat_connection(self, session: AsyncSession, file: UploadFile, name: str) -> ConnectionOut:
+        import pyreadstat
+
+        from dataline.utils.ingestion import optimize_sqlite_table
+
         generated_name = generate_short_uuid() + ".sqlite"
         file_path = Path(config.data_directory) / generated_name
 
@@ -206,9 +267,14 @@ class ConnectionService:
             # Write the dataframe to the SQLite database
             table_name = name.lower().replace(" ", "_")
             data_df.to_sql(table_name, conn, if_exists="replace", index=False)
-
-            # Commit and close connection to new SQLite database
             conn.commit()
+
+            # Index likely filter/join keys and collect statistics for the query planner
+            optimize_sqlite_table(
+                conn, table_name, data_df, max_indexes=config.ingest_max_indexes, vacuum=config.ingest_vacuum
+            )
+
+            # Close connection to new SQLite database
             conn.close()
 
             # Create connection with the locally copied file
@@ -217,3 +283,35 @@ class ConnectionService:
         finally:
             # Clean up the temporary file
             os.unlink(temp_file_path)
+
+    async def create_duckdb_connection(self, session: AsyncSession, file: UploadFile, name: str) -> ConnectionOut:
+        import duckdb
+
+        generated_name = generate_short_uuid() + ".duckdb"
+        file_path = Path(config.data_directory) / generated_name
+
+        # DuckDB reads CSV and Parquet natively, sniff the format from the file header
+        is_parquet = is_parquet_file(file)
+
+        # Create a temporary file to store the uploaded content
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".parquet" if is_parquet else ".csv") as temp_file:
+            temp_file.write(await file.read())
+            temp_file_path = temp_file.name
+
+        try:
+            # Connect to the DuckDB database (it will be created if it doesn't exist)
+            conn = duckdb.connect(str(file_path))
+            try:
+                # Load the file into a columnar table, types are inferred by DuckDB
+                relation = conn.read_parquet(temp_file_path) if is_parquet else conn.read_csv(temp_file_path)
+                table_name = name.lower().replace(" ", "_")
+                relation.create(table_name)
+            finally:
+                conn.close()
+
+            # Create connection with the locally copied file
+            dsn = get_duckdb_dsn(str(file_path.absolute()))
+            return await self.create_connection(session, dsn=dsn, name=name, is_sample=False)
+        finally:
+            # Clean up the temporary file
+            os.unlink(temp_file_path)
@@ -1,22 +1,31 @@
+import asyncio
 import logging
-from typing import AsyncGenerator, cast
+import time
+from datetime import date, datetime
+from typing import AsyncGenerator, Sequence, cast
 from uuid import UUID
 
 from fastapi import Depends
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 
+from dataline.config import config
+from dataline.models.connection.schema import ConnectionOut
 from dataline.models.conversation.schema import (
     ConversationOut,
     ConversationWithMessagesWithResultsOut,
 )
 from dataline.models.llm_flow.enums import QueryStreamingEventType
 from dataline.models.llm_flow.schema import (
+    ChartGenerationResult,
     QueryOptions,
     RenderableResultMixin,
     ResultType,
+    SQLQueryRunResult,
+    SQLQueryStringResult,
     SQLQueryStringResultContent,
     StorableResultMixin,
 )
+from dataline.models.message.model import MessageModel
 from dataline.models.message.schema import (
     BaseMessageType,
     MessageCreate,
@@ -24,9 +33,10 @@ from dataline.models.message.schema import (
     MessageOut,
     MessageWithResultsOut,
     QueryOut,
+    TokenUsageOut,
 )
 from dataline.models.result.schema import ResultUpdate
-from dataline.repositories.base import AsyncSession
+from dataline.repositories.base import AsyncSession, SessionCreator, run_after_commit
 from dataline.repositories.conversation import (
     ConversationCreate,
     ConversationRepository,
@@ -34,13 +44,36 @@ from dataline.repositories.conversation import (
 )
 from dataline.repositories.message import MessageRepository
 from dataline.repositories.result import ResultRepository
+from dataline.services import cache
 from dataline.services.connection import ConnectionService
-from dataline.services.llm_flow.graph import QueryGraphService
+from dataline.services.llm_flow.usage import TokenUsage, get_turn_usage, usage_from_completion
+from dataline.services.profiling import ProfilingService, schedule_connection_profiling
+from dataline.services.query_cache import QueryCacheService
+from dataline.services.result import run_sql_query
 from dataline.services.settings import SettingsService
+from dataline.utils.metrics import observe_stage, timed_stage
 from dataline.utils.utils import stream_event_str
 
 logger = logging.getLogger(__name__)
 
+# Keep references to the summary tasks so they are not garbage collected before they finish
+_background_tasks: set[asyncio.Task[None]] = set()
+
+
+def get_cacheable_sql(results: Sequence[ResultType]) -> str | None:
+    """
+    SQL answering the question, if it is worth caching: the last query that ran successfully.
+    Answers with a chart are not cached, the chart is generated by the LLM from the question.
+    """
+    if any(isinstance(result, ChartGenerationResult) for result in results):
+        return None
+
+    run_ids = {result.linked_id for result in results if isinstance(result, SQLQueryRunResult)}
+    for result in reversed(results):
+        if isinstance(result, SQLQueryStringResult) and result.ephemeral_id in run_ids:
+            return result.sql
+    return None
+
 
 class ConversationService:
     conversation_repo: ConversationRepository
@@ -48,6 +81,8 @@ class ConversationService:
     result_repo: ResultRepository
     connection_service: ConnectionService
     settings_service: SettingsService
+    profiling_service: ProfilingService
+    query_cache_service: QueryCacheService
 
     def __init__(
         self,
@@ -56,12 +91,16 @@ class ConversationService:
         result_repo: ResultRepository = Depends(ResultRepository),
         connection_service: ConnectionService = Depends(ConnectionService),
         settings_service: SettingsService = Depends(SettingsService),
+        profiling_service: ProfilingService = Depends(ProfilingService),
+        query_cache_service: QueryCacheService = Depends(QueryCacheService),
     ) -> None:
         self.conversation_repo = conversation_repo
         self.message_repo = message_repo
         self.result_repo = result_repo
         self.connection_service = connection_service
         self.settings_service = settings_service
+        self.profiling_service = profiling_service
+        self.query_cache_service = query_cache_service
 
     async def create_conversation(
         self,
@@ -69,14 +108,38 @@ class ConversationService:
         connection_id: UUID,
         name: str,
     ) -> ConversationOut:
-        conversation = await self.conversation_repo.create(
-            session, ConversationCreate(connection_id=connection_id, name=name)
+        conversation = ConversationOut.model_validate(
+            await self.conversation_repo.create(session, ConversationCreate(connection_id=connection_id, name=name))
         )
-        return ConversationOut.model_validate(conversation)
+        cache.set_conversation(session, conversation)
+        return conversation
 
     async def get_conversation(self, session: AsyncSession, conversation_id: UUID) -> ConversationOut:
-        conversation = await self.conversation_repo.get_by_uuid(session, conversation_id)
-        return ConversationOut.model_validate(conversation)
+        cached_conversation = cache.get_conversation(conversation_id)
+        if cached_conversation is not None:
+            return cached_conversation
+
+        conversation = ConversationOut.model_validate(
+            await self.conversation_repo.get_by_uuid(session, conversation_id)
+        )
+        cache.set_conversation(session, conversation)
+        return conversation
+
+    async def get_conversation_with_connection(
+        self, session: AsyncSession, conversation_id: UUID
+    ) -> tuple[ConversationOut, ConnectionOut]:
+        conversation = cache.get_conversation(conversation_id)
+        connection = cache.get_connection(conversation.connection_id) if conversation else None
+        if conversation is not None and connection is not None:
+            return conversation, connection
+
+        # Load both in one query
+        conversation_model = await self.conversation_repo.get_with_connection(session, conversation_id)
+        conversation = ConversationOut.model_validate(conversation_model)
+        connection = ConnectionOut.model_validate(conversation_model.connection)
+        cache.set_conversation(session, conversation)
+        cache.set_connection(session, connection)
+        return conversation, connection
 
     async def get_conversation_with_messages(
         self, session: AsyncSession, conversation_id: UUID
@@ -92,6 +155,7 @@ class ConversationService:
 
     async def delete_conversation(self, session: AsyncSession, conversation_id: UUID) -> None:
         await self.conversation_repo.delete_by_uuid(session, record_id=conversation_id)
+        cache.invalidate_conversation(session, conversation_id)
 
     async def update_conversation_name(
         self, session: AsyncSession, conversation_id: UUID, name: str
@@ -99,7 +163,9 @@ class ConversationService:
         conversation = await self.conversation_repo.update_by_uuid(
             session, conversation_id, ConversationUpdate(name=name)
         )
-        return ConversationOut.model_validate(conversation)
+        conversation_out = ConversationOut.model_validate(conversation)
+        cache.set_conversation(session, conversation_out)
+        return conversation_out
 
     async def query(
         self,
@@ -107,33 +173,72 @@ class ConversationService:
         conversation_id: UUID,
         query: str,
         secure_data: bool = True,
+        use_cache: bool = True,
     ) -> AsyncGenerator[str, None]:
         # Get conversation, connection, user settings
-        conversation = await self.get_conversation(session, conversation_id=conversation_id)
-        connection = await self.connection_service.get_connection(session, connection_id=conversation.connection_id)
-        user_with_model_details = await self.settings_service.get_model_details(session)
+        with timed_stage("conversation_lookup"):
+            conversation, connection = await self.get_conversation_with_connection(session, conversation_id)
+        with timed_stage("settings_lookup"):
+            user_with_model_details = await self.settings_service.get_model_details(session)
 
-        # Create query graph
-        query_graph = QueryGraphService(
-            dsn=connection.dsn,
-        )
-        history = await self.get_conversation_history(session, conversation_id)
+        # Column profiles contain data values, only share them with the LLM when data is not secure
+        table_profiles = None
+        if not secure_data and config.inject_column_profiles:
+            table_profiles = await self.profiling_service.get_table_profiles(session, connection.id)
+            if not table_profiles:
+                # Compute them for the next queries without delaying this one
+                schedule_connection_profiling(connection.id, connection.dsn, connection.statement_timeout_seconds)
+
+        with timed_stage("history_load"):
+            history = await self.get_conversation_history(session, conversation_id)
+
+        # Only questions opening a conversation are cached, follow-ups depend on the previous messages
+        use_cache = use_cache and config.query_cache_enabled and not history
+        chunks: AsyncGenerator[tuple[Sequence[BaseMessage] | None, Sequence[ResultType] | None], None] | None = None
+        if use_cache:
+            with timed_stage("query_cache_lookup"):
+                cached_sql = await self.query_cache_service.lookup(
+                    session,
+                    connection.id,
+                    connection.dsn,
+                    query,
+                    statement_timeout_seconds=connection.statement_timeout_seconds,
+                )
+            if cached_sql is not None:
+                chunks = await self.get_cached_answer(connection, cached_sql, secure_data)
+                # Nothing new to cache when answered from the cache
+                use_cache = chunks is None
+
+        if chunks is None:
+            # The LLM stack (langgraph, langchain, mirascope, openai) is slow to import, load it on the first query
+            from dataline.services.llm_flow.graph import QueryGraphService
+
+            # Create query graph
+            with timed_stage("graph_setup"):
+                query_graph = QueryGraphService(
+                    dsn=connection.dsn,
+                    table_profiles=table_profiles,
+                    statement_timeout_seconds=connection.statement_timeout_seconds,
+                )
+            langsmith_api_key = user_with_model_details.langsmith_api_key
+            chunks = query_graph.query(
+                query=query,
+                options=QueryOptions(
+                    secure_data=secure_data,
+                    openai_api_key=user_with_model_details.openai_api_key.get_secret_value(),  # type: ignore
+                    langsmith_api_key=(
+                        langsmith_api_key.get_secret_value() if langsmith_api_key else None  # type: ignore
+                    ),
+                    model_name=user_with_model_details.preferred_openai_model,
+                ),
+                history=history,
+            )
 
         messages: list[BaseMessage] = []
         results: list[ResultType] = []
         # Perform query and execute graph
-        langsmith_api_key = user_with_model_details.langsmith_api_key
-
-        async for chunk in query_graph.query(
-            query=query,
-            options=QueryOptions(
-                secure_data=secure_data,
-                openai_api_key=user_with_model_details.openai_api_key.get_secret_value(),  # type: ignore
-                langsmith_api_key=langsmith_api_key.get_secret_value() if langsmith_api_key else None,  # type: ignore
-                model_name=user_with_model_details.preferred_openai_model,
-            ),
-            history=history,
-        ):
+        graph_start = time.perf_counter()
+        async for chunk in chunks:
             (chunk_messages, chunk_results) = chunk
             if chunk_messages is not None:
                 messages.extend(chunk_messages)
@@ -147,6 +252,8 @@ class ConversationService:
                             data=result.serialize_result().model_dump_json(),
                         )
 
+        observe_stage("graph_run", time.perf_counter() - graph_start)
+
         # Find first AI message from the back
         last_ai_message = None
         for message in reversed(messages):
@@ -157,6 +264,7 @@ class ConversationService:
             raise Exception("No AI message found in conversation")
 
         # Store human message and final AI message without flushing
+        store_start = time.perf_counter()
         human_message = await self.message_repo.create(
             session,
             MessageCreate(
@@ -168,7 +276,8 @@ class ConversationService:
             flush=False,
         )
 
-        # Store final AI message in history
+        # Store final AI message in history, with the usage of every OpenAI call of the turn
+        usage = get_turn_usage(messages)
         stored_ai_message = await self.message_repo.create(
             session,
             MessageCreate(
@@ -176,6 +285,9 @@ class ConversationService:
                 content=str(last_ai_message.content),
                 conversation_id=conversation_id,
                 options=MessageOptions(secure_data=secure_data),
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                cost_usd=usage.cost_usd,
             ),
             flush=True,
         )
@@ -185,6 +297,18 @@ class ConversationService:
             if isinstance(result, StorableResultMixin):
                 await result.store_result(session, self.result_repo, stored_ai_message.id)
 
+        if use_cache:
+            cacheable_sql = get_cacheable_sql(results)
+            if cacheable_sql is not None:
+                await self.query_cache_service.store(
+                    session,
+                    connection.id,
+                    connection.dsn,
+                    query,
+                    cacheable_sql,
+                    statement_timeout_seconds=connection.statement_timeout_seconds,
+                )
+
         # Go over stored results, replace linked_id with the stored result_id
         for result in results:
             if hasattr(result, "linked_id"):
@@ -206,6 +330,8 @@ class ConversationService:
                             session, result.result_id, ResultUpdate(linked_id=linked_result.result_id)
                         )
 
+        observe_stage("store_results", time.perf_counter() - store_start)
+
         # Render renderable results
         serialized_results = [
             result.serialize_result() for result in results if isinstance(result, RenderableResultMixin)
@@ -219,13 +345,140 @@ class ConversationService:
         )
         yield stream_event_str(event=QueryStreamingEventType.STORED_MESSAGES.value, data=query_out.model_dump_json())
 
+        # Done in the background once the messages are committed, so the OpenAI call neither delays the end of
+        # the stream nor holds the write lock of the request's transaction
+        if config.summarize_history:
+            api_key = user_with_model_details.openai_api_key.get_secret_value()
+            run_after_commit(
+                session, lambda: self.schedule_summary_update(conversation_id, stored_ai_message.id, api_key)
+            )
+
+    async def get_cached_answer(
+        self, connection: ConnectionOut, sql: str, secure_data: bool
+    ) -> AsyncGenerator[tuple[Sequence[BaseMessage] | None, Sequence[ResultType] | None], None] | None:
+        """Answer with the results of a cached SQL query, without calling the LLM. None if the query fails."""
+        try:
+            query_run_data = await run_sql_query(
+                connection.dsn, sql, statement_timeout_seconds=connection.statement_timeout_seconds
+            )
+        except Exception:
+            logger.exception("Cached SQL query failed, falling back to the LLM")
+            return None
+
+        query_string_result = SQLQueryStringResult(sql=sql)
+        query_run_result = SQLQueryRunResult(
+            columns=query_run_data.columns,
+            rows=query_run_data.rows,
+            truncated=query_run_data.truncated,
+            total_rows_estimate=query_run_data.total_rows_estimate,
+            linked_id=query_string_result.ephemeral_id,
+            is_secure=secure_data,
+        )
+        message = AIMessage(
+            content="This question was answered before on this connection, here is the SQL query used then "
+            "and its up to date results."
+        )
+
+        async def answer() -> AsyncGenerator[tuple[Sequence[BaseMessage] | None, Sequence[ResultType] | None], None]:
+            yield [message], [query_string_result, query_run_result]
+
+        return answer()
+
     async def get_conversation_history(self, session: AsyncSession, conversation_id: UUID) -> list[BaseMessage]:
         """
-        Get the last 10 messages of a conversation (AI, Human, and System)
+        Get the summary of older messages and the last messages of a conversation (AI, Human, and System)
+        Messages already in the summary are not replayed.
         """
-        messages = await self.message_repo.get_by_conversation_with_sql_results(session, conversation_id, n=10)
-        base_messages = []
-        for message in reversed(messages):  # Reverse to get the oldest messages first (chat format)
+        conversation = await self.conversation_repo.get_by_uuid(session, conversation_id)
+        messages = await self.message_repo.get_by_conversation_with_sql_results(
+            session, conversation_id, n=config.history_max_messages
+        )
+        base_messages: list[BaseMessage] = []
+        if conversation.summary and conversation.summarized_until:
+            summarized_until = datetime.fromisoformat(str(conversation.summarized_until))
+            messages = [
+                message for message in messages if datetime.fromisoformat(str(message.created_at)) > summarized_until
+            ]
+            base_messages.append(
+                SystemMessage(content=f"Summary of the earlier messages of this conversation:\n{conversation.summary}")
+            )
+
+        # Reverse to get the oldest messages first (chat format)
+        return base_messages + self._to_base_messages(list(reversed(messages)))
+
+    def schedule_summary_update(self, conversation_id: UUID, message_id: UUID, api_key: str) -> None:
+        """Update the summary of a conversation in the background, its usage is added to the given message."""
+        task = asyncio.create_task(self._update_summary_in_background(conversation_id, message_id, api_key))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def _update_summary_in_background(self, conversation_id: UUID, message_id: UUID, api_key: str) -> None:
+        try:
+            # Reads don't start a transaction, the write lock is only taken by the update after the OpenAI call
+            async with SessionCreator.begin() as session:
+                with timed_stage("summary_update"):
+                    summary_usage = await self.update_conversation_summary(session, conversation_id, api_key=api_key)
+                if summary_usage is not None:
+                    await self.message_repo.add_usage(
+                        session,
+                        message_id,
+                        prompt_tokens=summary_usage.prompt_tokens,
+                        completion_tokens=summary_usage.completion_tokens,
+                        cost_usd=summary_usage.cost_usd,
+                    )
+        except Exception:
+            logger.exception(f"Could not update summary of conversation {conversation_id}")
+
+    async def update_conversation_summary(
+        self, session: AsyncSession, conversation_id: UUID, api_key: str
+    ) -> TokenUsage | None:
+        """
+        Fold the messages that are no longer replayed verbatim into the conversation summary.
+        Called after each turn, so every call only summarizes the last few messages.
+        Returns the usage of the summary call, None when there was nothing to summarize.
+        """
+        conversation = await self.conversation_repo.get_by_uuid(session, conversation_id)
+        messages = await self.message_repo.get_by_conversation_with_sql_results_after(
+            session, conversation_id, created_after=conversation.summarized_until
+        )
+        to_summarize = messages[: max(len(messages) - config.history_recent_messages, 0)]
+        if not to_summarize:
+            return None
+
+        new_messages = "\n".join(
+            f"{message.type}: {message.content}" for message in self._to_base_messages(to_summarize)
+        )
+        from dataline.services.llm_flow.llm_calls.conversation_summarizer import (
+            SummarizeConversationCall,
+        )
+
+        summary_call = SummarizeConversationCall(
+            api_key=api_key, current_summary=conversation.summary or "(empty)", new_messages=new_messages
+        )
+        response = await summary_call.call_async()
+        await self.conversation_repo.update_by_uuid(
+            session,
+            conversation_id,
+            ConversationUpdate(summary=response.content.strip(), summarized_until=to_summarize[-1].created_at),
+        )
+        return usage_from_completion(summary_call.call_params.model, response.response)
+
+    async def get_token_usage(
+        self,
+        session: AsyncSession,
+        connection_id: UUID | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> list[TokenUsageOut]:
+        rows = await self.message_repo.get_usage_by_connection_and_day(
+            session, connection_id=connection_id, start=start, end=end
+        )
+        return [TokenUsageOut.model_validate(row._asdict()) for row in rows]
+
+    @staticmethod
+    def _to_base_messages(messages: Sequence[MessageModel]) -> list[BaseMessage]:
+        base_messages: list[BaseMessage] = []
+        for message in messages:
             if message.role == BaseMessageType.HUMAN.value:
                 base_messages.append(HumanMessage(content=message.content))
             elif message.role == BaseMessageType.AI.value:
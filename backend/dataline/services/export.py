@@ -0,0 +1,214 @@
+"""
+Export of the full results of a SQL query as CSV, Parquet or Arrow IPC.
+Rows are read with a server side cursor and written chunk by chunk, so exports use constant memory.
+"""
+
+import csv
+import io
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataline.config import config
+from dataline.errors import UserFacingError
+from dataline.models.result.schema import ExportFormat
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+    ExportFormat.arrow: ARROW_STREAM_MEDIA_TYPE,
+}
+# Schema metadata key of the result fields other than columns and rows, as JSON
+ARROW_RESULT_METADATA_KEY = "dataline_result"
+# Arrow types of the SQLite storage classes (typeof), by name of their pyarrow factory
+SQLITE_ARROW_TYPES = {"integer": "int64", "real": "float64", "text": "string", "blob": "binary"}
+
+logger = logging.getLogger(__name__)
+
+
+def require_pyarrow() -> None:
+    """:raises: UserFacingError if pyarrow, needed for Parquet and Arrow, is not installed"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise UserFacingError("Parquet and Arrow exports need pyarrow, install it with: pip install pyarrow")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write only file collecting what pyarrow writers produce, drained after every chunk."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:  # type: ignore[misc]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _first_schema(batch: "pa.RecordBatch") -> "pa.Schema":
+    """Schema of an export from its first chunk, with types wide enough for the values of the next chunks."""
+    import pyarrow as pa
+
+    fields = []
+    for field in batch.schema:
+        if pa.types.is_null(field.type):
+            # Only NULLs in the first chunk, later values are converted to text
+            field = field.with_type(pa.string())
+        elif pa.types.is_decimal(field.type):
+            # The precision is inferred from the first values, later ones can have more digits
+            field = field.with_type(pa.decimal128(38, field.type.scale))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _record_batch(columns: list[str], rows: Sequence[Sequence[Any]], schema: "pa.Schema | None") -> "pa.RecordBatch":
+    """Chunk of rows as a record batch, of the given schema if any, values not matching their type become text."""
+    import pyarrow as pa
+
+    values = list(zip(*rows)) if rows else [() for _ in columns]
+    if schema is None:
+        batch = pa.RecordBatch.from_arrays([_arrow_column(column) for column in values], names=columns)
+        return batch.cast(_first_schema(batch))
+    return pa.RecordBatch.from_arrays(
+        [_arrow_column(column, field.type) for column, field in zip(values, schema)], schema=schema
+    )
+
+
+def _sqlite_schema(connection: Connection, sql: str, columns: list[str]) -> "pa.Schema | None":
+    """
+    Schema of a SQLite query from the storage classes of all its values, read with an extra pass over the results.
+    SQLite columns are not typed, a column can hold integers in the first chunk and text in the next ones.
+    """
+    import pyarrow as pa
+
+    quote = connection.dialect.identifier_preparer.quote
+    storage_classes = ", ".join(f"group_concat(DISTINCT typeof({quote(column)}))" for column in columns)
+    try:
+        row = connection.execute(text(f"SELECT {storage_classes} FROM ({sql})")).one()
+    except SQLAlchemyError:
+        # ex. duplicate column names, the schema is inferred from the first chunk instead
+        logger.warning("Could not read the column types of a SQLite export", exc_info=True)
+        return None
+
+    fields = []
+    for column, classes in zip(columns, row):
+        value_classes = set((classes or "").split(",")) - {"", "null"}
+        if value_classes == {"integer", "real"}:
+            arrow_type = pa.float64()
+        elif len(value_classes) == 1:
+            arrow_type = getattr(pa, SQLITE_ARROW_TYPES[value_classes.pop()])()
+        else:
+            # Mixed storage classes, or only NULLs
+            arrow_type = pa.string()
+        fields.append(pa.field(column, arrow_type))
+    return pa.schema(fields)
+
+
+def _csv_chunks(columns: list[str], partitions: Iterator[Sequence[Any]]) -> Iterator[bytes]:  # type: ignore[misc]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty result
+        yield buffer.getvalue().encode()
+
+
+def _arrow_writer(sink: _ChunkSink, schema: "pa.Schema", export_format: ExportFormat) -> Any:  # type: ignore[misc]
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if export_format == ExportFormat.parquet:
+        return pq.ParquetWriter(sink, schema)
+    return pa.ipc.new_stream(sink, schema)
+
+
+def _arrow_chunks(  # type: ignore[misc]
+    columns: list[str],
+    partitions: Iterator[Sequence[Any]],
+    export_format: ExportFormat,
+    schema: "pa.Schema | None" = None,
+) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    writer = None
+    for rows in partitions:
+        batch = _record_batch(columns, rows, schema)
+        if writer is None:
+            # Later chunks are converted to the schema of the first one, the file has a single schema
+            schema = batch.schema
+            writer = _arrow_writer(sink, schema, export_format)
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    if writer is None:
+        # Empty result, the file still has the columns
+        writer = _arrow_writer(sink, schema or _record_batch(columns, [], None).schema, export_format)
+    writer.close()
+    yield sink.drain()
+
+
+def accepts_arrow(accept_header: str | None) -> bool:
+    """Whether a client asked for Arrow IPC in its Accept header, JSON stays the default."""
+    media_types = [media_type.split(";")[0].strip() for media_type in (accept_header or "").split(",")]
+    return ARROW_STREAM_MEDIA_TYPE in media_types
+
+
+def _arrow_column(values: Sequence[Any], arrow_type: "pa.DataType | None" = None) -> "pa.Array":  # type: ignore[misc]
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns of mixed types (ex. on SQLite) are sent as text
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def encode_arrow_result(columns: list[str], rows: Sequence[Sequence[Any]], metadata: dict[str, Any]) -> bytes:  # type: ignore[misc]
+    """Arrow IPC stream of a query result, the other result fields are in the schema metadata."""
+    import pyarrow as pa
+
+    arrays = [_arrow_column(values) for values in zip(*rows)] if rows else [pa.array([]) for _ in columns]
+    table = pa.Table.from_arrays(arrays, names=columns)
+    table = table.replace_schema_metadata({ARROW_RESULT_METADATA_KEY: json.dumps(metadata, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def stream_export(db: "SQLDatabase", sql: str, export_format: ExportFormat) -> Iterator[bytes]:
+    """Chunks of the exported results of a query. The database engine is disposed of once the export is done."""
+    try:
+        with db._engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=config.export_chunk_rows).execute(
+                text(sql)
+            )
+            columns = list(result.keys())
+            if export_format == ExportFormat.csv:
+                yield from _csv_chunks(columns, result.partitions())
+            else:
+                schema = _sqlite_schema(connection, sql, columns) if db.dialect == "sqlite" else None
+                yield from _arrow_chunks(columns, result.partitions(), export_format, schema)
+    finally:
+        db._engine.dispose()
@@ -1,7 +1,7 @@
+import asyncio
 import logging
 from typing import AsyncGenerator, Sequence, Type
 
-from langchain_community.utilities.sql_database import SQLDatabase
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.runnables.config import RunnableConfig
 from langchain_core.tracers.langchain import LangChainTracer
@@ -10,6 +10,7 @@ from langgraph.prebuilt import ToolExecutor
 from langsmith import Client
 
 from dataline.models.llm_flow.schema import QueryOptions, ResultType
+from dataline.models.table_profile.schema import TableProfile
 from dataline.services.llm_flow.nodes import (
     CallModelNode,
     CallToolNode,
@@ -18,11 +19,16 @@ from dataline.services.llm_flow.nodes import (
     ShouldCallToolCondition,
 )
 from dataline.services.llm_flow.prompt import SQL_FUNCTIONS_SUFFIX, SQL_PREFIX
+from dataline.services.llm_flow.query_execution import (
+    cancel_running_statements,
+    connect_database,
+)
 from dataline.services.llm_flow.toolkit import (
     ChartGeneratorTool,
     QueryGraphState,
     SQLDatabaseToolkit,
 )
+from dataline.utils.metrics import timed_stage
 from dataline.utils.utils import forward_connection_errors
 
 logger = logging.getLogger(__name__)
@@ -44,16 +50,20 @@ class QueryGraphService:
     def __init__(
         self,
         dsn: str,
+        table_profiles: Sequence[TableProfile] | None = None,
+        statement_timeout_seconds: int | None = None,
     ) -> None:
         # Enable this try catch once we support errors with streaming responses
         try:
-            self.db = SQLDatabase.from_uri(dsn)
+            self.db = connect_database(dsn, statement_timeout_seconds)
         except Exception as e:
             forward_connection_errors(e)
             raise e
 
         self.db._sample_rows_in_table_info = 0  # Preventative security
-        self.toolkit = SQLDatabaseToolkit(db=self.db)
+        self.toolkit = SQLDatabaseToolkit(
+            db=self.db, table_profiles={profile.table_name: profile.render() for profile in table_profiles or []}
+        )
         all_tools = self.toolkit.get_tools() + [ChartGeneratorTool()]
         self.tool_executor = ToolExecutor(tools=all_tools)
         self.tracer = None  # no tracing by default
@@ -68,8 +78,9 @@ class QueryGraphService:
         if history is None:
             history = []
 
-        graph = self.build_graph()
-        app = graph.compile()
+        with timed_stage("graph_compile"):
+            graph = self.build_graph()
+            app = graph.compile()
 
         if not options.secure_data:
             self.db._sample_rows_in_table_info = 3
@@ -87,11 +98,16 @@ class QueryGraphService:
         config: RunnableConfig | None = {"callbacks": [self.tracer]} if self.tracer is not None else None
         current_results: Sequence[ResultType] | None
         current_messages: Sequence[BaseMessage] | None
-        async for chunk in app.astream(initial_state, config=config):
-            for tool, tool_chunk in chunk.items():
-                current_results = tool_chunk.get("results")
-                current_messages = tool_chunk.get("messages")
-                yield (current_messages, current_results)
+        try:
+            async for chunk in app.astream(initial_state, config=config):
+                for tool, tool_chunk in chunk.items():
+                    current_results = tool_chunk.get("results")
+                    current_messages = tool_chunk.get("messages")
+                    yield (current_messages, current_results)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client disconnected, the node thread would otherwise keep the query running on the database
+            cancel_running_statements(self.db)
+            raise
 
     def build_graph(self) -> StateGraph:
         # Create the graph
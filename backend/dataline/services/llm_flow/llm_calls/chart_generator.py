@@ -1,18 +1,11 @@
-from enum import Enum
-from typing import Type
+import json
+from typing import Any, Type
 
 from mirascope import tags
 from mirascope.openai import OpenAICallParams, OpenAIExtractor
 from pydantic import BaseModel, Field
 
-
-class ChartType(Enum):
-    bar = "bar"
-    doughnut = "doughnut"
-    line = "line"
-    # bubble = "bubble"
-    # radar = "radar"
-
+from dataline.models.llm_flow.enums import ChartType
 
 TEMPLATES: dict[ChartType, str] = {
     ChartType.line: """{
@@ -169,6 +162,64 @@ TEMPLATES: dict[ChartType, str] = {
 }
 
 
+# Same colours as the templates, cycled through by Chart.js when there are more data points
+CHART_PALETTE: list[tuple[int, int, int]] = [
+    (255, 99, 132),
+    (54, 162, 235),
+    (255, 205, 86),
+    (75, 192, 192),
+    (153, 102, 255),
+    (255, 159, 64),
+    (201, 203, 207),
+]
+
+MAX_TITLE_LENGTH = 80
+
+
+def chart_title_from_request(request: str) -> str:
+    title = " ".join(request.split()).rstrip(".")
+    if len(title) > MAX_TITLE_LENGTH:
+        title = title[: MAX_TITLE_LENGTH - 3].rsplit(" ", 1)[0] + "..."
+    return title[:1].upper() + title[1:]
+
+
+def build_chart_json(chart_type: ChartType, title: str, x_label: str | None = None, y_label: str | None = None) -> str:
+    """
+    Build a Chart.js config for a chart type without calling the LLM.
+    Data and labels are left empty, they are filled in by query_run_result_to_chart_json.
+    """
+    rgb = [f"rgb({r}, {g}, {b})" for r, g, b in CHART_PALETTE]
+    rgba = [f"rgba({r}, {g}, {b}, 0.5)" for r, g, b in CHART_PALETTE]
+
+    dataset: dict[str, Any]  # type: ignore[misc]
+    if chart_type == ChartType.bar:
+        dataset = {"data": [], "backgroundColor": rgba, "borderColor": rgb, "borderWidth": 1}
+    elif chart_type == ChartType.line:
+        dataset = {"data": [], "borderColor": rgb[1], "backgroundColor": rgba[1], "fill": False, "tension": 0.1}
+    elif chart_type == ChartType.doughnut:
+        dataset = {"data": [], "backgroundColor": rgb, "hoverOffset": 4}
+    else:
+        raise ValueError(f"Chart type {chart_type} is not supported.")
+
+    if y_label:
+        dataset["label"] = y_label
+
+    options: dict[str, Any] = {  # type: ignore[misc]
+        "plugins": {
+            # Only doughnut charts need a legend to map colours to labels
+            "legend": {"display": chart_type == ChartType.doughnut},
+            "title": {"display": True, "text": title},
+        }
+    }
+    if chart_type in [ChartType.bar, ChartType.line]:
+        options["scales"] = {
+            "x": {"title": {"display": bool(x_label), "text": x_label or ""}},
+            "y": {"beginAtZero": True, "title": {"display": bool(y_label), "text": y_label or ""}},
+        }
+
+    return json.dumps({"type": chart_type.value, "data": {"labels": [], "datasets": [dataset]}, "options": options})
+
+
 class ShouldGenerateChart(BaseModel):
     should_generate_chart: bool
     chart_type: ChartType | None = None
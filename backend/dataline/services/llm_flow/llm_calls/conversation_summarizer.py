@@ -0,0 +1,29 @@
+from mirascope import tags
+from mirascope.openai import OpenAICall, OpenAICallParams
+
+
+@tags(["version:0001"])
+class SummarizeConversationCall(OpenAICall):
+    call_params = OpenAICallParams(model="gpt-3.5-turbo", temperature=0)
+    api_key: str | None
+
+    prompt_template = """
+    SYSTEM:
+    You maintain the memory of a conversation between a user and an assistant that answers questions
+    by writing SQL queries against the user's database.
+    Update the current summary with the new messages. Keep what is needed to answer follow-up questions:
+    the user's goals, the tables, columns and filters that were used, definitions the user gave
+    and conclusions that were reached. Drop greetings and anything superseded by later messages.
+    Keep the summary under {max_words} words. Only return the updated summary.
+
+    USER:
+    Current summary:
+    {current_summary}
+
+    New messages:
+    {new_messages}
+    """
+
+    current_summary: str
+    new_messages: str
+    max_words: int = 250
@@ -1,5 +1,6 @@
+import json
 from abc import ABC, abstractmethod
-from typing import cast
+from typing import Any, Sequence, cast
 
 from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
 from langchain_core.utils.function_calling import convert_to_openai_function
@@ -16,6 +17,8 @@ from dataline.services.llm_flow.toolkit import (
     StateUpdaterTool,
     state_update,
 )
+from dataline.services.llm_flow.usage import TokenUsage, attach_usage, estimate_usage, usage_from_message
+from dataline.utils.metrics import timed, timed_stage
 
 NodeName = str
 
@@ -43,14 +46,24 @@ class Condition(ABC):
         raise NotImplementedError
 
 
+def estimate_call_usage(  # type: ignore[misc]
+    model_name: str, messages: Sequence[BaseMessage], tools: list[dict[str, Any]], response: AIMessage
+) -> TokenUsage:
+    prompt = "\n".join(str(message.content) for message in messages) + json.dumps(tools)
+    completion = str(response.content) + json.dumps([tool_call["args"] for tool_call in response.tool_calls])
+    return estimate_usage(model_name, prompt, completion)
+
+
 class CallModelNode(Node):
     __name__ = "call_model"
 
     @classmethod
+    @timed("call_model")
     def run(cls, state: QueryGraphState) -> QueryGraphStateUpdate:
         # TODO: Consider replacing with mirascope
+        # Not streamed: the response is only used once complete, and OpenAI only reports usage on complete responses
         model = ChatOpenAI(
-            model=state.options.model_name, api_key=state.options.openai_api_key, temperature=0, streaming=True
+            model=state.options.model_name, api_key=state.options.openai_api_key, temperature=0, streaming=False
         )
         sql_tools = state.sql_toolkit.get_tools()
         all_tools = sql_tools + [ChartGeneratorTool()]
@@ -61,7 +74,7 @@ class CallModelNode(Node):
         # Useful to limit tokens when graph recursion is very deep
         last_n_messages = state.messages[-20:]
         try:
-            response = model.invoke(last_n_messages)
+            response = cast(AIMessage, model.invoke(last_n_messages))
         except RateLimitError as e:
             body = cast(dict, e.body)
             raise UserFacingError(body.get("message", "OpenAI API rate limit exceeded"))
@@ -71,6 +84,10 @@ class CallModelNode(Node):
         except Exception as e:
             raise UserFacingError(str(e))
 
+        usage = usage_from_message(state.options.model_name, response) or estimate_call_usage(
+            state.options.model_name, last_n_messages, tools, response
+        )
+        attach_usage(response, usage)
         return state_update(messages=[response])
 
 
@@ -86,19 +103,20 @@ class CallToolNode(Node):
         results: list[QueryResultSchema] = []
         for tool_call in last_message.tool_calls:
             tool = state.tool_executor.tool_map[tool_call["name"]]
-            if isinstance(tool, StateUpdaterTool):
-                updates = tool.get_response(state, tool_call["args"], str(tool_call["id"]))
-                output_messages.extend(updates["messages"])
-                results.extend(updates["results"])
-
-            else:
-                # We call the tool_executor and get back a response
-                response = tool.run(tool_call["args"])
-                # We use the response to create a ToolMessage
-                tool_message = ToolMessage(
-                    content=str(response), name=tool_call["name"], tool_call_id=str(tool_call["id"])
-                )
-                output_messages.append(tool_message)
+            with timed_stage(f"tool:{tool_call['name']}"):
+                if isinstance(tool, StateUpdaterTool):
+                    updates = tool.get_response(state, tool_call["args"], str(tool_call["id"]))
+                    output_messages.extend(updates["messages"])
+                    results.extend(updates["results"])
+
+                else:
+                    # We call the tool_executor and get back a response
+                    response = tool.run(tool_call["args"])
+                    # We use the response to create a ToolMessage
+                    tool_message = ToolMessage(
+                        content=str(response), name=tool_call["name"], tool_call_id=str(tool_call["id"])
+                    )
+                    output_messages.append(tool_message)
 
         # We return a list, because this will get added to the existing list
         return state_update(messages=output_messages, results=results)
@@ -0,0 +1,243 @@
+"""
+Classification of the statements sent to target databases, without a full SQL parser:
+literals and comments are masked, then the remaining keywords are inspected.
+Table references and nested statements are found by a tokenizer.
+"""
+
+import re
+
+from pydantic import BaseModel
+
+# String literals, quoted identifiers and comments, masked before looking for keywords in a query
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/", re.DOTALL)
+# Statements only reading data, EXPLAIN ANALYZE is excluded below as it runs the statement
+READ_STATEMENTS = {"SELECT", "WITH", "VALUES", "TABLE", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+# Statements writing data, changing the schema or taking locks, rejected where a statement starts in a read statement:
+# the body of a CTE (a data modifying CTE) or the statement explained by EXPLAIN
+WRITE_STATEMENTS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "CREATE", "DROP", "ALTER", "TRUNCATE", "RENAME", "GRANT", "REVOKE",
+    "COPY", "CALL", "EXEC", "EXECUTE", "LOCK", "VACUUM", "ANALYZE", "ATTACH", "DETACH",
+}  # fmt: skip
+# Clauses writing data or taking row locks in a SELECT: SELECT ... INTO, FOR [NO KEY] UPDATE, FOR [KEY] SHARE
+# and MySQL's LOCK IN SHARE MODE. INTO, FOR and IN are reserved words, they can't be column names.
+WRITE_CLAUSE_PATTERN = re.compile(
+    r"\bINTO\b|\bFOR\s+(?:NO\s+)?(?:KEY\s+)?(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b", re.IGNORECASE
+)
+
+
+def mask_literals(query: str) -> str:
+    """Same length query with literals and comments blanked out, so offsets match the original query."""
+    return LITERAL_PATTERN.sub(lambda match: " " * len(match.group()), query)
+
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<skip>\s+|--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    |(?P<word>[^\W\d][\w$]*)
+    |(?P<number>\d+(?:\.\d*)?)
+    |(?P<symbol>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+# Keywords that can't be a table alias, or open a parenthesis without being a function call
+SQL_KEYWORDS = {
+    "AND", "AS", "BY", "CROSS", "ELSE", "END", "EXCEPT", "EXISTS", "FETCH", "FOR", "FROM", "FULL", "GROUP", "HAVING",
+    "IN", "INNER", "INTERSECT", "IS", "JOIN", "LATERAL", "LEFT", "LIMIT", "NATURAL", "NOT", "OFFSET", "ON", "ONLY",
+    "OR", "ORDER", "OUTER", "PIVOT", "QUALIFY", "RIGHT", "SELECT", "TABLESAMPLE", "THEN", "UNION", "UNPIVOT", "USING",
+    "VALUES", "WHEN", "WHERE", "WINDOW", "WITH",
+}  # fmt: skip
+
+
+class Token(BaseModel):
+    kind: str
+    text: str
+    # Whether the token is inside the parentheses of a function call, ex. EXTRACT(YEAR FROM date)
+    in_function: bool = False
+
+    @property
+    def keyword(self) -> str | None:
+        return self.text.upper() if self.kind == "word" else None
+
+    @property
+    def identifier(self) -> str | None:
+        """Name of a word or quoted identifier token, without quotes."""
+        if self.kind == "word":
+            return self.text
+        if self.kind == "quoted":
+            return self.text[1:-1]
+        return None
+
+
+class TableReference(BaseModel):
+    schema_name: str | None
+    table: str
+    alias: str | None
+    # As written in the query, ex. main."Rentals"
+    sql: str
+
+
+class QuerySyntaxError(ValueError): ...
+
+
+def tokenize(query: str) -> list[Token]:
+    """Tokens of a query without whitespace and comments. :raises: QuerySyntaxError on unbalanced quotes and parentheses"""
+    tokens: list[Token] = []
+    # For each open parenthesis, whether it is a function call
+    parentheses: list[bool] = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind, text = str(match.lastgroup), match.group()
+        if kind == "skip":
+            continue
+        if kind == "symbol" and text in "'\"`":
+            raise QuerySyntaxError(f"Unterminated quote {text} at: {query[match.start():][:30]}")
+        if text == ")":
+            if not parentheses:
+                raise QuerySyntaxError(f"Unbalanced closing parenthesis at: {query[match.start():][:30]}")
+            parentheses.pop()
+        tokens.append(Token(kind=kind, text=text, in_function=any(parentheses)))
+        if text == "(":
+            previous = tokens[-2] if len(tokens) > 1 else None
+            parentheses.append(
+                previous is not None and previous.kind == "word" and previous.keyword not in SQL_KEYWORDS
+            )
+    if parentheses:
+        raise QuerySyntaxError("Unbalanced parentheses, a closing parenthesis is missing.")
+    return tokens
+
+
+def _skip_parentheses(tokens: list[Token], index: int) -> int:
+    """Index after the parenthesis closing the one at index."""
+    depth = 0
+    for index in range(index, len(tokens)):
+        depth += {"(": 1, ")": -1}.get(tokens[index].text, 0)
+        if depth == 0:
+            return index + 1
+    return len(tokens)
+
+
+def _table_item(tokens: list[Token], index: int) -> tuple[TableReference | None, int]:
+    """Table (or subquery, or table function) of a FROM or JOIN clause starting at index, and the index after it."""
+    while index < len(tokens) and tokens[index].keyword in ("LATERAL", "ONLY"):
+        index += 1
+    if index >= len(tokens):
+        return None, index
+
+    reference = None
+    if tokens[index].text == "(":
+        index = _skip_parentheses(tokens, index)
+    elif tokens[index].identifier is not None:
+        start = index
+        parts = [str(tokens[index].identifier)]
+        while index + 2 < len(tokens) and tokens[index + 1].text == "." and tokens[index + 2].identifier is not None:
+            parts.append(str(tokens[index + 2].identifier))
+            index += 2
+        index += 1
+        if index < len(tokens) and tokens[index].text == "(":
+            # Table function, ex. generate_series(1, 10)
+            index = _skip_parentheses(tokens, index)
+        else:
+            sql = "".join(token.text for token in tokens[start:index])
+            reference = TableReference(
+                schema_name=parts[-2] if len(parts) > 1 else None, table=parts[-1], alias=None, sql=sql
+            )
+    else:
+        return None, index
+
+    if index < len(tokens) and tokens[index].keyword == "AS":
+        index += 1
+    if index < len(tokens) and tokens[index].identifier is not None and tokens[index].keyword not in SQL_KEYWORDS:
+        if reference is not None:
+            reference.alias = tokens[index].identifier
+        index += 1
+        if index < len(tokens) and tokens[index].text == "(":
+            # Column aliases, ex. AS t(a, b)
+            index = _skip_parentheses(tokens, index)
+    return reference, index
+
+
+def common_table_names(tokens: list[Token]) -> set[str]:
+    """Names of the common table expressions (WITH name AS (...)) of a query, lower cased."""
+    names = set()
+    for index, token in enumerate(tokens):
+        if token.identifier is None or index + 1 >= len(tokens):
+            continue
+        after = index + 1
+        if tokens[after].text == "(":
+            # Column names, ex. WITH name(a, b) AS (...)
+            after = _skip_parentheses(tokens, after)
+        if after + 1 < len(tokens) and tokens[after].keyword == "AS" and tokens[after + 1].text == "(":
+            names.add(str(token.identifier).lower())
+    return names
+
+
+def table_references(tokens: list[Token]) -> list[TableReference]:
+    """Tables read by a query, in FROM and JOIN clauses at any depth. Common table expressions are left out."""
+    ctes = common_table_names(tokens)
+    references = []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token.keyword not in ("FROM", "JOIN") or token.in_function:
+            index += 1
+            continue
+        if token.keyword == "FROM" and index > 0 and tokens[index - 1].keyword == "DISTINCT":
+            # Comparison, ex. amount IS DISTINCT FROM discount
+            index += 1
+            continue
+        index += 1
+        while True:
+            reference, index = _table_item(tokens, index)
+            if reference is not None and not (reference.schema_name is None and reference.table.lower() in ctes):
+                references.append(reference)
+            # FROM a, b
+            if token.keyword == "FROM" and index < len(tokens) and tokens[index].text == ",":
+                index += 1
+                continue
+            break
+    return references
+
+
+def _statement_starts(tokens: list[Token]) -> list[Token]:
+    """First tokens of the statements nested in a read statement: CTE bodies, and the statement explained by EXPLAIN."""
+    starts = []
+    for index in range(2, len(tokens)):
+        # WITH name AS (...) or WITH name AS [NOT] MATERIALIZED (...)
+        if tokens[index - 1].text == "(" and tokens[index - 2].keyword in ("AS", "MATERIALIZED"):
+            starts.append(tokens[index])
+    if tokens and tokens[0].keyword == "EXPLAIN":
+        # Options come first, ex. EXPLAIN ANALYZE, EXPLAIN (FORMAT JSON) or EXPLAIN QUERY PLAN
+        for token in tokens[1:]:
+            if token.keyword in ("ANALYZE", "ANALYSE"):
+                # Runs the explained statement
+                starts.append(token)
+            elif token.keyword in READ_STATEMENTS | WRITE_STATEMENTS:
+                starts.append(token)
+                break
+    return starts
+
+
+def read_only_violation(query: str) -> str | None:
+    """Reason why the query is not a single read only statement, None if it is."""
+    masked = mask_literals(query.strip().rstrip(";").rstrip())
+    if ";" in masked:
+        return "Only one statement can be run at a time."
+
+    first_keyword = re.match(r"[\s(]*(\w+)", masked)
+    if first_keyword is None or first_keyword.group(1).upper() not in READ_STATEMENTS:
+        return "Only SELECT queries can be run, the database is read only."
+
+    write_clause = WRITE_CLAUSE_PATTERN.search(masked)
+    if write_clause is not None:
+        return f"{' '.join(write_clause.group().upper().split())} is not allowed, the database is read only."
+
+    try:
+        tokens = tokenize(query.strip().rstrip(";"))
+    except QuerySyntaxError as e:
+        # Where statements nest can't be told, the query would fail on the database anyway
+        return str(e)
+    for token in _statement_starts(tokens):
+        if token.keyword in WRITE_STATEMENTS or token.keyword == "ANALYSE":
+            return f"{token.keyword} is not allowed, the database is read only."
+    return None
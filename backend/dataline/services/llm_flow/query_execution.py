@@ -0,0 +1,370 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional, Sequence, cast
+from weakref import WeakKeyDictionary, ref
+
+from fastapi.encoders import ENCODERS_BY_TYPE
+from sqlalchemy import Engine, Result, create_engine, event
+
+from dataline.config import config
+from dataline.models.llm_flow.enums import ChartType
+from dataline.models.llm_flow.schema import QueryRunData
+from dataline.services.llm_flow.query_classification import read_only_violation
+from dataline.services.llm_flow.query_limit import limit_query
+from dataline.utils.charts import downsample_chart_rows, render_chart_json
+from dataline.utils.metrics import timed
+
+if TYPE_CHECKING:
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class RunException(Exception):
+    message: str
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(message)
+
+
+class ChartValidationRunException(RunException): ...
+
+
+class QueryTimeoutRunException(RunException): ...
+
+
+class QueryCancelledRunException(RunException): ...
+
+
+class ReadOnlyRunException(RunException): ...
+
+
+def interrupt_connection(engine: Engine, dbapi_connection: Any) -> None:  # type: ignore[misc]
+    """Interrupt the statement running on a DBAPI connection, from another thread."""
+    if engine.dialect.name in ("mysql", "mariadb"):
+        # PyMySQL can't cancel its own statement, kill it from another connection
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f"KILL QUERY {int(dbapi_connection.thread_id())}")
+        return
+    # sqlite3 and duckdb interrupt, psycopg2 cancel
+    for method_name in ("interrupt", "cancel"):
+        method = getattr(dbapi_connection, method_name, None)
+        if callable(method):
+            method()
+            return
+    logger.warning(f"Statements can't be interrupted on {engine.dialect.name} databases")
+
+
+def execute_on_connect(engine: Engine, statement: str) -> None:
+    """Run a session setting statement on every new DBAPI connection of the engine."""
+
+    def execute(dbapi_connection: Any, connection_record: Any) -> None:  # type: ignore[misc]
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+        # Drivers opening a transaction for the statement (ex. psycopg2) would roll the setting back with it
+        dbapi_connection.commit()
+
+    event.listen(engine, "connect", execute)
+
+
+class StatementGuard:
+    """
+    Statement timeout and cancellation for the engine of a target database.
+    The timeout is enforced by the database where it supports one, otherwise the statement is interrupted.
+    """
+
+    def __init__(self, engine: Engine, timeout_seconds: int) -> None:
+        # Weak, the guard is the value of the engine in _guards and must not keep it alive
+        self._engine = ref(engine)
+        self.timeout_seconds = timeout_seconds
+        self.cancelled = False
+        # DBAPI connections checked out of the pool, ie. running a statement or fetching its rows
+        self._running: set[Any] = set()  # type: ignore[misc]
+        self._lock = threading.Lock()
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        if timeout_seconds:
+            self._listen_timeout()
+
+    @property
+    def engine(self) -> Engine:
+        engine = self._engine()
+        if engine is None:
+            raise RuntimeError("The engine of the statement guard was garbage collected")
+        return engine
+
+    def _listen_timeout(self) -> None:
+        dialect = self.engine.dialect.name
+        session_statements = {
+            "postgresql": f"SET statement_timeout = {self.timeout_seconds * 1000}",
+            "mysql": f"SET SESSION MAX_EXECUTION_TIME = {self.timeout_seconds * 1000}",
+            "mariadb": f"SET SESSION max_statement_time = {self.timeout_seconds}",
+            "snowflake": f"ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {self.timeout_seconds}",
+        }
+        if dialect in session_statements:
+            execute_on_connect(self.engine, session_statements[dialect])
+        elif dialect == "sqlite":
+            event.listen(self.engine, "connect", self._set_sqlite_progress_handler)
+            event.listen(self.engine, "before_cursor_execute", self._set_sqlite_deadline)
+        else:
+            event.listen(self.engine, "before_cursor_execute", self._start_watchdog)
+            event.listen(self.engine, "after_cursor_execute", self._stop_watchdog)
+            event.listen(self.engine, "handle_error", lambda context: self._stop_watchdog(context.connection))
+
+    def _on_checkout(self, dbapi_connection: Any, *args: Any) -> None:  # type: ignore[misc]
+        with self._lock:
+            self._running.add(dbapi_connection)
+
+    def _on_checkin(self, dbapi_connection: Any, *args: Any) -> None:  # type: ignore[misc]
+        with self._lock:
+            self._running.discard(dbapi_connection)
+
+    def _set_sqlite_progress_handler(self, dbapi_connection: Any, connection_record: Any) -> None:  # type: ignore[misc]
+        # Rows are stepped through while fetching too, so the deadline applies until the next statement
+        deadline = connection_record.info.setdefault("statement_deadline", [float("inf")])
+        dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline[0], 10_000)
+
+    def _set_sqlite_deadline(self, connection: Any, *args: Any) -> None:  # type: ignore[misc]
+        connection.info["statement_deadline"][0] = time.monotonic() + self.timeout_seconds
+
+    def _start_watchdog(self, connection: Any, *args: Any) -> None:  # type: ignore[misc]
+        dbapi_connection = connection.connection.dbapi_connection
+        watchdog = threading.Timer(self.timeout_seconds, interrupt_connection, (self.engine, dbapi_connection))
+        watchdog.daemon = True
+        connection.info["statement_watchdog"] = watchdog
+        watchdog.start()
+
+    def _stop_watchdog(self, connection: Any, *args: Any) -> None:  # type: ignore[misc]
+        watchdog = connection.info.pop("statement_watchdog", None) if connection is not None else None
+        if watchdog is not None:
+            watchdog.cancel()
+
+    def cancel(self) -> None:
+        """Interrupt every statement running on the engine, ex. when the client disconnected."""
+        self.cancelled = True
+        with self._lock:
+            running = list(self._running)
+        for dbapi_connection in running:
+            try:
+                interrupt_connection(self.engine, dbapi_connection)
+            except Exception:
+                logger.exception("Could not interrupt statement")
+
+
+_guards: WeakKeyDictionary[Engine, StatementGuard] = WeakKeyDictionary()
+
+# Session settings making every transaction read only, a second line of defense after read_only_violation
+READ_ONLY_SESSION_STATEMENTS = {
+    "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+    "mysql": "SET SESSION TRANSACTION READ ONLY",
+    "mariadb": "SET SESSION TRANSACTION READ ONLY",
+    "sqlite": "PRAGMA query_only = ON",
+}
+
+
+def make_read_only(engine: Engine) -> None:
+    statement = READ_ONLY_SESSION_STATEMENTS.get(engine.dialect.name)
+    if statement is None:
+        # ex. DuckDB can't open a file read only while the same process has it open for writing
+        logger.debug(f"No read only session on {engine.dialect.name} databases, only read queries are run")
+        return
+
+    execute_on_connect(engine, statement)
+
+
+def connect_database(dsn: str, statement_timeout_seconds: int | None = None) -> "SQLDatabase":
+    """
+    Connect to a target database. statement_timeout_seconds is the connection setting:
+    None for the default timeout, 0 for no timeout.
+    """
+    # Imported on first use, langchain is slow to import and not needed to start the app
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+    if statement_timeout_seconds is None:
+        statement_timeout_seconds = config.statement_timeout_seconds
+    # Guard the engine before SQLDatabase connects to reflect the tables, so every connection has the timeout
+    engine = create_engine(dsn)
+    _guards[engine] = StatementGuard(engine, statement_timeout_seconds)
+    if config.read_only_queries:
+        make_read_only(engine)
+    return SQLDatabase(engine)
+
+
+def cancel_running_statements(db: "SQLDatabase") -> None:
+    guard = _guards.get(db._engine)
+    if guard is not None:
+        guard.cancel()
+
+
+def truncate_word(content: Any, *, length: int, suffix: str = "...") -> str:  # type: ignore[misc]
+    """
+    Truncate a string to a certain number of words, based on the max string
+    length.
+    """
+
+    if not isinstance(content, str) or length <= 0:
+        return content
+
+    if len(content) <= length:
+        return content
+
+    return content[: length - len(suffix)].rsplit(" ", 1)[0] + suffix
+
+
+def _json_encoder(value_type: type) -> Callable[[Any], Any] | None:  # type: ignore[misc]
+    """Conversion to a JSON value of a type, the same as jsonable_encoder's. None for JSON native types."""
+    if value_type is bytes:
+        # Binary columns can't be decoded as text
+        return lambda value: value.decode(errors="replace")
+    for base in value_type.__mro__:
+        if base in ENCODERS_BY_TYPE:
+            return ENCODERS_BY_TYPE[base]
+    return None
+
+
+def _convert_any(value: Any, max_string_length: int) -> Any:  # type: ignore[misc]
+    if isinstance(value, str):
+        return truncate_word(value, length=max_string_length)
+    encoder = _json_encoder(type(value)) if value is not None else None
+    return encoder(value) if encoder is not None else value
+
+
+def column_converter(values: Sequence[Any], max_string_length: int) -> Callable[[Any], Any] | None:  # type: ignore[misc]
+    """
+    Conversion of the values of a column to JSON values, None if they can be kept as is.
+    The converter is chosen once for the column from the types of its values, mixed types are converted one by one.
+    """
+    value_types = set(map(type, values)) - {type(None)}
+    if len(value_types) > 1:
+        return lambda value: _convert_any(value, max_string_length)
+    if not value_types:
+        return None
+
+    [value_type] = value_types
+    if issubclass(value_type, str):
+        if max_string_length <= 0 or max(map(len, filter(None, values)), default=0) <= max_string_length:
+            return None
+        return lambda value: truncate_word(value, length=max_string_length)
+    encoder = _json_encoder(value_type)
+    if encoder is None:
+        return None
+    return lambda value: encoder(value) if value is not None else None
+
+
+def convert_rows(rows: Sequence[Sequence[Any]], max_string_length: int) -> list[tuple[Any, ...]]:  # type: ignore[misc]
+    """Rows with long strings truncated and values converted to JSON values, column by column."""
+    if not rows:
+        return []
+    columns = list(zip(*rows))
+    converted = []
+    for values in columns:
+        converter = column_converter(values, max_string_length)
+        converted.append(values if converter is None else tuple(map(converter, values)))
+    return list(zip(*converted))
+
+
+@timed("sql_execution")
+def execute_sql_query(
+    db: "SQLDatabase",
+    query: str,
+    for_chart: bool = False,
+    chart_type: Optional[ChartType] = None,
+    limit: int | None = None,
+) -> QueryRunData:
+    """
+    Execute the SQL query and return the results or an error message.
+    At most limit rows are returned (config.query_max_rows by default, config.chart_query_max_rows for charts),
+    the query is rewritten to enforce it.
+    """
+    if config.read_only_queries:
+        violation = read_only_violation(query)
+        if violation is not None:
+            raise ReadOnlyRunException(violation)
+
+    guard = _guards.get(db._engine)
+    max_rows = config.chart_query_max_rows if for_chart else config.query_max_rows
+    limit = min(limit or max_rows, max_rows)
+    # One more row than the limit tells if the results are truncated
+    limited_query = limit_query(db._engine.dialect, query, limit + 1) or query
+    start = time.monotonic()
+    try:
+        result = cast(Result[Any], db.run(limited_query, fetch="cursor", include_columns=True))  # type: ignore[misc]
+        # Queries that can't be rewritten are still only fetched up to the limit
+        rows = result.fetchmany(limit + 1)
+    except Exception as e:
+        # Drivers report interruptions differently, tell the cause from the guard instead of the error
+        if guard is not None and guard.cancelled:
+            raise QueryCancelledRunException("The query was cancelled.") from e
+        if guard is not None and guard.timeout_seconds and time.monotonic() - start >= guard.timeout_seconds:
+            raise QueryTimeoutRunException(
+                f"The query was stopped after the {guard.timeout_seconds} seconds statement timeout. "
+                "Rewrite it to read less data: filter early, aggregate before joining, "
+                "avoid cross joins and add a LIMIT."
+            ) from e
+        raise
+
+    columns = list(result.keys())
+    truncated_rows = convert_rows(rows[:limit], db._max_string_length)
+    total_points = None
+    if for_chart:
+        if chart_type in [ChartType.bar, ChartType.line, ChartType.doughnut]:
+            # These chart types take in single dimensional data for labels and values
+            # Validate that each row has only 1 element
+            if not truncated_rows:
+                raise RunException("No data returned from the query.")
+
+            row = truncated_rows[0]
+            if len(row) != 2:
+                raise ChartValidationRunException(
+                    f"Validation of results output format failed. You chose {len(row)} columns in the select statement."
+                    f"You selected: {columns}\n"
+                    "Please select only two of them for the chart X and Y axes (labels and values respectively)."
+                )
+
+            # Only the downsampled series is stored and sent to the client, not every row read for the chart
+            downsampled_rows = downsample_chart_rows(chart_type.value, truncated_rows)
+            if len(downsampled_rows) < len(truncated_rows):
+                total_points = len(truncated_rows)
+            truncated_rows = downsampled_rows
+        else:
+            raise RunException(f"Chart type {chart_type} is not supported.")
+
+    truncated = len(rows) > limit
+    total_rows_estimate = None
+    if truncated:
+        # Imported here, query_plan imports the exceptions of this module
+        from dataline.services.llm_flow.query_plan import estimate_query
+
+        estimate = estimate_query(db, query)
+        if estimate is not None and estimate.result_rows is not None:
+            total_rows_estimate = max(int(estimate.result_rows), len(rows))
+
+    return QueryRunData(
+        columns=columns,
+        rows=truncated_rows,
+        truncated=truncated,
+        total_rows_estimate=total_rows_estimate,
+        total_points=total_points,
+    )
+
+
+def query_run_result_to_chart_json(chart_json: str, chart_type: ChartType, query_run_data: QueryRunData) -> str:
+    """
+    Insert query run result data into the chartjs JSON.
+    This assumes that the query run data is properly validated for charting purposes!
+
+    Args:
+        chart_json: The chartjs JSON string (can be a template or already populated)
+        chart_type: The type of chart to generate (used to format the chartjs JSON)
+        query_run_result: The result of the SQL query execution.
+    """
+    if chart_type in [ChartType.bar, ChartType.line, ChartType.doughnut]:
+        return render_chart_json(chart_json, chart_type.value, query_run_data.rows, query_run_data.total_points)
+    else:
+        raise ValueError(f"Chart type {chart_type} is not supported.")
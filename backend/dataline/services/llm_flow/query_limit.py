@@ -0,0 +1,55 @@
+"""
+Row cap of queries run on target databases: SELECT queries are rewritten so the database returns at most
+the allowed number of rows, instead of trusting the model (or the user) to add a LIMIT.
+"""
+
+import re
+
+from sqlalchemy import Dialect, literal_column, select, text
+
+from dataline.services.llm_flow.query_classification import mask_literals
+
+# Trailing LIMIT of the outermost query: "LIMIT 10", "LIMIT 10 OFFSET 5" or MySQL's "LIMIT 5, 10"
+TRAILING_LIMIT_PATTERN = re.compile(
+    r"\bLIMIT\s+(?:(?P<offset>\d+)\s*,\s*)?(?P<limit>\d+)(?:\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE
+)
+# Trailing standard row limit: "FETCH FIRST 10 ROWS ONLY", "OFFSET 5 ROWS FETCH NEXT 10 ROWS WITH TIES"
+TRAILING_FETCH_PATTERN = re.compile(
+    r"\bFETCH\s+(?:FIRST|NEXT)\s+(?P<limit>\d+)?\s*ROWS?\s+(?:ONLY|WITH\s+TIES)\s*$", re.IGNORECASE
+)
+# Dialects where a LIMIT clause can be appended to any SELECT, including WITH, ORDER BY and UNION queries
+LIMIT_CLAUSE_DIALECTS = {"postgresql", "mysql", "mariadb", "sqlite", "duckdb", "snowflake", "bigquery", "redshift"}
+QUERY_PLACEHOLDER = "__dataline_query__"
+
+
+def limit_query(dialect: Dialect, query: str, limit: int) -> str | None:
+    """
+    Rewrite a SELECT query to return at most limit rows.
+    A trailing LIMIT or FETCH FIRST is kept if lower, lowered otherwise.
+    None if the query can't be rewritten, ex. not a SELECT.
+    """
+    query = query.strip().rstrip(";").rstrip()
+    masked = mask_literals(query)
+    if ";" in masked or not re.match(r"\s*(?:SELECT|WITH|\()", masked, re.IGNORECASE):
+        # Several statements, or not a query returning rows
+        return None
+
+    match = TRAILING_FETCH_PATTERN.search(masked)
+    if match is None and dialect.name in LIMIT_CLAUSE_DIALECTS:
+        match = TRAILING_LIMIT_PATTERN.search(masked)
+        if match is None:
+            return f"{query}\nLIMIT {limit}"
+    if match is not None:
+        # FETCH FIRST ROW ONLY has no row count, it is one row
+        if int(match.group("limit") or 1) <= limit:
+            return query
+        start, end = match.span("limit")
+        return f"{query[:start]}{limit}{query[end:]}"
+
+    if re.search(r"\bORDER\s+BY\b", masked, re.IGNORECASE):
+        # The order of a subquery is not kept by the query wrapping it (and is an error in SQL Server)
+        return None
+    # LIMIT, TOP or FETCH FIRST depending on the dialect
+    statement = select(literal_column("*")).select_from(text(QUERY_PLACEHOLDER).columns().subquery("limited"))
+    compiled = str(statement.limit(limit).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    return compiled.replace(QUERY_PLACEHOLDER, query, 1)
@@ -0,0 +1,169 @@
+"""
+Pre-flight check of agent generated queries: the query is EXPLAINed and sent back to the agent for a rewrite
+when the database estimates it would process too many rows, before it uses any warehouse resources.
+"""
+
+import json
+import logging
+import math
+import re
+from typing import TYPE_CHECKING, Any, Callable, Iterator
+
+from pydantic import BaseModel
+from sqlalchemy import Connection, text
+
+from dataline.config import config
+from dataline.services.llm_flow.query_classification import table_references, tokenize
+from dataline.services.llm_flow.query_execution import RunException
+
+if TYPE_CHECKING:
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+# Postgres nodes reading all their input before returning a row, a LIMIT above them does not bound their input
+POSTGRES_BLOCKING_NODES = {"Aggregate", "Hash", "Sort", "Incremental Sort", "WindowAgg", "Materialize", "SetOp"}
+
+
+class QueryPlanEstimate(BaseModel):
+    # Largest number of rows the plan processes at any step, ex. the rows of a full scan or of a cross join
+    rows: float | None = None
+    # Rows returned by the query
+    result_rows: float | None = None
+    # Total cost of the plan, in the database's own unit (ex. Postgres cost units, Snowflake bytes scanned)
+    cost: float | None = None
+
+
+class QueryRejectedRunException(RunException): ...
+
+
+def _walk(node: Any, children: Callable[[Any], list[Any]]) -> Iterator[Any]:  # type: ignore[misc]
+    yield node
+    for child in children(node):
+        yield from _walk(child, children)
+
+
+def _postgres_rows(node: dict[str, Any], limit: float | None = None) -> float:  # type: ignore[misc]
+    rows = float(node["Plan Rows"])
+    if node["Node Type"] == "Limit":
+        limit = rows
+    elif node["Node Type"] in POSTGRES_BLOCKING_NODES:
+        limit = None
+    if limit is not None:
+        # Execution stops once the LIMIT is reached
+        rows = min(rows, limit)
+    return max([rows, *(_postgres_rows(child, limit) for child in node.get("Plans", []))])
+
+
+def _estimate_postgres(connection: Connection, query: str) -> QueryPlanEstimate:
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar_one()
+    root = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+    return QueryPlanEstimate(
+        rows=_postgres_rows(root), result_rows=float(root["Plan Rows"]), cost=float(root["Total Cost"])
+    )
+
+
+def _estimate_mysql(connection: Connection, query: str) -> QueryPlanEstimate:
+    plan = json.loads(connection.execute(text(f"EXPLAIN FORMAT=JSON {query}")).scalar_one())
+
+    def children(node: Any) -> list[Any]:  # type: ignore[misc]
+        if isinstance(node, dict):
+            return list(node.values())
+        return node if isinstance(node, list) else []
+
+    rows = [
+        float(node[key])
+        for node in _walk(plan, children)
+        if isinstance(node, dict)
+        for key in ("rows_examined_per_scan", "rows_produced_per_join")
+        if key in node
+    ]
+    cost = plan.get("query_block", {}).get("cost_info", {}).get("query_cost")
+    return QueryPlanEstimate(rows=max(rows, default=None), cost=float(cost) if cost is not None else None)
+
+
+def _estimate_sqlite(connection: Connection, query: str) -> QueryPlanEstimate:
+    # SQLite has no row estimates, joins are nested loops over the fully scanned tables (SCAN, not SEARCH)
+    plan = connection.execute(text(f"EXPLAIN QUERY PLAN {query}")).all()
+    tables = {(table.alias or table.table).lower(): table.sql for table in table_references(tokenize(query))}
+    rows = 1.0
+    for *_, detail in plan:
+        match = re.match(r"SCAN (\S+)", detail)
+        if match is None or match.group(1).lower() not in tables:
+            continue
+        # The largest rowid is a cheap upper bound of the number of rows
+        table_rows = connection.execute(text(f"SELECT MAX(rowid) FROM {tables[match.group(1).lower()]}")).scalar()
+        rows *= float(table_rows or 1)
+    return QueryPlanEstimate(rows=rows)
+
+
+def _estimate_duckdb(connection: Connection, query: str) -> QueryPlanEstimate:
+    plan = json.loads(connection.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).all()[0][1])
+
+    def node_rows(node: dict[str, Any]) -> float:  # type: ignore[misc]
+        estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+        if estimate is not None:
+            return float(estimate)
+        child_rows = [node_rows(child) for child in node.get("children", [])]
+        if node.get("name") == "CROSS_PRODUCT":
+            return math.prod(child_rows)
+        return max(child_rows, default=0.0)
+
+    nodes = [node for root in plan for node in _walk(root, lambda node: node.get("children", []))]
+    return QueryPlanEstimate(
+        rows=max((node_rows(node) for node in nodes), default=None),
+        result_rows=node_rows(plan[0]) if plan else None,
+    )
+
+
+def _estimate_snowflake(connection: Connection, query: str) -> QueryPlanEstimate:
+    plan = json.loads(connection.execute(text(f"EXPLAIN USING JSON {query}")).scalar_one())
+    return QueryPlanEstimate(cost=float(plan["GlobalStats"]["bytesAssigned"]))
+
+
+ESTIMATORS: dict[str, Callable[[Connection, str], QueryPlanEstimate]] = {
+    "postgresql": _estimate_postgres,
+    "mysql": _estimate_mysql,
+    "mariadb": _estimate_mysql,
+    "sqlite": _estimate_sqlite,
+    "duckdb": _estimate_duckdb,
+    "snowflake": _estimate_snowflake,
+}
+
+
+def estimate_query(db: "SQLDatabase", query: str) -> QueryPlanEstimate | None:
+    """Estimates of the database for a query, None if the dialect is not supported or the query can't be explained."""
+    estimator = ESTIMATORS.get(db.dialect)
+    if estimator is None:
+        return None
+    try:
+        with db._engine.connect() as connection:
+            return estimator(connection, query.strip().rstrip(";"))
+    except Exception:
+        # Ex. invalid SQL, running the query reports the actual error to the agent
+        logger.debug("Could not EXPLAIN query", exc_info=True)
+        return None
+
+
+def check_query_plan(db: "SQLDatabase", query: str) -> None:
+    """
+    Reject queries estimated to process more rows (or cost more) than configured.
+    :raises: QueryRejectedRunException with the reason, meant for the agent to rewrite the query
+    """
+    if not config.query_plan_check_enabled:
+        return
+    estimate = estimate_query(db, query)
+    if estimate is None:
+        return
+
+    if config.query_plan_max_rows and estimate.rows is not None and estimate.rows > config.query_plan_max_rows:
+        reason = f"the database estimates it would process about {estimate.rows:,.0f} rows"
+    elif config.query_plan_max_cost and estimate.cost is not None and estimate.cost > config.query_plan_max_cost:
+        reason = f"its estimated cost ({estimate.cost:,.0f}) is above the allowed {config.query_plan_max_cost:,.0f}"
+    else:
+        return
+    raise QueryRejectedRunException(
+        f"The query was not run because {reason}. "
+        "Rewrite it to read less data: filter on indexed columns, aggregate before joining, "
+        "make sure every join has a condition and add a LIMIT."
+    )
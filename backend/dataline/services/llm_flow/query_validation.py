@@ -0,0 +1,149 @@
+"""
+Local validation of agent generated queries, before they reach the database:
+syntax errors and unknown tables or columns are reported to the agent in milliseconds,
+instead of after a round trip to the warehouse.
+"""
+
+import logging
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+
+from dataline.config import config
+from dataline.services.llm_flow.query_classification import (
+    QuerySyntaxError,
+    Token,
+    common_table_names,
+    table_references,
+    tokenize,
+)
+from dataline.services.llm_flow.query_execution import RunException
+from dataline.utils.metrics import QUERY_VALIDATION_FAILURES
+
+if TYPE_CHECKING:
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+# Statement compiling a query without running it, by dialect
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN",
+    "mysql": "EXPLAIN",
+    "mariadb": "EXPLAIN",
+    "sqlite": "EXPLAIN QUERY PLAN",
+    "duckdb": "EXPLAIN",
+    "snowflake": "EXPLAIN",
+}
+
+
+class QueryValidationRunException(RunException): ...
+
+
+def get_catalog(db: "SQLDatabase") -> dict[str, dict[str, str]]:
+    """Columns by table of the tables usable by the agent, from the reflected schema. Names are lower cased keys."""
+    usable_tables = set(db.get_usable_table_names())
+    return {
+        table.name.lower(): {column.name.lower(): column.name for column in table.columns}
+        for table in db._metadata.sorted_tables
+        if table.name in usable_tables
+    }
+
+
+def get_view_names(db: "SQLDatabase") -> set[str]:
+    """Views of the schema used by the agent, lower cased. The inspector of the database caches them."""
+    return {name.lower() for name in db._inspector.get_view_names(schema=db._schema)}
+
+
+def _column_references(tokens: list[Token]) -> list[tuple[str, str]]:
+    """Qualified column references (qualifier, column) of a query, ex. r.amount."""
+    references = []
+    for index in range(len(tokens) - 2):
+        qualifier, dot, column = tokens[index : index + 3]
+        if dot.text != "." or qualifier.identifier is None or column.identifier is None:
+            continue
+        # Skip schema qualified names (a.b.c) and function calls (schema.function())
+        if index > 0 and tokens[index - 1].text == ".":
+            continue
+        if index + 3 < len(tokens) and tokens[index + 3].text in (".", "("):
+            continue
+        references.append((str(qualifier.identifier), str(column.identifier)))
+    return references
+
+
+def _check_names(db: "SQLDatabase", tokens: list[Token]) -> str | None:
+    catalog = get_catalog(db)
+    if not catalog:
+        return None
+
+    ctes = common_table_names(tokens)
+    # Tables by the name or alias they are referenced with
+    tables: dict[str, str] = {}
+    for reference in table_references(tokens):
+        if reference.schema_name is not None and reference.schema_name.lower() != (db._schema or "").lower():
+            # Tables of other schemas are not reflected
+            continue
+        table = reference.table.lower()
+        if table not in catalog and table in get_view_names(db):
+            # Views are not reflected, their columns are unknown
+            continue
+        if table not in catalog:
+            QUERY_VALIDATION_FAILURES.inc(reason="unknown_table")
+            return (
+                f"Table {reference.sql} does not exist. "
+                f"Available tables are the following, use them ONLY: {', '.join(sorted(catalog))}."
+            )
+        tables[(reference.alias or reference.table).lower()] = table
+
+    for qualifier, column in _column_references(tokens):
+        table = tables.get(qualifier.lower())
+        if table is None or qualifier.lower() in ctes or column.lower() in catalog[table]:
+            continue
+        QUERY_VALIDATION_FAILURES.inc(reason="unknown_column")
+        return (
+            f"Column {column} does not exist in table {table} (referenced as {qualifier}). "
+            f"Its columns are: {', '.join(catalog[table].values())}."
+        )
+    return None
+
+
+def _check_explain(db: "SQLDatabase", query: str) -> str | None:
+    prefix = EXPLAIN_PREFIXES.get(db.dialect)
+    if prefix is None:
+        return None
+    try:
+        with db._engine.connect() as connection:
+            connection.execute(text(f"{prefix} {query}"))
+    except Exception as e:
+        QUERY_VALIDATION_FAILURES.inc(reason="explain")
+        # The first line of the driver error, without the SQL statement SQLAlchemy appends
+        return f"The database could not compile the query: {str(getattr(e, 'orig', e)).splitlines()[0]}"
+    return None
+
+
+def validate_query(db: "SQLDatabase", query: str) -> str | None:
+    """Feedback on a query that can't run as written, None if nothing was found."""
+    query = query.strip().rstrip(";")
+    try:
+        tokens = tokenize(query)
+    except QuerySyntaxError as e:
+        QUERY_VALIDATION_FAILURES.inc(reason="syntax")
+        return str(e)
+
+    try:
+        feedback = _check_names(db, tokens)
+    except Exception:
+        # Validation is best effort, the query still runs if the checks themselves fail
+        logger.exception("Could not check the names of a query")
+        feedback = None
+    if feedback is None and config.query_validation_explain:
+        feedback = _check_explain(db, query)
+    return feedback
+
+
+def check_query(db: "SQLDatabase", query: str) -> None:
+    """:raises: QueryValidationRunException with feedback for the agent to fix the query"""
+    if not config.query_validation_enabled:
+        return
+    feedback = validate_query(db, query)
+    if feedback is not None:
+        raise QueryValidationRunException(f"{feedback} Fix the query and try again.")
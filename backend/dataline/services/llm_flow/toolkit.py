@@ -3,6 +3,7 @@ import json
 import operator
 from typing import Annotated, Any, List, Optional, Sequence, Type, TypedDict, cast
 
+from dataline.config import config
 from dataline.models.llm_flow.schema import (
     ChartGenerationResult,
     QueryOptions,
@@ -16,8 +17,19 @@ from dataline.services.llm_flow.llm_calls.chart_generator import (
     TEMPLATES,
     ChartType,
     GenerateChartCall,
+    build_chart_json,
+    chart_title_from_request,
 )
-from fastapi.encoders import jsonable_encoder
+from dataline.services.llm_flow.query_execution import (
+    ChartValidationRunException,
+    RunException,
+    execute_sql_query,
+    query_run_result_to_chart_json,
+)
+from dataline.services.llm_flow.query_plan import check_query_plan
+from dataline.services.llm_flow.query_validation import check_query
+from dataline.services.llm_flow.usage import TokenUsage, attach_usage, usage_from_completion
+from dataline.utils.charts import render_chart_json
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain_core.callbacks import CallbackManagerForToolRun
 from langchain_core.messages import BaseMessage, ToolMessage
@@ -26,7 +38,6 @@ from langchain_core.pydantic_v1 import BaseModel as BaseModelV1
 from langchain_core.pydantic_v1 import Field
 from langchain_core.tools import BaseTool, BaseToolkit
 from langgraph.prebuilt import ToolExecutor
-from sqlalchemy import Result
 
 
 class QueryGraphStateUpdate(TypedDict):
@@ -34,88 +45,6 @@ class QueryGraphStateUpdate(TypedDict):
     results: Sequence[QueryResultSchema]
 
 
-class RunException(Exception):
-    message: str
-
-    def __init__(self, message: str):
-        self.message = message
-        super().__init__(message)
-
-
-class ChartValidationRunException(RunException): ...
-
-
-def truncate_word(content: Any, *, length: int, suffix: str = "...") -> str:  # type: ignore[misc]
-    """
-    Truncate a string to a certain number of words, based on the max string
-    length.
-    """
-
-    if not isinstance(content, str) or length <= 0:
-        return content
-
-    if len(content) <= length:
-        return content
-
-    return content[: length - len(suffix)].rsplit(" ", 1)[0] + suffix
-
-
-def execute_sql_query(
-    db: SQLDatabase, query: str, for_chart: bool = False, chart_type: Optional[ChartType] = None
-) -> QueryRunData:
-    """Execute the SQL query and return the results or an error message."""
-    result = cast(Result[Any], db.run(query, fetch="cursor", include_columns=True))  # type: ignore[misc]
-    truncated_rows = []
-    for row in result.fetchall():
-        # truncate each column, then convert the row to a tuple
-        truncated_row = tuple(truncate_word(column, length=db._max_string_length) for column in row)
-        truncated_rows.append(truncated_row)
-
-    columns = list(result.keys())
-    if for_chart:
-        if chart_type in [ChartType.bar, ChartType.line, ChartType.doughnut]:
-            # These chart types take in single dimensional data for labels and values
-            # Validate that each row has only 1 element
-            if not truncated_rows:
-                raise RunException("No data returned from the query.")
-
-            row = truncated_rows[0]
-            if len(row) != 2:
-                raise ChartValidationRunException(
-                    f"Validation of results output format failed. You chose {len(row)} columns in the select statement."
-                    f"You selected: {columns}\n"
-                    "Please select only two of them for the chart X and Y axes (labels and values respectively)."
-                )
-        else:
-            raise RunException(f"Chart type {chart_type} is not supported.")
-
-    return QueryRunData(columns=columns, rows=truncated_rows)
-
-
-def query_run_result_to_chart_json(chart_json: str, chart_type: ChartType, query_run_data: QueryRunData) -> str:
-    """
-    Insert query run result data into the chartjs JSON.
-    This assumes that the query run data is properly validated for charting purposes!
-
-    Args:
-        chart_json: The chartjs JSON string (can be a template or already populated)
-        chart_type: The type of chart to generate (used to format the chartjs JSON)
-        query_run_result: The result of the SQL query execution.
-    """
-    if chart_type in [ChartType.bar, ChartType.line, ChartType.doughnut]:
-        # Insert the flattened query result data into the chartjs JSON
-        flattened_labels = [row[0] for row in query_run_data.rows]
-        flattened_values = [row[1] for row in query_run_data.rows]
-
-        formatted_json = json.loads(chart_json)
-        formatted_json["data"]["labels"] = flattened_labels
-        formatted_json["data"]["datasets"][0]["data"] = flattened_values
-        formatted_json_compatible = jsonable_encoder(formatted_json)
-        return json.dumps(formatted_json_compatible)
-    else:
-        raise NotImplementedError(f"Chart type {chart_type} is not supported.")
-
-
 class ToolNames:
     """Class for storing the names of the SQL tools."""
 
@@ -168,6 +97,8 @@ class InfoSQLDatabaseTool(BaseSQLDatabaseTool, StateUpdaterTool):
     description: str = "Get the schema and sample rows for the specified SQL tables."
 
     table_names: Optional[list[str]] = None
+    # Rendered column profiles by table name, only shared with the LLM when data is not secure
+    table_profiles: dict[str, str] = Field(default_factory=dict, exclude=True)
 
     # Pydantic model to validate input to the tool
     args_schema: Type[BaseModel] = _InfoSQLDatabaseToolInput
@@ -205,9 +136,14 @@ class InfoSQLDatabaseTool(BaseSQLDatabaseTool, StateUpdaterTool):
         results: list[QueryResultSchema] = []
 
         # We call the tool_executor and get back a response
-        response = self.run(args)
+        response = str(self.run(args))
+        if self.table_names and not state.options.secure_data:
+            profiles = [self.table_profiles[name] for name in self.table_names if name in self.table_profiles]
+            if profiles:
+                response += "\n\n" + "\n\n".join(profiles)
+
         # We use the response to create a ToolMessage
-        tool_message = ToolMessage(content=str(response), name=self.name, tool_call_id=call_id)
+        tool_message = ToolMessage(content=response, name=self.name, tool_call_id=call_id)
         messages.append(tool_message)
 
         # Add selected tables result if successful
@@ -256,6 +192,8 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, StateUpdaterTool):
         run_manager: Optional[CallbackManagerForToolRun] = None,
     ) -> tuple[QueryRunData, bool]:  # type: ignore[misc]
         """Execute the query, return the results or an error message."""
+        check_query(self.db, query)
+        check_query_plan(self.db, query)
         return execute_sql_query(self.db, query, for_chart, chart_type), for_chart
 
     def get_response(  # type: ignore[misc]
@@ -287,6 +225,8 @@ class QuerySQLDataBaseTool(BaseSQLDatabaseTool, StateUpdaterTool):
             response = SQLQueryRunResult(
                 columns=query_run_data.columns,
                 rows=query_run_data.rows,
+                truncated=query_run_data.truncated,
+                total_rows_estimate=query_run_data.total_rows_estimate,
                 for_chart=for_chart,
                 linked_id=query_string_result.ephemeral_id,
             )
@@ -385,6 +325,7 @@ class SQLDatabaseToolkit(BaseToolkit):
     """Toolkit for interacting with SQL databases."""
 
     db: SQLDatabase = Field(exclude=True)
+    table_profiles: dict[str, str] = Field(default_factory=dict, exclude=True)
 
     @property
     def dialect(self) -> str:
@@ -406,7 +347,9 @@ class SQLDatabaseToolkit(BaseToolkit):
             f"{list_sql_database_tool.name} first! "
             "Example Input: table1, table2, table3"
         )
-        info_sql_database_tool = InfoSQLDatabaseTool(db=self.db, description=info_sql_database_tool_description)
+        info_sql_database_tool = InfoSQLDatabaseTool(
+            db=self.db, description=info_sql_database_tool_description, table_profiles=self.table_profiles
+        )
         query_sql_database_tool_description = (
             f"NEVER run this without running the {info_sql_database_tool.name} tool first."
             "Input to this tool is a detailed and correct SQL query, output is a "
@@ -478,15 +421,9 @@ class ChartGeneratorTool(StateUpdaterTool):
     ) -> QueryGraphStateUpdate:
         messages: list[BaseMessage] = []
         results: list[QueryResultSchema] = []
+        chart_usage: TokenUsage | None = None
 
         chart_type = ChartType[args["chart_type"]]
-        generate_chart_call = GenerateChartCall(
-            api_key=state.options.openai_api_key.get_secret_value(),
-            chart_type=args["chart_type"],
-            request=args["request"],
-            chartjs_template=TEMPLATES[chart_type],
-        )
-        res = generate_chart_call.extract()
 
         # Find the last data result
         # TODO: WHY IS THIS NOT TRIGGERING?
@@ -507,16 +444,46 @@ class ChartGeneratorTool(StateUpdaterTool):
             messages.append(tool_message)
             return state_update(messages=messages)
 
+        if config.llm_chart_generation:
+            generate_chart_call = GenerateChartCall(
+                api_key=state.options.openai_api_key.get_secret_value(),
+                chart_type=args["chart_type"],
+                request=args["request"],
+                chartjs_template=TEMPLATES[chart_type],
+            )
+            generated_chart = generate_chart_call.extract()
+            chart_template = generated_chart.chartjs_json
+            # Mirascope keeps the call response on the extracted model
+            call_response = getattr(generated_chart, "_response", None)
+            chart_usage = usage_from_completion(
+                generate_chart_call.call_params.model, getattr(call_response, "response", None)
+            )
+        else:
+            columns = last_data_result.columns
+            chart_template = build_chart_json(
+                chart_type,
+                title=chart_title_from_request(args["request"]),
+                x_label=columns[0] if columns else None,
+                y_label=columns[1] if len(columns) > 1 else None,
+            )
+
         try:
+            if config.llm_chart_generation:
+                # Drop the dummy data of the generated config, only the template is stored
+                chart_template = render_chart_json(chart_template, chart_type.value, [])
+
             chart_json = query_run_result_to_chart_json(
-                chart_json=res.chartjs_json,
+                chart_json=chart_template,
                 chart_type=chart_type,
                 query_run_data=last_data_result,
             )
 
             # Link to same SQL query string result as the run result does
             result = ChartGenerationResult(
-                chartjs_json=chart_json, chart_type=chart_type.value, linked_id=last_data_result.linked_id
+                chartjs_json=chart_json,
+                chartjs_template=chart_template,
+                chart_type=chart_type.value,
+                linked_id=last_data_result.linked_id,
             )
             results.append(result)
 
@@ -541,6 +508,12 @@ class ChartGeneratorTool(StateUpdaterTool):
                 tool_call_id=call_id,
             )
             messages.append(message)
+        except ValueError as e:
+            message = ToolMessage(content=f"ERROR: {e}", name=self.name, tool_call_id=call_id)
+            messages.append(message)
+
+        if chart_usage is not None:
+            attach_usage(messages[0], chart_usage)
 
         return {
             "messages": messages,
@@ -0,0 +1,88 @@
+"""
+Token usage and cost of the OpenAI calls made to answer a question.
+Usage travels with the messages returned by the graph, in their response_metadata, and is summed per turn.
+"""
+
+from typing import Any, Iterable, Self
+
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+
+USAGE_METADATA_KEY = "dataline_usage"
+
+# USD per million (prompt, completion) tokens, matched on the longest model name prefix
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+
+def get_model_prices(model: str) -> tuple[float, float] | None:
+    prefixes = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    return MODEL_PRICES[max(prefixes, key=len)] if prefixes else None
+
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Models without a known price are counted as free
+    cost_usd: float = 0.0
+
+    @classmethod
+    def for_model(cls, model: str, prompt_tokens: int, completion_tokens: int) -> Self:
+        prices = get_model_prices(model)
+        cost_usd = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000 if prices else 0.0
+        return cls(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_usd=cost_usd)
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            cost_usd=self.cost_usd + other.cost_usd,
+        )
+
+
+def usage_from_completion(model: str, completion: Any) -> TokenUsage | None:  # type: ignore[misc]
+    """Usage reported by OpenAI on a ChatCompletion, None if missing."""
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return None
+    return TokenUsage.for_model(model, usage.prompt_tokens, usage.completion_tokens)
+
+
+def usage_from_message(model: str, message: BaseMessage) -> TokenUsage | None:
+    """Usage reported by OpenAI on a chat model response, None if missing (ex. streamed responses)."""
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if usage_metadata:
+        return TokenUsage.for_model(model, usage_metadata["input_tokens"], usage_metadata["output_tokens"])
+    token_usage = message.response_metadata.get("token_usage")
+    if not token_usage:
+        return None
+    return TokenUsage.for_model(
+        message.response_metadata.get("model_name", model),
+        token_usage.get("prompt_tokens", 0),
+        token_usage.get("completion_tokens", 0),
+    )
+
+
+def estimate_usage(model: str, prompt: str, completion: str) -> TokenUsage:
+    """Fallback for responses without usage, ex. streamed ones."""
+    from dataline.tokenizer import num_tokens_for_model
+
+    return TokenUsage.for_model(model, num_tokens_for_model(prompt, model), num_tokens_for_model(completion, model))
+
+
+def attach_usage(message: BaseMessage, usage: TokenUsage) -> None:
+    message.response_metadata[USAGE_METADATA_KEY] = usage.model_dump()
+
+
+def get_turn_usage(messages: Iterable[BaseMessage]) -> TokenUsage:
+    total = TokenUsage()
+    for message in messages:
+        usage = message.response_metadata.get(USAGE_METADATA_KEY)
+        if usage is not None:
+            total += TokenUsage.model_validate(usage)
+    return total
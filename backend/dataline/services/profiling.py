@@ -0,0 +1,246 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import Connection, Table, func, literal, select
+
+from dataline.config import config
+from dataline.models.table_profile.schema import (
+    ColumnProfile,
+    HistogramBin,
+    TableProfile,
+    TableProfileCreate,
+    TableProfileOut,
+    TopValue,
+)
+from dataline.repositories.base import AsyncSession, SessionCreator
+from dataline.repositories.table_profile import TableProfileRepository
+from dataline.services.llm_flow.query_execution import connect_database
+from dataline.services.llm_flow.query_plan import estimate_query
+from dataline.utils.utils import forward_connection_errors
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+logger = logging.getLogger(__name__)
+
+# Longer values are cut in top values, they are only hints for the model
+MAX_VALUE_LENGTH = 50
+
+
+def _to_str(value: object) -> str:
+    import pandas as pd
+
+    text = value.isoformat() if isinstance(value, pd.Timestamp) else str(value)
+    return text if len(text) <= MAX_VALUE_LENGTH else text[: MAX_VALUE_LENGTH - 3] + "..."
+
+
+def profile_column(column: "pd.Series", row_count: int, top_k: int, histogram_bins: int) -> ColumnProfile:
+    """Compute a column profile from a (possibly sampled) column of values."""
+    # Profiling runs in the background, numpy and pandas are not needed to start the app
+    import numpy as np
+    from pandas.api.types import (
+        is_bool_dtype,
+        is_datetime64_any_dtype,
+        is_numeric_dtype,
+    )
+
+    sampled_rows = len(column)
+    non_null = column.dropna()
+    null_fraction = 1 - len(non_null) / sampled_rows if sampled_rows else 0.0
+
+    try:
+        distinct_count = int(non_null.nunique())
+    except TypeError:
+        # Unhashable values (ex. arrays, JSON documents)
+        return ColumnProfile(
+            name=str(column.name), type=str(column.dtype), null_fraction=null_fraction, distinct_count=0
+        )
+
+    distinct_is_estimate = sampled_rows < row_count
+    if distinct_is_estimate and distinct_count == len(non_null):
+        # Every sampled value is unique, assume the column is unique over the whole table
+        distinct_count = round(distinct_count * row_count / sampled_rows)
+
+    profile = ColumnProfile(
+        name=str(column.name),
+        type=str(column.dtype),
+        null_fraction=null_fraction,
+        distinct_count=distinct_count,
+        distinct_is_estimate=distinct_is_estimate,
+    )
+    if non_null.empty:
+        return profile
+
+    if is_numeric_dtype(non_null) and not is_bool_dtype(non_null):
+        values = non_null.astype(float)
+        profile.min = float(values.min())
+        profile.max = float(values.max())
+        if distinct_count > histogram_bins:
+            counts, edges = np.histogram(values, bins=histogram_bins)
+            profile.histogram = [
+                HistogramBin(lower=float(edges[i]), upper=float(edges[i + 1]), count=int(counts[i]))
+                for i in range(len(counts))
+            ]
+            return profile
+    elif is_datetime64_any_dtype(non_null):
+        profile.min = _to_str(non_null.min())
+        profile.max = _to_str(non_null.max())
+        return profile
+
+    # Top values are only useful for categorical columns, not for identifiers or free text
+    if distinct_count <= max(top_k, len(non_null) // 2):
+        frequencies = non_null.value_counts(normalize=True).head(top_k)
+        profile.top_values = [
+            TopValue(value=_to_str(value), fraction=float(fraction)) for value, fraction in frequencies.items()
+        ]
+    return profile
+
+
+def count_rows(db: "SQLDatabase", conn: Connection, table: Table, max_rows: int) -> int:
+    """
+    Rows of a table, counted up to max_rows to bound the cost on warehouses.
+    Bigger tables take the row estimate of the query plan when the database has one, max_rows otherwise.
+    """
+    counted = select(literal(1)).select_from(table).limit(max_rows + 1).subquery()
+    row_count = int(conn.execute(select(func.count()).select_from(counted)).scalar_one())
+    if row_count <= max_rows:
+        return row_count
+
+    estimate = estimate_query(db, str(select(table).compile(db._engine, compile_kwargs={"literal_binds": True})))
+    if estimate is not None and estimate.result_rows is not None:
+        return max(int(estimate.result_rows), max_rows)
+    return max_rows
+
+
+def profile_database(
+    dsn: str,
+    statement_timeout_seconds: int | None = None,
+    sample_rows: int = config.profile_sample_rows,
+    max_tables: int = config.profile_max_tables,
+    max_count_rows: int = config.profile_max_count_rows,
+    top_k: int = config.profile_top_k,
+    histogram_bins: int = config.profile_histogram_bins,
+) -> list[TableProfile]:
+    """
+    Profile the tables of a target database, with the statement timeout and read only session of the connection.
+    Tables bigger than sample_rows are profiled on their first sample_rows rows to bound the cost on warehouses.
+    """
+    import pandas as pd
+
+    try:
+        db = connect_database(dsn, statement_timeout_seconds)
+    except Exception as e:
+        forward_connection_errors(e)
+        raise e
+
+    tables = {table.name: table for table in db._metadata.sorted_tables}
+    profiles: list[TableProfile] = []
+    try:
+        with db._engine.connect() as conn:
+            for table_name in sorted(db.get_usable_table_names())[:max_tables]:
+                try:
+                    table = tables[table_name]
+                    row_count = count_rows(db, conn, table, max_count_rows)
+                    sample = pd.read_sql(select(table).limit(sample_rows), conn)
+                except Exception:
+                    logger.exception(f"Could not profile table {table_name}")
+                    continue
+
+                profiles.append(
+                    TableProfile(
+                        table_name=table_name,
+                        row_count=row_count,
+                        sampled_rows=len(sample),
+                        columns=[
+                            profile_column(sample[column_name], row_count, top_k, histogram_bins)
+                            for column_name in sample.columns
+                        ],
+                    )
+                )
+    finally:
+        db._engine.dispose()
+
+    return profiles
+
+
+class ProfilingService:
+    table_profile_repo: TableProfileRepository
+
+    def __init__(self, table_profile_repo: TableProfileRepository = Depends(TableProfileRepository)) -> None:
+        self.table_profile_repo = table_profile_repo
+
+    async def get_table_profiles(self, session: AsyncSession, connection_id: UUID) -> list[TableProfileOut]:
+        profiles = await self.table_profile_repo.list_by_connection(session, connection_id)
+        return [
+            TableProfileOut(
+                **TableProfile.model_validate_json(profile.content).model_dump(), created_at=profile.created_at
+            )
+            for profile in profiles
+        ]
+
+    async def store_table_profiles(
+        self, session: AsyncSession, connection_id: UUID, profiles: list[TableProfile]
+    ) -> list[TableProfileOut]:
+        # Replace any previously computed profiles
+        await self.table_profile_repo.delete_by_connection(session, connection_id)
+        if profiles:
+            await self.table_profile_repo.create_many(
+                session,
+                [
+                    TableProfileCreate(
+                        connection_id=connection_id,
+                        table_name=profile.table_name,
+                        row_count=profile.row_count,
+                        content=profile.model_dump_json(),
+                    )
+                    for profile in profiles
+                ],
+            )
+        return await self.get_table_profiles(session, connection_id)
+
+    async def refresh_table_profiles(
+        self, session: AsyncSession, connection_id: UUID, dsn: str, statement_timeout_seconds: int | None = None
+    ) -> list[TableProfileOut]:
+        # Profiling issues blocking queries against the target database, keep it off the event loop
+        profiles = await asyncio.to_thread(profile_database, dsn, statement_timeout_seconds)
+        _profiled_connections.add(connection_id)
+        return await self.store_table_profiles(session, connection_id, profiles)
+
+    async def delete_table_profiles(self, session: AsyncSession, connection_id: UUID) -> None:
+        await self.table_profile_repo.delete_by_connection(session, connection_id)
+        _profiled_connections.discard(connection_id)
+
+
+# Keep references to running tasks so they are not garbage collected mid-way
+_background_tasks: set[asyncio.Task[None]] = set()
+_connections_being_profiled: set[UUID] = set()
+# Connections profiled by this process, a database without tables has no profiles but is not profiled again
+_profiled_connections: set[UUID] = set()
+
+
+async def _profile_connection(connection_id: UUID, dsn: str, statement_timeout_seconds: int | None) -> None:
+    try:
+        profiles = await asyncio.to_thread(profile_database, dsn, statement_timeout_seconds)
+        async with SessionCreator.begin() as session:
+            await ProfilingService(TableProfileRepository()).store_table_profiles(session, connection_id, profiles)
+        _profiled_connections.add(connection_id)
+        logger.info(f"Stored column profiles of {len(profiles)} tables for connection {connection_id}")
+    except Exception:
+        logger.exception(f"Background profiling failed for connection {connection_id}")
+    finally:
+        _connections_being_profiled.discard(connection_id)
+
+
+def schedule_connection_profiling(connection_id: UUID, dsn: str, statement_timeout_seconds: int | None = None) -> None:
+    """Profile a connection in the background, at most once at a time per connection and once per process."""
+    if connection_id in _connections_being_profiled or connection_id in _profiled_connections:
+        return
+
+    _connections_being_profiled.add(connection_id)
+    task = asyncio.create_task(_profile_connection(connection_id, dsn, statement_timeout_seconds))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from datetime import datetime
+from uuid import UUID
+
+from fastapi import Depends
+from rapidfuzz import fuzz, process
+
+from dataline.config import config
+from dataline.models.query_cache.model import QueryCacheModel
+from dataline.models.query_cache.schema import (
+    QueryCacheCreate,
+    QueryCacheOut,
+    QueryCacheUpdate,
+)
+from dataline.repositories.base import AsyncSession
+from dataline.repositories.query_cache import QueryCacheRepository
+from dataline.services.llm_flow.query_execution import connect_database
+from dataline.utils.metrics import QUERY_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+# Words that can differ between two questions asking the same thing
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have", "had",
+    "please", "can", "could", "you", "me", "us", "i", "tell", "show", "give",
+}  # fmt: skip
+# Negations in a normalized question, "didn't" is normalized to "didn t"
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|none|nor|neither|without|except|excluding|cannot|\w+n t)\b")
+
+# Schema fingerprints by DSN with the time they were computed, reflecting a warehouse schema is not free
+_fingerprints: dict[str, tuple[float, str]] = {}
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.findall(r"\d+(?:\.\d+)?|\w+", question.lower()))
+
+
+def compute_schema_fingerprint(dsn: str, statement_timeout_seconds: int | None = None) -> str:
+    """Hash of every table, column and column type of the database."""
+    db = connect_database(dsn, statement_timeout_seconds)
+    try:
+        # Tables and their columns are reflected when connecting
+        parts = [
+            f"{table.name}.{column.name}:{column.type}"
+            for table in sorted(db._metadata.sorted_tables, key=lambda table: table.name)
+            for column in table.columns
+        ]
+    finally:
+        db._engine.dispose()
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+async def get_schema_fingerprint(dsn: str, statement_timeout_seconds: int | None = None) -> str:
+    cached = _fingerprints.get(dsn)
+    if cached and time.monotonic() - cached[0] < config.query_cache_fingerprint_ttl_seconds:
+        return cached[1]
+
+    fingerprint = await asyncio.to_thread(compute_schema_fingerprint, dsn, statement_timeout_seconds)
+    _fingerprints[dsn] = (time.monotonic(), fingerprint)
+    return fingerprint
+
+
+def _same_meaning_words(question: str, other: str) -> bool:
+    """
+    Whether two normalized questions have the same words apart from stopwords, and the same negations:
+    "male passengers" and "female passengers", or "did place an order" and "did not place an order" need different SQL.
+    Numbers must be identical too: "top 10 customers" and "top 5 customers" need different SQL.
+    """
+    return (
+        set(question.split()) - STOPWORDS == set(other.split()) - STOPWORDS
+        and NEGATION_PATTERN.findall(question) == NEGATION_PATTERN.findall(other)
+        and NUMBER_PATTERN.findall(question) == NUMBER_PATTERN.findall(other)
+    )
+
+
+def find_match(normalized_question: str, entries: list[QueryCacheModel]) -> QueryCacheModel | None:
+    """
+    Exact match of the normalized question, and with query_cache_fuzzy_matching a match on the same words
+    in another order or with other stopwords, scored by word order insensitive similarity.
+    """
+    for entry in entries:
+        if entry.normalized_question == normalized_question:
+            return entry
+    if not config.query_cache_fuzzy_matching:
+        return None
+
+    candidates = [entry for entry in entries if _same_meaning_words(normalized_question, entry.normalized_question)]
+    match = process.extractOne(
+        normalized_question,
+        [entry.normalized_question for entry in candidates],
+        scorer=fuzz.token_sort_ratio,
+        score_cutoff=config.query_cache_min_similarity,
+    )
+    return candidates[match[2]] if match else None
+
+
+class QueryCacheService:
+    query_cache_repo: QueryCacheRepository
+
+    def __init__(self, query_cache_repo: QueryCacheRepository = Depends(QueryCacheRepository)) -> None:
+        self.query_cache_repo = query_cache_repo
+
+    async def lookup(
+        self,
+        session: AsyncSession,
+        connection_id: UUID,
+        dsn: str,
+        question: str,
+        statement_timeout_seconds: int | None = None,
+    ) -> str | None:
+        """Return the SQL generated for the same or a very similar question on the current schema, if any."""
+        entries = list(await self.query_cache_repo.list_by_connection(session, connection_id))
+        if not entries:
+            QUERY_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+        fingerprint = await get_schema_fingerprint(dsn, statement_timeout_seconds)
+        if any(entry.schema_fingerprint != fingerprint for entry in entries):
+            # Schema changed, SQL generated for the previous one may not run or mean the same anymore
+            await self.query_cache_repo.delete_stale(session, connection_id, fingerprint)
+            entries = [entry for entry in entries if entry.schema_fingerprint == fingerprint]
+
+        entry = find_match(normalize_question(question), entries)
+        if entry is None:
+            QUERY_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+        QUERY_CACHE_LOOKUPS.inc(result="hit")
+        await self.query_cache_repo.update_by_uuid(
+            session, entry.id, QueryCacheUpdate(hits=entry.hits + 1, last_used_at=datetime.now())
+        )
+        logger.info(f"Query cache hit for connection {connection_id}: {question!r} ~ {entry.question!r}")
+        return entry.sql
+
+    async def store(
+        self,
+        session: AsyncSession,
+        connection_id: UUID,
+        dsn: str,
+        question: str,
+        sql: str,
+        statement_timeout_seconds: int | None = None,
+    ) -> None:
+        await self.query_cache_repo.create(
+            session,
+            QueryCacheCreate(
+                connection_id=connection_id,
+                question=question,
+                normalized_question=normalize_question(question),
+                sql=sql,
+                schema_fingerprint=await get_schema_fingerprint(dsn, statement_timeout_seconds),
+            ),
+        )
+
+    async def get_entries(self, session: AsyncSession, connection_id: UUID) -> list[QueryCacheOut]:
+        entries = await self.query_cache_repo.list_by_connection(session, connection_id)
+        return [QueryCacheOut.model_validate(entry) for entry in entries]
+
+    async def clear(self, session: AsyncSession, connection_id: UUID) -> None:
+        await self.query_cache_repo.delete_by_connection(session, connection_id)
@@ -1,28 +1,80 @@
+import asyncio
 import logging
 from datetime import datetime
+from typing import Iterator
 from uuid import UUID
 
 from fastapi import Depends
-from langchain_community.utilities.sql_database import SQLDatabase
 
+from dataline.config import config
 from dataline.errors import ValidationError
+from dataline.models.llm_flow.enums import ChartType, QueryResultType
 from dataline.models.llm_flow.schema import (
     ChartGenerationResultContent,
+    QueryRunData,
+    SQLQueryRunResultContent,
     SQLQueryStringResultContent,
 )
-from dataline.models.result.schema import ChartRefreshOut, ResultUpdate
-from dataline.repositories.base import AsyncSession, NotFoundError
+from dataline.models.result.model import ResultModel
+from dataline.models.result.schema import (
+    ChartRefreshOut,
+    ConversationChartRefreshOut,
+    ExportFormat,
+    ResultCreate,
+    ResultUpdate,
+)
+from dataline.repositories.base import AsyncSession, NotFoundError, SessionCreator
 from dataline.repositories.result import ResultRepository
-from dataline.services.llm_flow.llm_calls.chart_generator import ChartType
-from dataline.services.llm_flow.toolkit import (
+from dataline.services.export import require_pyarrow, stream_export
+from dataline.services.llm_flow.query_classification import read_only_violation
+from dataline.services.llm_flow.query_execution import (
+    QueryTimeoutRunException,
     RunException,
+    cancel_running_statements,
+    connect_database,
     execute_sql_query,
     query_run_result_to_chart_json,
 )
+from dataline.utils.storage import delete_unreferenced_blobs
 
 logger = logging.getLogger(__name__)
 
 
+async def run_sql_query(
+    dsn: str,
+    sql: str,
+    for_chart: bool = False,
+    chart_type: ChartType | None = None,
+    statement_timeout_seconds: int | None = None,
+    limit: int | None = None,
+) -> QueryRunData:
+    """
+    Connect to the target database and run a query in a thread.
+    The query is interrupted if the calling task is cancelled, ex. when the client disconnects.
+    """
+    db = await asyncio.to_thread(connect_database, dsn, statement_timeout_seconds)
+    try:
+        return await asyncio.to_thread(execute_sql_query, db, sql, for_chart, chart_type, limit)
+    except asyncio.CancelledError:
+        cancel_running_statements(db)
+        raise
+    finally:
+        db._engine.dispose()
+
+
+async def delete_unreferenced_result_blobs() -> None:
+    """Delete the blobs of deleted results, ex. after deleting a conversation."""
+    try:
+        async with SessionCreator() as session:
+            references = await ResultRepository().list_blob_references(session)
+        deleted = await asyncio.to_thread(delete_unreferenced_blobs, references)
+    except Exception:
+        logger.exception("Could not delete unreferenced result blobs")
+        return
+    if deleted:
+        logger.info(f"Deleted {deleted} unreferenced result blobs")
+
+
 class ResultService:
     result_repo: ResultRepository
 
@@ -81,35 +133,232 @@ class ResultService:
         sql_query_string_result = await self.result_repo.get_by_uuid(session, chart_result.linked_id)
         sql_string = SQLQueryStringResultContent.model_validate_json(sql_query_string_result.content).sql
 
-        # Get DSN from linked connection
-        dsn = await self.result_repo.get_dsn_from_result(session, chart_id)
-        db = SQLDatabase.from_uri(dsn)
+        # Get linked connection
+        connection = await self.result_repo.get_connection_from_result(session, chart_id)
 
         # Refresh chart data
-        query_run_data = execute_sql_query(db, sql_string, for_chart=True, chart_type=chart_type)
+        query_run_data = await run_sql_query(
+            connection.dsn, sql_string, True, chart_type, statement_timeout_seconds=connection.statement_timeout_seconds
+        )
         updated_chartjs_json = query_run_result_to_chart_json(chart_content.chartjs_json, chart_type, query_run_data)
 
-        # Store updated chart result
-        updated_content = ChartGenerationResultContent(
-            chartjs_json=updated_chartjs_json, chart_type=chart_content.chart_type
+        # Only the data is rewritten, the chart keeps its template
+        await self._store_query_run_data(
+            session, sql_query_string_result.id, sql_query_string_result.message_id, query_run_data, for_chart=True
         )
+
         updated_date = datetime.now()
-        await self.result_repo.update_by_uuid(
-            session, chart_id, ResultUpdate(created_at=updated_date, content=updated_content.model_dump_json())
-        )
+        await self.result_repo.update_by_uuid(session, chart_id, ResultUpdate(created_at=updated_date))
 
         return ChartRefreshOut(chartjs_json=updated_chartjs_json, created_at=updated_date)
 
+    async def refresh_conversation_charts(
+        self, session: AsyncSession, conversation_id: UUID
+    ) -> list[ConversationChartRefreshOut]:
+        """
+        Refresh every chart of a conversation.
+        SQL queries run concurrently (bounded) over one engine per connection and results are updated in bulk.
+        """
+        rows = await self.result_repo.list_charts_with_sql_by_conversation(session, conversation_id)
+
+        # One entry per chart, keep the first SQL run result found as the chart data
+        charts: dict[UUID, tuple[ResultModel, ResultModel, ResultModel | None, str]] = {}
+        statement_timeouts: dict[str, int | None] = {}
+        for chart, sql_string, sql_run, connection in rows:
+            charts.setdefault(chart.id, (chart, sql_string, sql_run, connection.dsn))
+            statement_timeouts[connection.dsn] = connection.statement_timeout_seconds
+
+        # A database that can't be connected to only fails its own charts
+        databases = dict(
+            zip(
+                statement_timeouts,
+                await asyncio.gather(
+                    *(asyncio.to_thread(connect_database, dsn, timeout) for dsn, timeout in statement_timeouts.items()),
+                    return_exceptions=True,
+                ),
+            )
+        )
+        semaphore = asyncio.Semaphore(config.chart_refresh_concurrency)
+
+        async def run_chart_query(sql: str, dsn: str, chart_type: ChartType) -> QueryRunData:
+            database = databases[dsn]
+            if isinstance(database, BaseException):
+                raise RunException(f"Could not connect to the database: {database}")
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(execute_sql_query, database, sql, True, chart_type)
+                except asyncio.CancelledError:
+                    cancel_running_statements(database)
+                    raise
+
+        chart_list = list(charts.values())
+        chart_contents = [ChartGenerationResultContent.model_validate_json(chart.content) for chart, *_ in chart_list]
+        try:
+            query_results = await asyncio.gather(
+                *(
+                    run_chart_query(
+                        SQLQueryStringResultContent.model_validate_json(sql_string.content).sql,
+                        dsn,
+                        ChartType[chart_content.chart_type],
+                    )
+                    for (_, sql_string, _, dsn), chart_content in zip(chart_list, chart_contents)
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            for database in databases.values():
+                if not isinstance(database, BaseException):
+                    database._engine.dispose()
+
+        updated_date = datetime.now()
+        refreshed: list[ConversationChartRefreshOut] = []
+        run_result_contents: dict[UUID, str] = {}
+        new_run_results: list[ResultCreate] = []
+        for (chart, sql_string, sql_run, _), chart_content, query_result in zip(
+            chart_list, chart_contents, query_results
+        ):
+            if isinstance(query_result, BaseException):
+                error = query_result.message if isinstance(query_result, RunException) else str(query_result)
+                refreshed.append(
+                    ConversationChartRefreshOut(result_id=chart.id, created_at=chart.created_at, error=error)
+                )
+                continue
+
+            run_content = SQLQueryRunResultContent(data=query_result, is_secure=False, for_chart=True)
+            if sql_run is None:
+                new_run_results.append(
+                    ResultCreate(
+                        content=run_content.model_dump_json(),
+                        type=QueryResultType.SQL_QUERY_RUN_RESULT.value,
+                        message_id=sql_string.message_id,
+                        linked_id=sql_string.id,
+                    )
+                )
+            else:
+                run_content.is_secure = SQLQueryRunResultContent.model_validate_json(sql_run.content).is_secure
+                run_result_contents[sql_run.id] = run_content.model_dump_json()
+
+            chart_type = ChartType[chart_content.chart_type]
+            refreshed.append(
+                ConversationChartRefreshOut(
+                    result_id=chart.id,
+                    created_at=updated_date,
+                    chartjs_json=query_run_result_to_chart_json(chart_content.chartjs_json, chart_type, query_result),
+                )
+            )
+
+        await self.result_repo.update_contents(session, run_result_contents)
+        if new_run_results:
+            await self.result_repo.create_many(session, new_run_results)
+        await self.result_repo.update_created_at(
+            session, [chart.result_id for chart in refreshed if chart.error is None], updated_date
+        )
+        return refreshed
+
+    async def refresh_sql_query_result_data(self, session: AsyncSession, sql_string_result_id: UUID) -> datetime:
+        """Re-run a SQL query string result and store the rows as its linked run result."""
+        sql_query_string_result = await self.result_repo.get_by_uuid(session, sql_string_result_id)
+        sql_string = SQLQueryStringResultContent.model_validate_json(sql_query_string_result.content).sql
+        connection = await self.result_repo.get_connection_from_result(session, sql_string_result_id)
+
+        # The data of a chart is run as chart data, with the row cap of charts
+        chart_type = None
+        run_result = await self.result_repo.get_run_result_from_sql_query(session, sql_string_result_id)
+        if run_result is not None and SQLQueryRunResultContent.model_validate_json(run_result.content).for_chart:
+            try:
+                chart = await self.result_repo.get_chart_from_sql_query(session, sql_string_result_id)
+                chart_type = ChartType[ChartGenerationResultContent.model_validate_json(chart.content).chart_type]
+            except NotFoundError:
+                pass
+
+        query_run_data = await run_sql_query(
+            connection.dsn,
+            sql_string,
+            chart_type is not None,
+            chart_type,
+            statement_timeout_seconds=connection.statement_timeout_seconds,
+        )
+        await self._store_query_run_data(
+            session, sql_string_result_id, sql_query_string_result.message_id, query_run_data, for_chart=False
+        )
+
+        updated_date = datetime.now()
+        await self.result_repo.update_by_uuid(session, sql_string_result_id, ResultUpdate(created_at=updated_date))
+        return updated_date
+
+    async def _store_query_run_data(
+        self,
+        session: AsyncSession,
+        sql_string_result_id: UUID,
+        message_id: UUID,
+        query_run_data: QueryRunData,
+        for_chart: bool,
+    ) -> None:
+        run_content = SQLQueryRunResultContent(data=query_run_data, is_secure=False, for_chart=for_chart)
+        sql_query_run_result = await self.result_repo.get_run_result_from_sql_query(session, sql_string_result_id)
+        if sql_query_run_result is None:
+            # Ex. charts stored with their data embedded, store the data next to them from now on
+            await self.result_repo.create(
+                session,
+                ResultCreate(
+                    content=run_content.model_dump_json(),
+                    type=QueryResultType.SQL_QUERY_RUN_RESULT.value,
+                    message_id=message_id,
+                    linked_id=sql_string_result_id,
+                ),
+            )
+        else:
+            stored_content = SQLQueryRunResultContent.model_validate_json(sql_query_run_result.content)
+            run_content.is_secure = stored_content.is_secure
+            # Charts render from run results flagged for_chart, a refresh of their SQL must not unlink them
+            run_content.for_chart = stored_content.for_chart or for_chart
+            await self.result_repo.update_by_uuid(
+                session, sql_query_run_result.id, ResultUpdate(content=run_content.model_dump_json())
+            )
+
+    async def export_result(
+        self, session: AsyncSession, result_id: UUID, export_format: ExportFormat
+    ) -> Iterator[bytes]:
+        """
+        Chunks of the full results of a SQL query result, re-run without the row limit.
+        Run results and charts are exported through the SQL query they are linked to.
+        """
+        result = await self.result_repo.get_by_uuid(session, result_id)
+        if result.type != QueryResultType.SQL_QUERY_STRING_RESULT.value and result.linked_id:
+            result = await self.result_repo.get_by_uuid(session, result.linked_id)
+        if result.type != QueryResultType.SQL_QUERY_STRING_RESULT.value:
+            raise ValidationError("Only SQL query results, and the results and charts linked to them, can be exported.")
+
+        sql = SQLQueryStringResultContent.model_validate_json(result.content).sql
+        # Same check as when the query is run, exports go through the read only session too
+        if config.read_only_queries:
+            violation = read_only_violation(sql)
+            if violation is not None:
+                raise ValidationError(violation)
+        if export_format != ExportFormat.csv:
+            require_pyarrow()
+
+        connection = await self.result_repo.get_connection_from_result(session, result.id)
+        db = await asyncio.to_thread(connect_database, connection.dsn, connection.statement_timeout_seconds)
+        return stream_export(db, sql, export_format)
+
     async def validate_sql_query_result_for_chart(
         self, session: AsyncSession, result_id: UUID, sql: str, chart_type: ChartType
     ) -> None:
-        # Get DSN from linked connection
-        dsn = await self.result_repo.get_dsn_from_result(session, result_id)
-        db = SQLDatabase.from_uri(dsn)
+        # Get linked connection
+        connection = await self.result_repo.get_connection_from_result(session, result_id)
 
         # Run query to ensure it's compatible with the linked chart
         try:
-            execute_sql_query(db, sql, for_chart=True, chart_type=chart_type)
+            await run_sql_query(
+                connection.dsn,
+                sql,
+                for_chart=True,
+                chart_type=chart_type,
+                statement_timeout_seconds=connection.statement_timeout_seconds,
+            )
+        except QueryTimeoutRunException as e:
+            raise ValidationError(e.message)
         except RunException:
             # TODO: Modify this based on chart type
             raise ValidationError(
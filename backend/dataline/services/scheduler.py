@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from fastapi import Depends
+
+from dataline.config import config
+from dataline.errors import ValidationError
+from dataline.models.llm_flow.enums import QueryResultType
+from dataline.models.schedule.schema import (
+    ScheduleCreate,
+    ScheduleIn,
+    ScheduleOut,
+    ScheduleUpdate,
+)
+from dataline.repositories.base import AsyncSession, SessionCreator
+from dataline.repositories.result import ResultRepository
+from dataline.repositories.schedule import ScheduleRepository
+from dataline.services.result import ResultService
+
+logger = logging.getLogger(__name__)
+
+SCHEDULABLE_RESULT_TYPES = [
+    QueryResultType.SQL_QUERY_STRING_RESULT.value,
+    QueryResultType.CHART_GENERATION_RESULT.value,
+]
+
+
+def next_run_after(start: datetime, interval_seconds: int) -> datetime:
+    # Jitter spreads schedules created at the same time so they don't hit the same database at once
+    jitter = random.uniform(0, interval_seconds * config.scheduler_jitter_fraction)
+    return start + timedelta(seconds=interval_seconds + jitter)
+
+
+class ScheduleService:
+    schedule_repo: ScheduleRepository
+    result_repo: ResultRepository
+
+    def __init__(
+        self,
+        schedule_repo: ScheduleRepository = Depends(ScheduleRepository),
+        result_repo: ResultRepository = Depends(ResultRepository),
+    ) -> None:
+        self.schedule_repo = schedule_repo
+        self.result_repo = result_repo
+
+    async def get_schedules(self, session: AsyncSession) -> list[ScheduleOut]:
+        schedules = await self.schedule_repo.list_all(session)
+        return [ScheduleOut.model_validate(schedule) for schedule in schedules]
+
+    async def set_schedule(self, session: AsyncSession, result_id: UUID, data: ScheduleIn) -> ScheduleOut:
+        result = await self.result_repo.get_by_uuid(session, result_id)
+        if result.type not in SCHEDULABLE_RESULT_TYPES:
+            raise ValidationError("Only SQL queries and charts can be refreshed on a schedule.")
+        if data.interval_seconds < config.scheduler_min_interval_seconds:
+            raise ValidationError(
+                f"Schedule interval must be at least {config.scheduler_min_interval_seconds} seconds."
+            )
+
+        next_run_at = next_run_after(datetime.now(), data.interval_seconds)
+        existing = await self.schedule_repo.get_by_result_id_or_none(session, result_id)
+        if existing is None:
+            schedule = await self.schedule_repo.create(
+                session,
+                ScheduleCreate(result_id=result_id, interval_seconds=data.interval_seconds, next_run_at=next_run_at),
+            )
+        else:
+            schedule = await self.schedule_repo.update_by_uuid(
+                session,
+                existing.id,
+                ScheduleUpdate(interval_seconds=data.interval_seconds, next_run_at=next_run_at),
+            )
+        return ScheduleOut.model_validate(schedule)
+
+    async def delete_schedule(self, session: AsyncSession, result_id: UUID) -> None:
+        schedule = await self.schedule_repo.get_by_result_id_or_none(session, result_id)
+        if schedule is not None:
+            await self.schedule_repo.delete_by_uuid(session, schedule.id)
+
+
+# Schedules being refreshed, a slow query must not be started again by the next tick
+_running_schedules: set[UUID] = set()
+_background_tasks: set[asyncio.Task[None]] = set()
+# Limits concurrent refreshes against the same database
+_connection_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+async def _refresh_schedule(schedule_id: UUID, result_id: UUID, interval_seconds: int, dsn: str) -> None:
+    semaphore = _connection_semaphores.setdefault(
+        dsn, asyncio.Semaphore(config.scheduler_max_concurrency_per_connection)
+    )
+    error = None
+    try:
+        async with semaphore, SessionCreator.begin() as session:
+            result_service = ResultService(ResultRepository())
+            result = await result_service.result_repo.get_by_uuid(session, result_id)
+            if result.type == QueryResultType.CHART_GENERATION_RESULT.value:
+                await result_service.refresh_chart_result_data(session, result_id)
+            else:
+                await result_service.refresh_sql_query_result_data(session, result_id)
+    except Exception as e:
+        logger.exception(f"Scheduled refresh of result {result_id} failed")
+        error = str(e)
+
+    try:
+        now = datetime.now()
+        async with SessionCreator.begin() as session:
+            await ScheduleRepository().update_by_uuid(
+                session,
+                schedule_id,
+                ScheduleUpdate(last_run_at=now, next_run_at=next_run_after(now, interval_seconds), last_error=error),
+            )
+    except Exception:
+        # Ex. result deleted while refreshing
+        logger.exception(f"Could not update schedule {schedule_id}")
+    finally:
+        _running_schedules.discard(schedule_id)
+
+
+async def run_due_schedules() -> int:
+    """Start a background refresh for every due schedule. Returns the number of refreshes started."""
+    result_repo = ResultRepository()
+    async with SessionCreator() as session:
+        due_schedules = await ScheduleRepository().list_due(session, datetime.now())
+        to_start = []
+        for schedule in due_schedules:
+            if schedule.id in _running_schedules:
+                continue
+            connection = await result_repo.get_connection_from_result(session, schedule.result_id)
+            to_start.append((schedule.id, schedule.result_id, schedule.interval_seconds, connection.dsn))
+
+    for schedule_id, result_id, interval_seconds, dsn in to_start:
+        _running_schedules.add(schedule_id)
+        task = asyncio.create_task(_refresh_schedule(schedule_id, result_id, interval_seconds, dsn))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return len(to_start)
+
+
+async def run_scheduler() -> None:
+    """Poll for due schedules until cancelled, started with the app lifespan."""
+    while True:
+        try:
+            started = await run_due_schedules()
+            if started:
+                logger.info(f"Started {started} scheduled refreshes")
+        except Exception:
+            logger.exception("Scheduler tick failed")
+        await asyncio.sleep(config.scheduler_poll_seconds)
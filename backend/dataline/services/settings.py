@@ -1,9 +1,10 @@
+import hashlib
 import logging
 import mimetypes
+import time
 from typing import Optional
 from uuid import uuid4
 
-import openai
 from fastapi import Depends, UploadFile
 from pydantic import SecretStr
 
@@ -15,14 +16,49 @@ from dataline.repositories.base import AsyncSession, NotFoundError
 from dataline.repositories.media import MediaCreate, MediaRepository
 from dataline.repositories.user import UserCreate, UserRepository, UserUpdate
 from dataline.sentry import opt_out_of_sentry, setup_sentry
+from dataline.services import cache
 
 logger = logging.getLogger(__name__)
 
 
-def model_exists(openai_api_key: SecretStr | str, model: str) -> bool:
+# Models available to each API key (by key hash) with the time they were fetched
+_openai_models: dict[str, tuple[float, list[str]]] = {}
+
+
+def _hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+async def list_openai_models(openai_api_key: SecretStr | str) -> list[str]:
+    """Models available to an OpenAI key, cached for openai_models_cache_ttl_seconds."""
+    # The OpenAI client is slow to import and only needed once an API key is set
+    import openai
+
     api_key = openai_api_key.get_secret_value() if isinstance(openai_api_key, SecretStr) else openai_api_key
-    models = openai.OpenAI(api_key=api_key).models.list()
-    return model in {model.id for model in models}
+    key_hash = _hash_api_key(api_key)
+    cached = _openai_models.get(key_hash)
+    if cached and time.monotonic() - cached[0] < config.openai_models_cache_ttl_seconds:
+        return cached[1]
+
+    try:
+        async with openai.AsyncOpenAI(api_key=api_key) as client:
+            models = sorted([model.id async for model in client.models.list()])
+    except openai.AuthenticationError as e:
+        raise ValidationError("Invalid OpenAI Key") from e
+
+    _openai_models[key_hash] = (time.monotonic(), models)
+    return models
+
+
+async def model_exists(openai_api_key: SecretStr | str, model: str) -> bool:
+    return model in await list_openai_models(openai_api_key)
+
+
+async def check_openai_key(openai_api_key: SecretStr) -> None:
+    required_models = [config.default_model, "gpt-3.5-turbo"]
+    models = await list_openai_models(openai_api_key)
+    if not any(required_model in models for required_model in required_models):
+        raise ValidationError(f"Must have access to at least one of {required_models}")
 
 
 class SettingsService:
@@ -74,6 +110,9 @@ class SettingsService:
         return media_instances[0] if media_instances else None
 
     async def update_user_info(self, session: AsyncSession, data: UserUpdateIn) -> UserOut:
+        if data.openai_api_key:
+            await check_openai_key(data.openai_api_key)
+
         # Check if user exists
         user = None
         user_info = await self.user_repo.get_one_or_none(session)
@@ -83,7 +122,7 @@ class SettingsService:
             if user_create.openai_api_key and user_create.preferred_openai_model is None:
                 user_create.preferred_openai_model = (
                     config.default_model
-                    if model_exists(user_create.openai_api_key, config.default_model)
+                    if await model_exists(user_create.openai_api_key, config.default_model)
                     else "gpt-3.5-turbo"
                 )
             user = await self.user_repo.create(session, user_create)
@@ -97,10 +136,10 @@ class SettingsService:
                 model_to_check = (
                     user_update.preferred_openai_model or user_info.preferred_openai_model or config.default_model
                 )
-                if not model_exists(key_to_check, model_to_check):
+                if not await model_exists(key_to_check, model_to_check):
                     raise Exception(f"model {model_to_check} not accessible with current key")
             elif user_update.preferred_openai_model and user_info.openai_api_key:
-                if not model_exists(user_info.openai_api_key, user_update.preferred_openai_model):
+                if not await model_exists(user_info.openai_api_key, user_update.preferred_openai_model):
                     raise Exception(f"model {user_update.preferred_openai_model} not accessible with current key")
             should_update_sentry_preference = (
                 data.sentry_enabled is not None and user_info.sentry_enabled != data.sentry_enabled
@@ -112,22 +151,45 @@ class SettingsService:
                 else:
                     opt_out_of_sentry()
 
-        return UserOut.model_validate(user)
+        user_out = UserOut.model_validate(user)
+        cache.set_user(session, user_out)
+        return user_out
+
+    async def get_user_info_or_none(self, session: AsyncSession) -> UserOut | None:
+        cached_user = cache.get_user()
+        if cached_user is not None:
+            return cached_user
 
-    async def get_user_info(self, session: AsyncSession) -> UserOut:
         user_info = await self.user_repo.get_one_or_none(session)
+        if user_info is None:
+            return None
+
+        user_out = UserOut.model_validate(user_info)
+        cache.set_user(session, user_out)
+        return user_out
+
+    async def get_user_info(self, session: AsyncSession) -> UserOut:
+        user_info = await self.get_user_info_or_none(session)
         if user_info is None:
             raise NotFoundError("No user or multiple users found")
 
-        return UserOut.model_validate(user_info)
+        return user_info
 
     async def get_model_details(self, session: AsyncSession) -> UserWithKeys:
-        user_info = await self.user_repo.get_one_or_none(session)
+        user_info = await self.get_user_info_or_none(session)
         if user_info is None:
             raise NotFoundError("No user found. Please setup your application.")
 
         if not user_info.openai_api_key:
             raise Exception("OpenAI key not setup. Please setup your application.")
 
-        user_info.preferred_openai_model = user_info.preferred_openai_model or config.default_model
-        return UserWithKeys.model_validate(user_info)
+        return UserWithKeys.model_validate(
+            {
+                **user_info.model_dump(),
+                "preferred_openai_model": user_info.preferred_openai_model or config.default_model,
+            }
+        )
+
+    async def get_available_models(self, session: AsyncSession) -> list[str]:
+        user_with_keys = await self.get_model_details(session)
+        return await list_openai_models(user_with_keys.openai_api_key)
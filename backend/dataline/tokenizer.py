@@ -1,7 +1,35 @@
+from functools import lru_cache
+
 import tiktoken
 
+# Rough average for English text and SQL, used when no encoding is available
+CHARACTERS_PER_TOKEN = 4
+
 
 def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
     encoding = tiktoken.get_encoding(encoding_name)
     num_tokens = len(encoding.encode(string))
     return num_tokens
+
+
+@lru_cache
+def _encoding_for_model(model: str) -> tiktoken.Encoding | None:
+    # Encodings are downloaded on first use, remember failures so offline installs don't retry on every call
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def num_tokens_for_model(string: str, model: str) -> int:
+    """Number of tokens of the string for an OpenAI model, approximated when its encoding can't be loaded."""
+    encoding = _encoding_for_model(model)
+    if encoding is None:
+        return -(-len(string) // CHARACTERS_PER_TOKEN)
+    return len(encoding.encode(string))
@@ -0,0 +1,62 @@
+import json
+from typing import Any, Sequence
+
+from fastapi.encoders import jsonable_encoder
+
+from dataline.config import config
+
+# Chart types whose data is a single (label, value) series
+SINGLE_SERIES_CHART_TYPES = ["bar", "line", "doughnut"]
+
+
+def chart_max_points(chart_type: str) -> int:
+    return config.chart_max_points if chart_type == "line" else config.chart_max_categories
+
+
+def downsample_chart_rows(chart_type: str, rows: Sequence[Sequence[Any]]) -> list[tuple[Any, ...]]:  # type: ignore[misc]
+    """
+    Reduce (label, value) rows to the max points of the chart type: LTTB for line charts, top N + "Other" otherwise.
+    Keeps the chart data small, the full resolution data can be obtained by re-running the SQL query.
+    """
+    if chart_type not in SINGLE_SERIES_CHART_TYPES:
+        raise ValueError(f"Chart type {chart_type} is not supported.")
+
+    max_points = chart_max_points(chart_type)
+    if len(rows) <= max_points:
+        return [tuple(row) for row in rows]
+
+    # Imported on first downsampling, numpy and pandas are slow to import
+    from dataline.utils.downsampling import downsample_series, top_n_with_other
+
+    labels = [row[0] for row in rows]
+    values = [row[1] for row in rows]
+    if chart_type == "line":
+        labels, values = downsample_series(labels, values, max_points)
+    else:
+        labels, values = top_n_with_other(labels, values, max_points)
+    return list(zip(labels, values))
+
+
+def render_chart_json(  # type: ignore[misc]
+    chart_json: str, chart_type: str, rows: Sequence[Sequence[Any]], total_points: int | None = None
+) -> str:
+    """
+    Insert (label, value) rows into a chartjs JSON config.
+    The config can be a template without data or an already populated one, its data is replaced.
+    Rows are expected downsampled when they were queried, total_points is their number before downsampling.
+    """
+    if total_points is None:
+        total_points = len(rows)
+    # Data stored before it was downsampled when queried
+    rows = downsample_chart_rows(chart_type, rows)
+
+    formatted_json = json.loads(chart_json)
+    formatted_json["data"]["labels"] = [row[0] for row in rows]
+    formatted_json["data"]["datasets"][0]["data"] = [row[1] for row in rows]
+    plugins = formatted_json.setdefault("options", {}).setdefault("plugins", {})
+    if len(rows) < total_points:
+        plugins["subtitle"] = {"display": True, "text": f"Showing {len(rows)} of {total_points} points"}
+    else:
+        plugins.pop("subtitle", None)
+    # Query results are already JSON values, only values from elsewhere (ex. stored before conversion) are encoded
+    return json.dumps(formatted_json, default=jsonable_encoder)
@@ -0,0 +1,85 @@
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+OTHER_LABEL = "Other"
+
+
+def _to_float_array(values: Sequence[Any]) -> np.ndarray:  # type: ignore[misc]
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def _to_x_array(labels: Sequence[Any]) -> np.ndarray:  # type: ignore[misc]
+    """Numeric x coordinates for the labels: numbers, timestamps, or the position when neither applies."""
+    series = pd.Series(labels, dtype=object)
+    numeric = pd.to_numeric(series, errors="coerce")
+    if not numeric.isna().any():
+        return numeric.to_numpy(dtype=float)
+
+    try:
+        timestamps = pd.to_datetime(series, errors="coerce", utc=True)
+    except (TypeError, ValueError):
+        timestamps = None
+    if timestamps is not None and not timestamps.isna().any():
+        return timestamps.astype("int64").to_numpy(dtype=float)
+
+    return np.arange(len(labels), dtype=float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:  # type: ignore[misc]
+    """
+    Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013).
+    Returns the indices of the points to keep, always including the first and last ones.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 inner points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Third point of the triangle is the average of the next bucket (or the last point)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def downsample_series(labels: Sequence[Any], values: Sequence[Any], max_points: int) -> tuple[list[Any], list[Any]]:  # type: ignore[misc]
+    """Downsample a line series to max_points while keeping its visual shape."""
+    if len(labels) <= max_points:
+        return list(labels), list(values)
+
+    indices = lttb_indices(_to_x_array(labels), _to_float_array(values), max_points)
+    return [labels[i] for i in indices], [values[i] for i in indices]
+
+
+def top_n_with_other(labels: Sequence[Any], values: Sequence[Any], max_points: int) -> tuple[list[Any], list[Any]]:  # type: ignore[misc]
+    """
+    Keep the max_points - 1 biggest categories in their original order and sum the rest into an "Other" bucket.
+    """
+    if len(labels) <= max_points:
+        return list(labels), list(values)
+
+    numeric_values = _to_float_array(values)
+    # Stable sort so ties keep the query order
+    kept = np.sort(np.argsort(-numeric_values, kind="stable")[: max_points - 1])
+    other_mask = np.ones(len(labels), dtype=bool)
+    other_mask[kept] = False
+
+    other_total = numeric_values[other_mask].sum()
+    return [labels[i] for i in kept] + [OTHER_LABEL], [values[i] for i in kept] + [other_total.item()]
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+
+import pandas as pd
+from pandas.api.types import (
+    is_bool_dtype,
+    is_datetime64_any_dtype,
+    is_float_dtype,
+    is_integer_dtype,
+    is_object_dtype,
+    is_string_dtype,
+)
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Column names that usually hold keys used in joins
+KEY_COLUMN_PATTERN = re.compile(r"(^id$|_id$|^id_|_key$|^key$|_code$|^code$)", re.IGNORECASE)
+
+# Text columns longer than this on average are free text (descriptions, comments), not filter keys
+MAX_AVG_TEXT_LENGTH = 64
+
+
+class SQLiteOptimizationReport(BaseModel):
+    table_name: str
+    indexed_columns: list[str]
+    index_seconds: float
+    analyze_seconds: float
+    vacuum_seconds: float | None = None
+
+    @property
+    def total_seconds(self) -> float:
+        return self.index_seconds + self.analyze_seconds + (self.vacuum_seconds or 0)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _index_score(column: pd.Series) -> float | None:
+    """
+    Score how likely a column is to be used in a WHERE / JOIN / GROUP BY clause.
+    Returns None if the column should not be indexed.
+    """
+    row_count = len(column)
+    if row_count == 0:
+        return None
+
+    non_null = column.dropna()
+    if non_null.empty:
+        return None
+
+    distinct_count = non_null.nunique()
+    if distinct_count <= 1:
+        # Constant columns never help filtering
+        return None
+
+    is_key = bool(KEY_COLUMN_PATTERN.search(str(column.name)))
+    if is_key and (is_integer_dtype(column) or is_object_dtype(column) or is_string_dtype(column)):
+        # Join keys are the best candidates, regardless of cardinality
+        return 2.0
+
+    if is_bool_dtype(column):
+        return None
+
+    if is_float_dtype(column):
+        # Continuous measures are aggregated, not filtered on
+        return None
+
+    if is_object_dtype(column) or is_string_dtype(column):
+        if non_null.astype(str).str.len().mean() > MAX_AVG_TEXT_LENGTH:
+            return None
+        # Categorical columns (region, status, country...) are the usual filter and GROUP BY targets
+        selectivity = distinct_count / row_count
+        return 1.0 if selectivity < 0.5 else 0.5
+
+    if is_datetime64_any_dtype(column):
+        return 1.0
+
+    if is_integer_dtype(column):
+        # Low cardinality integers are usually codes (year, category id)
+        return 0.75 if distinct_count / row_count < 0.5 else None
+
+    return None
+
+
+def select_index_columns(data_df: pd.DataFrame, max_indexes: int) -> list[str]:
+    """Profile the dataframe columns and pick the ones most likely to be used as filter or join keys."""
+    scores: list[tuple[float, str]] = []
+    for column_name in data_df.columns:
+        score = _index_score(data_df[column_name])
+        if score is not None:
+            scores.append((score, str(column_name)))
+
+    # Stable sort keeps original column order for equal scores
+    scores.sort(key=lambda item: item[0], reverse=True)
+    return [column_name for _, column_name in scores[:max_indexes]]
+
+
+def _index_name(table_name: str, column_name: str) -> str:
+    """Readable index name, suffixed with a hash of the raw names so that ex. "a b" and "a_b" don't collide."""
+    digest = hashlib.sha1(f"{table_name}\0{column_name}".encode()).hexdigest()[:8]
+    return re.sub(r"\W", "_", f"ix_{table_name}_{column_name}") + f"_{digest}"
+
+
+def optimize_sqlite_table(
+    conn: sqlite3.Connection,
+    table_name: str,
+    data_df: pd.DataFrame,
+    max_indexes: int = 8,
+    vacuum: bool = False,
+) -> SQLiteOptimizationReport:
+    """
+    Post-ingestion optimization of a table written by pandas' to_sql.
+    Creates indexes on likely filter/join keys, collects planner statistics and optionally compacts the file.
+    The table data must already be committed.
+    """
+    start = time.perf_counter()
+    indexed_columns = select_index_columns(data_df, max_indexes=max_indexes)
+    for column_name in indexed_columns:
+        index_name = _index_name(table_name, column_name)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {quote_identifier(index_name)} "
+            f"ON {quote_identifier(table_name)} ({quote_identifier(column_name)})"
+        )
+    conn.commit()
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    conn.execute("ANALYZE")
+    conn.commit()
+    analyze_seconds = time.perf_counter() - start
+
+    vacuum_seconds = None
+    if vacuum:
+        start = time.perf_counter()
+        conn.execute("VACUUM")  # Can't run inside a transaction, everything is committed at this point
+        vacuum_seconds = time.perf_counter() - start
+
+    report = SQLiteOptimizationReport(
+        table_name=table_name,
+        indexed_columns=indexed_columns,
+        index_seconds=index_seconds,
+        analyze_seconds=analyze_seconds,
+        vacuum_seconds=vacuum_seconds,
+    )
+    logger.info(
+        f"Optimized table '{table_name}' in {report.total_seconds:.3f}s "
+        f"(indexes on {indexed_columns}: {index_seconds:.3f}s, ANALYZE: {analyze_seconds:.3f}s"
+        + (f", VACUUM: {vacuum_seconds:.3f}s)" if vacuum_seconds is not None else ")")
+    )
+    return report
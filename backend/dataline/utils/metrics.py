@@ -0,0 +1,192 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text exposition format.
+Metrics are kept per process, as the app runs as a single process.
+"""
+
+import functools
+import inspect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Generator, Sequence, TypeVar
+
+from dataline.config import config
+
+F = TypeVar("F", bound=Callable[..., Any])  # type: ignore[misc]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (non cumulative, last one is +Inf), sum of observations
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        bucket_index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bucket_index] += 1
+            total[0] += value
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip([*map(_format_value, self.buckets), "+Inf"], counts):
+                cumulative += count
+                labels = _format_labels((*self.label_names, "le"), (*key, bound))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+REGISTRY: list[Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "dataline_http_request_duration_seconds",
+    "Time to process an HTTP request until the response starts",
+    ["method", "route", "status"],
+)
+STAGE_DURATION = Histogram(
+    "dataline_stage_duration_seconds",
+    "Time spent in each stage of a request (sampled, see metrics_sample_rate)",
+    ["stage"],
+)
+STAGE_ERRORS = Counter("dataline_stage_errors_total", "Stages that raised an exception (not sampled)", ["stage"])
+QUERY_CACHE_LOOKUPS = Counter("dataline_query_cache_lookups_total", "Query cache lookups", ["result"])
+QUERY_VALIDATION_FAILURES = Counter(
+    "dataline_query_validation_failures_total", "Agent queries sent back before reaching the database", ["reason"]
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration, for a metrics_sample_rate fraction of the calls."""
+    if config.metrics_enabled and random.random() < config.metrics_sample_rate:
+        STAGE_DURATION.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Generator[None, None, None]:
+    """Time a block as a stage of the request, errors are always counted."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if config.metrics_enabled:
+            STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Decorator version of timed_stage, for sync and async functions."""
+
+    def decorator(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:  # type: ignore[misc]
+                with timed_stage(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # type: ignore[misc]
+            with timed_stage(stage):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
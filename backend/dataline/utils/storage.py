@@ -0,0 +1,108 @@
+"""
+Compression of large stored payloads, and a content addressed blob store on disk for the largest ones.
+Blobs are named after the hash of their content, so identical payloads (ex. a result refreshed without changes)
+are stored once.
+"""
+
+import hashlib
+import logging
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+from dataline.config import config
+
+logger = logging.getLogger(__name__)
+
+# First byte of compressed payloads, the codec they were compressed with
+ZLIB_TAG = b"\x01"
+ZSTD_TAG = b"\x02"
+# Stored instead of payloads moved to the blob store, JSON payloads can't start with it
+BLOB_REFERENCE_PREFIX = "blob:sha256:"
+# Blobs younger than this are kept by the garbage collection, their row may not be committed yet
+BLOB_MIN_AGE_SECONDS = 3600
+
+
+def get_blob_directory() -> Path:
+    return Path(config.data_directory) / "blobs"
+
+
+def compress(data: bytes) -> bytes:
+    if config.storage_compression == "zstd":
+        # Optional dependency, only needed when zstd is configured
+        import zstandard
+
+        return ZSTD_TAG + zstandard.ZstdCompressor(level=config.storage_compression_level).compress(data)
+    return ZLIB_TAG + zlib.compress(data, config.storage_compression_level)
+
+
+def decompress(data: bytes) -> bytes:
+    tag, payload = data[:1], data[1:]
+    if tag == ZSTD_TAG:
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if tag == ZLIB_TAG:
+        return zlib.decompress(payload)
+    raise ValueError(f"Unknown compression tag {tag!r}")
+
+
+def _blob_path(digest: str) -> Path:
+    return get_blob_directory() / digest[:2] / digest
+
+
+def write_blob(data: bytes) -> str:
+    """Store compressed data in the blob store, return its reference."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if path.exists():
+        # Already stored, mark it as recently used for the garbage collection
+        path.touch()
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to its final path then renamed, readers never see a partial blob
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+    return BLOB_REFERENCE_PREFIX + digest
+
+
+def read_blob(reference: str) -> bytes:
+    return _blob_path(reference.removeprefix(BLOB_REFERENCE_PREFIX)).read_bytes()
+
+
+def encode_payload(value: str) -> str | bytes:
+    """
+    Stored form of a text payload: as is when small, compressed above storage_compression_min_bytes,
+    and a blob reference when still above storage_blob_min_bytes once compressed.
+    """
+    data = value.encode()
+    if len(data) < config.storage_compression_min_bytes:
+        return value
+    compressed = compress(data)
+    if len(compressed) >= config.storage_blob_min_bytes:
+        return write_blob(compressed)
+    return compressed
+
+
+def decode_payload(value: str | bytes) -> str:
+    if isinstance(value, bytes):
+        return decompress(value).decode()
+    if value.startswith(BLOB_REFERENCE_PREFIX):
+        return decompress(read_blob(value)).decode()
+    return value
+
+
+def delete_unreferenced_blobs(references: Iterable[str]) -> int:
+    """Delete blobs no longer referenced, return how many were deleted."""
+    referenced = {reference.removeprefix(BLOB_REFERENCE_PREFIX) for reference in references}
+    deleted = 0
+    min_mtime = time.time() - BLOB_MIN_AGE_SECONDS
+    for path in get_blob_directory().glob("*/*"):
+        if path.name in referenced or path.stat().st_mtime > min_mtime:
+            continue
+        path.unlink(missing_ok=True)
+        deleted += 1
+    return deleted
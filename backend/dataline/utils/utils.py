@@ -1,9 +1,10 @@
+import asyncio
 import base64
 import logging
 import random
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, TypeVar
 
-from fastapi import UploadFile
+from fastapi import Request, UploadFile
 from sqlalchemy.exc import NoSuchModuleError, ProgrammingError
 
 from dataline.errors import UserFacingError, ValidationError
@@ -11,6 +12,8 @@ from dataline.models.llm_flow.enums import QueryStreamingEventType
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 def get_sqlite_dsn_async(path: str) -> str:
     return f"sqlite+aiosqlite:///{path}"
@@ -20,6 +23,10 @@ def get_sqlite_dsn(path: str) -> str:
     return f"sqlite:///{path}"
 
 
+def get_duckdb_dsn(path: str) -> str:
+    return f"duckdb:///{path}"
+
+
 def is_valid_sqlite_file(file: UploadFile) -> bool:
     # Check header for "SQLite format" by reading first few bytes
     # https://www.sqlite.org/fileformat2.html#the_database_header
@@ -30,6 +37,14 @@ def is_valid_sqlite_file(file: UploadFile) -> bool:
     return True
 
 
+def is_parquet_file(file: UploadFile) -> bool:
+    # Parquet files start with the "PAR1" magic bytes
+    # https://parquet.apache.org/docs/file-format/
+    header = file.file.read(4)
+    file.file.seek(0)
+    return header == b"PAR1"
+
+
 def generate_short_uuid() -> str:
     # Unique enough given the purpose of storing limited data files
     # Make sure only alphanumeric characters are used
@@ -66,3 +81,24 @@ def forward_connection_errors(error: Exception) -> None:
             )
     if isinstance(error, NoSuchModuleError):
         raise UserFacingError(f"Your version of DataLine does not support this database yet - {str(error)}")
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_seconds: float = 0.5) -> T:
+    """
+    Await, cancelling the awaitable if the client disconnects first.
+    Servers don't cancel regular (non streaming) endpoints when their client goes away.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling {request.method} {request.url.path}")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise asyncio.CancelledError()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
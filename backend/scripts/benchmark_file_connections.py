@@ -0,0 +1,108 @@
+"""
+Compare analytical query performance of uploaded files stored in SQLite vs DuckDB.
+
+Usage (from the backend directory):
+    PYTHONPATH=. python scripts/benchmark_file_connections.py --rows 2000000
+"""
+
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from dataline.utils.utils import get_duckdb_dsn, get_sqlite_dsn
+
+TABLE_NAME = "sales"
+
+QUERIES = {
+    "group_by_category": f"SELECT category, SUM(amount), AVG(quantity) FROM {TABLE_NAME} GROUP BY category",
+    "group_by_two_keys": (
+        f"SELECT region, category, COUNT(*), MAX(amount) FROM {TABLE_NAME} GROUP BY region, category "
+        "ORDER BY COUNT(*) DESC LIMIT 10"
+    ),
+    "filtered_aggregate": f"SELECT region, SUM(amount) FROM {TABLE_NAME} WHERE quantity > 50 GROUP BY region",
+    "distinct_count": f"SELECT COUNT(DISTINCT customer_id) FROM {TABLE_NAME}",
+}
+
+
+def generate_csv(path: Path, rows: int) -> None:
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(
+        {
+            "customer_id": rng.integers(0, rows // 10 + 1, rows),
+            "region": rng.choice(["north", "south", "east", "west"], rows),
+            "category": rng.choice([f"category_{i}" for i in range(50)], rows),
+            "quantity": rng.integers(1, 100, rows),
+            "amount": rng.random(rows) * 1000,
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+def ingest_sqlite(csv_path: Path, db_path: Path) -> float:
+    # Mirrors ConnectionService.create_csv_connection
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    pd.read_csv(csv_path).to_sql(TABLE_NAME, conn, if_exists="replace", index=False)
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def ingest_duckdb(csv_path: Path, db_path: Path) -> float:
+    # Mirrors ConnectionService.create_duckdb_connection
+    start = time.perf_counter()
+    conn = duckdb.connect(str(db_path))
+    conn.read_csv(str(csv_path)).create(TABLE_NAME)
+    conn.close()
+    return time.perf_counter() - start
+
+
+def time_queries(db: SQLDatabase, repeat: int) -> dict[str, float]:
+    timings = {}
+    for name, query in QUERIES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.run(query, fetch="all")
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of rows in the generated CSV")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query, the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        csv_path = tmp_dir / "sales.csv"
+        generate_csv(csv_path, args.rows)
+
+        sqlite_path = tmp_dir / "sales.sqlite"
+        duckdb_path = tmp_dir / "sales.duckdb"
+        sqlite_ingest = ingest_sqlite(csv_path, sqlite_path)
+        duckdb_ingest = ingest_duckdb(csv_path, duckdb_path)
+
+        sqlite_timings = time_queries(SQLDatabase.from_uri(get_sqlite_dsn(str(sqlite_path))), args.repeat)
+        duckdb_timings = time_queries(SQLDatabase.from_uri(get_duckdb_dsn(str(duckdb_path))), args.repeat)
+
+    print(f"Rows: {args.rows:,}")
+    print(f"{'step':<22}{'sqlite (s)':>12}{'duckdb (s)':>12}{'speedup':>10}")
+    rows = [("ingest", sqlite_ingest, duckdb_ingest)] + [
+        (name, sqlite_timings[name], duckdb_timings[name]) for name in QUERIES
+    ]
+    for name, sqlite_time, duckdb_time in rows:
+        print(f"{name:<22}{sqlite_time:>12.3f}{duckdb_time:>12.3f}{sqlite_time / duckdb_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
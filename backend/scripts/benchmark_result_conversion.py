@@ -0,0 +1,74 @@
+"""
+Compare the per column conversion of query results with the previous per cell truncate_word loop,
+followed by jsonable_encoder as when rendering a chart.
+
+Usage (from the backend directory):
+    PYTHONPATH=. python scripts/benchmark_result_conversion.py --rows 100000
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi.encoders import jsonable_encoder
+
+from dataline.services.llm_flow.query_execution import convert_rows, truncate_word
+
+MAX_STRING_LENGTH = 300
+
+
+def generate_rows(rows: int) -> list[tuple[Any, ...]]:
+    start = datetime(2024, 1, 1)
+    return [
+        (
+            i,
+            f"customer_{i % 1000}",
+            Decimal(i % 10_000) / 100,
+            start + timedelta(minutes=i),
+            i * 0.5,
+            None if i % 7 else "note " * 100,
+        )
+        for i in range(rows)
+    ]
+
+
+def per_cell(rows: list[tuple[Any, ...]]) -> str:
+    # Previous execute_sql_query loop, then encoding of the whole result
+    truncated_rows = [tuple(truncate_word(column, length=MAX_STRING_LENGTH) for column in row) for row in rows]
+    return json.dumps(jsonable_encoder(truncated_rows))
+
+
+def per_column(rows: list[tuple[Any, ...]]) -> str:
+    return json.dumps(convert_rows(rows, MAX_STRING_LENGTH), default=jsonable_encoder)
+
+
+def best_time(func: Callable[[list[tuple[Any, ...]]], str], rows: list[tuple[Any, ...]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of rows in the generated result")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per conversion, the best one is reported")
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows)
+    assert per_cell(rows) == per_column(rows)
+    per_cell_time = best_time(per_cell, rows, args.repeat)
+    per_column_time = best_time(per_column, rows, args.repeat)
+
+    print(f"Rows: {args.rows:,}")
+    print(f"{'per cell (s)':>14}{'per column (s)':>16}{'speedup':>10}")
+    print(f"{per_cell_time:>14.3f}{per_column_time:>16.3f}{per_cell_time / per_column_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
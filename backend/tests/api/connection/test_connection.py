@@ -1,8 +1,10 @@
 import logging
 import pathlib
+from io import BytesIO
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
 
 from dataline.config import config
 from dataline.models.connection.schema import DB_SAMPLES, Connection
@@ -114,6 +116,23 @@ async def test_update_connection(client: TestClient, dvdrental_connection: Conne
     pathlib.Path("new.db").unlink(missing_ok=True)
 
 
+@pytest.mark.asyncio
+async def test_update_connection_statement_timeout(client: TestClient, dvdrental_connection: Connection) -> None:
+    assert dvdrental_connection.statement_timeout_seconds is None
+
+    response = client.patch(f"/connection/{dvdrental_connection.id}", json={"statement_timeout_seconds": 30})
+    assert response.json()["data"]["connection"]["statement_timeout_seconds"] == 30
+
+    # Other updates keep the timeout, null goes back to the default one
+    response = client.patch(f"/connection/{dvdrental_connection.id}", json={"name": "Renamed"})
+    assert response.json()["data"]["connection"]["statement_timeout_seconds"] == 30
+    response = client.patch(f"/connection/{dvdrental_connection.id}", json={"statement_timeout_seconds": None})
+    assert response.json()["data"]["connection"]["statement_timeout_seconds"] is None
+
+    response = client.patch(f"/connection/{dvdrental_connection.id}", json={"statement_timeout_seconds": -1})
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_delete_connection(client: TestClient, dvdrental_connection: Connection) -> None:
     response = client.delete(f"/connection/{str(dvdrental_connection.id)}")
@@ -124,3 +143,56 @@ async def test_delete_connection(client: TestClient, dvdrental_connection: Conne
     response = client.get("/connections")
     data = response.json()["data"]
     assert len(data["connections"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_connect_file_duckdb_csv(client: TestClient) -> None:
+    csv_data = b"name,amount\nfoo,1\nbar,2\nfoo,3\n"
+    response = client.post(
+        "/connect/file",
+        data={"type": "duckdb", "name": "My Sales"},
+        files={"file": ("sales.csv", BytesIO(csv_data), "text/csv")},
+    )
+
+    assert response.status_code == 200
+
+    data = response.json()["data"]
+    assert data["dsn"].startswith("duckdb:///")
+    assert data["dialect"] == "duckdb"
+    assert data["is_sample"] is False
+
+    engine = create_engine(data["dsn"])
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT name, SUM(amount) FROM my_sales GROUP BY name ORDER BY name")).fetchall()
+        assert [tuple(row) for row in rows] == [("bar", 2), ("foo", 4)]
+    engine.dispose()
+
+    # Delete database after tests
+    file_path = data["dsn"].replace("duckdb:///", "")
+    pathlib.Path(file_path).unlink(missing_ok=True)
+
+
+@pytest.mark.asyncio
+async def test_refresh_connection_profiles(client: TestClient) -> None:
+    connection_in = {"dsn": get_sqlite_dsn(config.sample_titanic_path), "name": "Titanic"}
+    response = client.post("/connect", json=connection_in)
+    connection_id = response.json()["data"]["id"]
+
+    response = client.get(f"/connection/{connection_id}/profiles")
+    assert response.status_code == 200
+    assert response.json()["data"] == []
+
+    response = client.post(f"/connection/{connection_id}/profiles")
+    assert response.status_code == 200
+
+    profiles = response.json()["data"]
+    assert [profile["table_name"] for profile in profiles] == ["passenger"]
+    assert profiles[0]["row_count"] == 1309
+    columns = {column["name"]: column for column in profiles[0]["columns"]}
+    assert columns["sex"]["distinct_count"] == 2
+    assert {value["value"] for value in columns["sex"]["top_values"]} == {"male", "female"}
+
+    response = client.get(f"/connection/{connection_id}/profiles")
+    assert response.json()["data"] == profiles
+
+    client.delete(f"/connection/{connection_id}")
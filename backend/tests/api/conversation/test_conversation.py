@@ -1,8 +1,29 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from uuid import UUID, uuid4
+
 import pytest
 from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from pydantic import SecretStr
 
 from dataline.models.connection.schema import Connection
 from dataline.models.conversation.schema import ConversationOut
+from dataline.models.message.schema import BaseMessageType, MessageCreate
+from dataline.repositories.base import AsyncSession
+from dataline.repositories.conversation import ConversationRepository
+from dataline.repositories.message import MessageRepository
+from dataline.repositories.query_cache import QueryCacheRepository
+from dataline.services.conversation import ConversationService
+from dataline.services.llm_flow.graph import QueryGraphService
+from dataline.services.llm_flow.llm_calls.conversation_summarizer import (
+    SummarizeConversationCall,
+)
+from dataline.services.llm_flow.usage import TokenUsage, attach_usage
+from dataline.services.query_cache import QueryCacheService
+from dataline.services.settings import SettingsService
 
 
 @pytest.mark.asyncio
@@ -68,6 +89,216 @@ async def test_get_conversation_with_messages_with_results(
     client.get(f"/conversation/{sample_conversation.id}/messages")
 
 
+@pytest.mark.asyncio
+async def test_conversation_summary_replaces_older_messages(
+    session: AsyncSession, sample_conversation: ConversationOut
+) -> None:
+    start = datetime.now()
+    for i in range(6):
+        await MessageRepository().create(
+            session,
+            MessageCreate(
+                content=f"question {i}",
+                role=BaseMessageType.HUMAN.value,
+                conversation_id=sample_conversation.id,
+                created_at=start + timedelta(seconds=i),
+            ),
+        )
+    conversation_service = ConversationService(ConversationRepository(), MessageRepository())
+
+    with patch.object(
+        SummarizeConversationCall,
+        "call_async",
+        AsyncMock(
+            return_value=SimpleNamespace(
+                content=" The user asked 0-1. ",
+                response=SimpleNamespace(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10)),
+            )
+        ),
+    ) as summarize:
+        usage = await conversation_service.update_conversation_summary(
+            session, sample_conversation.id, api_key="sk-test"
+        )
+        # Only messages older than the ones replayed verbatim are summarized
+        assert (
+            await conversation_service.update_conversation_summary(session, sample_conversation.id, api_key="sk-test")
+            is None
+        )
+    summarize.assert_awaited_once()
+    assert usage == TokenUsage.for_model("gpt-3.5-turbo", 100, 10)
+
+    history = await conversation_service.get_conversation_history(session, sample_conversation.id)
+    assert isinstance(history[0], SystemMessage)
+    assert history[0].content.endswith("The user asked 0-1.")
+    assert history[1:] == [HumanMessage(content=f"question {i}") for i in range(2, 6)]
+
+
+@pytest.mark.asyncio
+async def test_query_answered_from_cache(
+    client: TestClient, session: AsyncSession, sample_conversation: ConversationOut, dvdrental_connection: Connection
+) -> None:
+    await QueryCacheService(QueryCacheRepository()).store(
+        session,
+        dvdrental_connection.id,
+        dvdrental_connection.dsn,
+        "What is one plus one?",
+        "SELECT 1 + 1",
+    )
+    model_details = SimpleNamespace(
+        openai_api_key=SecretStr("sk-test"), langsmith_api_key=None, preferred_openai_model="gpt-3.5-turbo"
+    )
+
+    with (
+        patch.object(SettingsService, "get_model_details", AsyncMock(return_value=model_details)),
+        patch.object(QueryGraphService, "query", side_effect=AssertionError("LLM should not be called")),
+    ):
+        response = client.post(
+            f"/conversation/{sample_conversation.id}/query",
+            params={"query": "what is one plus one"},
+            json={"message_options": {"secure_data": False}},
+        )
+    assert response.status_code == 200
+
+    events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+    results = events[-1]["ai_message"]["results"]
+    assert [result["type"] for result in results] == ["SQL_QUERY_STRING_RESULT", "SQL_QUERY_RUN_RESULT"]
+    assert results[0]["content"]["sql"] == "SELECT 1 + 1"
+    assert results[1]["content"]["rows"] == [[2]]
+
+    entries = client.get(f"/connection/{dvdrental_connection.id}/query-cache").json()["data"]
+    assert [entry["hits"] for entry in entries] == [1]
+    assert client.delete(f"/connection/{dvdrental_connection.id}/query-cache").status_code == 200
+    assert client.get(f"/connection/{dvdrental_connection.id}/query-cache").json()["data"] == []
+
+
+@pytest.mark.asyncio
+async def test_query_stores_token_usage(
+    client: TestClient, sample_conversation: ConversationOut, dvdrental_connection: Connection
+) -> None:
+    model_details = SimpleNamespace(
+        openai_api_key=SecretStr("sk-test"), langsmith_api_key=None, preferred_openai_model="gpt-4o"
+    )
+
+    async def answer(*args, **kwargs):  # type: ignore[no-untyped-def]
+        tool_call = AIMessage(content="", tool_calls=[{"name": "list_sql_tables", "args": {}, "id": "call"}])
+        attach_usage(tool_call, TokenUsage.for_model("gpt-4o", 1000, 20))
+        final_answer = AIMessage(content="There are no tables.")
+        attach_usage(final_answer, TokenUsage.for_model("gpt-4o", 1200, 10))
+        yield [tool_call], None
+        yield [final_answer], None
+
+    with (
+        patch.object(SettingsService, "get_model_details", AsyncMock(return_value=model_details)),
+        patch.object(QueryGraphService, "query", answer),
+    ):
+        response = client.post(
+            f"/conversation/{sample_conversation.id}/query",
+            params={"query": "which tables are there?", "use_cache": False},
+            json={"message_options": {"secure_data": True}},
+        )
+    assert response.status_code == 200
+
+    events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+    message = events[-1]["ai_message"]["message"]
+    assert (message["prompt_tokens"], message["completion_tokens"]) == (2200, 30)
+    assert message["cost_usd"] == pytest.approx((2200 * 2.5 + 30 * 10.0) / 1_000_000)
+    assert events[-1]["human_message"]["prompt_tokens"] is None
+
+    usage = client.get("/usage", params={"connection_id": str(dvdrental_connection.id)}).json()["data"]
+    assert len(usage) == 1
+    assert usage[0]["messages"] == 1
+    assert (usage[0]["prompt_tokens"], usage[0]["completion_tokens"]) == (2200, 30)
+    assert client.get("/usage", params={"start": "2000-01-01", "end": "2000-01-02"}).json()["data"] == []
+
+
+@pytest.mark.asyncio
+async def test_query_summary_is_updated_after_commit(
+    client: TestClient, session: AsyncSession, sample_conversation: ConversationOut
+) -> None:
+    model_details = SimpleNamespace(
+        openai_api_key=SecretStr("sk-test"), langsmith_api_key=None, preferred_openai_model="gpt-4o"
+    )
+
+    async def answer(*args, **kwargs):  # type: ignore[no-untyped-def]
+        yield [AIMessage(content="There are no tables.")], None
+
+    with (
+        patch.object(SettingsService, "get_model_details", AsyncMock(return_value=model_details)),
+        patch.object(QueryGraphService, "query", answer),
+        patch.object(SummarizeConversationCall, "call_async", side_effect=AssertionError("Summarized in the request")),
+        patch.object(ConversationService, "schedule_summary_update") as schedule_summary_update,
+    ):
+        response = client.post(
+            f"/conversation/{sample_conversation.id}/query",
+            params={"query": "which tables are there?", "use_cache": False},
+            json={"message_options": {"secure_data": True}},
+        )
+        assert response.status_code == 200
+        # The stream is over before the summary is scheduled, once the messages are committed
+        schedule_summary_update.assert_not_called()
+        await session.commit()
+
+    events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+    message_id = events[-1]["ai_message"]["message"]["id"]
+    schedule_summary_update.assert_called_once_with(sample_conversation.id, UUID(message_id), "sk-test")
+
+
+@pytest.mark.asyncio
+async def test_conversation_with_connection_is_cached(
+    client: TestClient, session: AsyncSession, sample_conversation: ConversationOut, dvdrental_connection: Connection
+) -> None:
+    conversation_service = ConversationService(ConversationRepository(), MessageRepository())
+    with patch.object(
+        ConversationRepository, "get_with_connection", wraps=conversation_service.conversation_repo.get_with_connection
+    ) as get_with_connection:
+        conversation, connection = await conversation_service.get_conversation_with_connection(
+            session, sample_conversation.id
+        )
+        assert conversation.name == sample_conversation.name
+        assert connection.id == dvdrental_connection.id
+
+        # Updates are written through to the cache once committed
+        client.patch(f"/conversation/{sample_conversation.id}", json={"name": "Renamed"})
+        client.patch(f"/connection/{dvdrental_connection.id}", json={"name": "Renamed connection"})
+        await session.commit()
+        conversation, connection = await conversation_service.get_conversation_with_connection(
+            session, sample_conversation.id
+        )
+    get_with_connection.assert_awaited_once()
+    assert conversation.name == "Renamed"
+    assert connection.name == "Renamed connection"
+
+
+@pytest.mark.asyncio
+async def test_run_sql_content_negotiation(client: TestClient, sample_conversation: ConversationOut) -> None:
+    params = {"sql": "SELECT 1 AS id, 'Bob' AS name UNION ALL SELECT 2, NULL", "linked_id": str(uuid4())}
+    url = f"/conversation/{sample_conversation.id}/run-sql"
+
+    response = client.get(url, params=params)
+    assert response.status_code == 200
+    content = response.json()["data"]["content"]
+    assert (content["columns"], content["rows"]) == (["id", "name"], [[1, "Bob"], [2, None]])
+
+    pa = pytest.importorskip("pyarrow")
+    response = client.get(url, params=params, headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pydict() == {"id": [1, 2], "name": ["Bob", None]}
+    metadata = json.loads(table.schema.metadata[b"dataline_result"])
+    assert metadata["type"] == "SQL_QUERY_RUN_RESULT"
+    assert metadata["linked_id"] == params["linked_id"]
+    assert metadata["content"]["truncated"] is False
+
+
+@pytest.mark.asyncio
+async def test_run_sql_read_only(client: TestClient, sample_conversation: ConversationOut) -> None:
+    params = {"sql": "DELETE FROM rental", "linked_id": str(uuid4())}
+    response = client.get(f"/conversation/{sample_conversation.id}/run-sql", params=params)
+    assert response.status_code == 400
+    assert "read only" in response.json()["message"]
+
+
 # TODO:
 @pytest.mark.skip
 @pytest.mark.asyncio
@@ -0,0 +1,328 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from dataline.config import config
+from dataline.models.conversation.schema import render_stored_results
+from dataline.models.llm_flow.enums import QueryResultType
+from dataline.models.llm_flow.schema import (
+    ChartGenerationResultContent,
+    QueryRunData,
+    SQLQueryRunResultContent,
+    SQLQueryStringResultContent,
+)
+from dataline.models.message.schema import BaseMessageType, MessageCreate
+from dataline.models.result.model import ResultModel
+from dataline.models.result.schema import ExportFormat, ResultCreate
+from dataline.repositories.base import AsyncSession
+from dataline.repositories.message import MessageRepository
+from dataline.repositories.result import ResultRepository
+from dataline.services import result as result_service_module
+from dataline.services.export import _arrow_chunks
+from dataline.services.llm_flow.llm_calls.chart_generator import ChartType, build_chart_json
+from dataline.services.result import ResultService
+from dataline.utils.utils import get_sqlite_dsn
+
+
+async def create_sql_query_result(client: TestClient, session: AsyncSession, sql: str) -> ResultModel:
+    response = client.post("/connect", json={"dsn": get_sqlite_dsn(config.sample_titanic_path), "name": "Titanic"})
+    connection_id = response.json()["data"]["id"]
+    response = client.post("/conversation", json={"connection_id": connection_id, "name": "Dashboard"})
+    conversation_id = response.json()["data"]["id"]
+
+    message = await MessageRepository().create(
+        session,
+        MessageCreate(content="Passengers per class", role=BaseMessageType.AI.value, conversation_id=conversation_id),
+    )
+    result = await ResultRepository().create(
+        session,
+        ResultCreate(
+            content=SQLQueryStringResultContent(sql=sql).model_dump_json(),
+            type=QueryResultType.SQL_QUERY_STRING_RESULT.value,
+            message_id=message.id,
+        ),
+    )
+    return result
+
+
+@pytest.mark.asyncio
+async def test_set_result_schedule(client: TestClient, session: AsyncSession) -> None:
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT pclass, COUNT(*) FROM passenger GROUP BY pclass"
+    )
+    result_id = sql_string_result.id
+
+    response = client.put(f"/result/{result_id}/schedule", json={"interval_seconds": 1})
+    assert response.status_code == 400
+
+    response = client.put(f"/result/{result_id}/schedule", json={"interval_seconds": 3600})
+    assert response.status_code == 200
+    schedule = response.json()["data"]
+    assert schedule["result_id"] == str(result_id)
+    assert schedule["interval_seconds"] == 3600
+
+    # Updating keeps a single schedule per result
+    response = client.put(f"/result/{result_id}/schedule", json={"interval_seconds": 600})
+    response = client.get("/schedules")
+    assert [schedule["interval_seconds"] for schedule in response.json()["data"]] == [600]
+
+    response = client.delete(f"/result/{result_id}/schedule")
+    assert response.status_code == 200
+    assert client.get("/schedules").json()["data"] == []
+
+
+@pytest.mark.asyncio
+async def test_refresh_sql_query_result_data(client: TestClient, session: AsyncSession) -> None:
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT pclass, COUNT(*) FROM passenger GROUP BY pclass"
+    )
+    result_id = sql_string_result.id
+    result_service = ResultService(ResultRepository())
+
+    await result_service.refresh_sql_query_result_data(session, result_id)
+    # Refreshing again overwrites the snapshot instead of adding one
+    await result_service.refresh_sql_query_result_data(session, result_id)
+
+    run_result = await result_service.result_repo.get_run_result_from_sql_query(session, result_id)
+    assert run_result is not None
+    content = SQLQueryRunResultContent.model_validate_json(run_result.content)
+    assert content.data.rows == [[1, 323], [2, 277], [3, 709]]
+
+
+@pytest.mark.asyncio
+async def test_refresh_sql_query_result_data_of_chart(client: TestClient, session: AsyncSession) -> None:
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT sex, COUNT(*) FROM passenger GROUP BY sex ORDER BY sex"
+    )
+    chart = await ResultRepository().create(
+        session,
+        ResultCreate(
+            content=ChartGenerationResultContent(
+                chartjs_json=build_chart_json(ChartType.bar, title="Passengers per sex"), chart_type="bar"
+            ).model_dump_json(),
+            type=QueryResultType.CHART_GENERATION_RESULT.value,
+            message_id=sql_string_result.message_id,
+            linked_id=sql_string_result.id,
+        ),
+    )
+    result_service = ResultService(ResultRepository())
+    await result_service.refresh_chart_result_data(session, chart.id)
+
+    # A scheduled refresh of the SQL keeps the run result linked to the chart
+    await result_service.refresh_sql_query_result_data(session, sql_string_result.id)
+
+    run_result = await result_service.result_repo.get_run_result_from_sql_query(session, sql_string_result.id)
+    assert run_result is not None
+    rendered_chart, _ = render_stored_results([chart, run_result])
+    chartjs = json.loads(rendered_chart.content["chartjs_json"])
+    assert chartjs["data"]["labels"] == ["female", "male"]
+    assert chartjs["data"]["datasets"][0]["data"] == [466, 843]
+
+
+@pytest.mark.asyncio
+async def test_refresh_conversation_charts(client: TestClient, session: AsyncSession) -> None:
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT sex, COUNT(*) FROM passenger GROUP BY sex ORDER BY sex"
+    )
+    chart = await ResultRepository().create(
+        session,
+        ResultCreate(
+            content=ChartGenerationResultContent(
+                chartjs_json=build_chart_json(ChartType.bar, title="Passengers per sex"), chart_type="bar"
+            ).model_dump_json(),
+            type=QueryResultType.CHART_GENERATION_RESULT.value,
+            message_id=sql_string_result.message_id,
+            linked_id=sql_string_result.id,
+        ),
+    )
+    message = await MessageRepository().get_by_uuid(session, sql_string_result.message_id)
+
+    response = client.post(f"/conversation/{message.conversation_id}/refresh-charts")
+
+    assert response.status_code == 200
+    [refreshed] = response.json()["data"]
+    assert refreshed["result_id"] == str(chart.id)
+    assert refreshed["error"] is None
+    chartjs = json.loads(refreshed["chartjs_json"])
+    assert chartjs["data"]["labels"] == ["female", "male"]
+    assert chartjs["data"]["datasets"][0]["data"] == [466, 843]
+
+    # The data is stored next to the chart and updated in place on the next refresh
+    response = client.post(f"/conversation/{message.conversation_id}/refresh-charts")
+    assert response.json()["data"][0]["chartjs_json"] == refreshed["chartjs_json"]
+    run_results = await ResultRepository().list_charts_with_sql_by_conversation(session, message.conversation_id)
+    assert len(run_results) == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_conversation_charts_unreachable_database(
+    client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT sex, COUNT(*) FROM passenger GROUP BY sex ORDER BY sex"
+    )
+    chart = await ResultRepository().create(
+        session,
+        ResultCreate(
+            content=ChartGenerationResultContent(
+                chartjs_json=build_chart_json(ChartType.bar, title="Passengers per sex"), chart_type="bar"
+            ).model_dump_json(),
+            type=QueryResultType.CHART_GENERATION_RESULT.value,
+            message_id=sql_string_result.message_id,
+            linked_id=sql_string_result.id,
+        ),
+    )
+    message = await MessageRepository().get_by_uuid(session, sql_string_result.message_id)
+
+    def connect_database(dsn: str, statement_timeout_seconds: int | None = None) -> None:
+        raise OperationalError("connect", {}, ConnectionRefusedError("Connection refused"))
+
+    monkeypatch.setattr(result_service_module, "connect_database", connect_database)
+    response = client.post(f"/conversation/{message.conversation_id}/refresh-charts")
+
+    assert response.status_code == 200
+    [refreshed] = response.json()["data"]
+    assert refreshed["result_id"] == str(chart.id)
+    assert refreshed["error"].startswith("Could not connect to the database")
+
+
+@pytest.mark.asyncio
+async def test_export_result_csv(client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    sql_string_result = await create_sql_query_result(client, session, "SELECT pclass FROM passenger ORDER BY pclass")
+    # Several chunks, and more rows than the row limit of queries
+    monkeypatch.setattr(config, "export_chunk_rows", 100)
+    monkeypatch.setattr(config, "query_max_rows", 10)
+
+    response = client.get(f"/result/{sql_string_result.id}/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == f'attachment; filename="result-{sql_string_result.id}.csv"'
+    lines = response.text.splitlines()
+    assert lines[:2] == ["pclass", "1"]
+    assert len(lines) == 1 + 1309
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+async def test_export_result_arrow(
+    client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch, export_format: str
+) -> None:
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    sql_string_result = await create_sql_query_result(
+        client, session, "SELECT pclass, COUNT(*) AS passengers FROM passenger GROUP BY pclass"
+    )
+    monkeypatch.setattr(config, "export_chunk_rows", 2)
+
+    response = client.get(f"/result/{sql_string_result.id}/export", params={"format": export_format})
+    assert response.status_code == 200
+    if export_format == "parquet":
+        table = pq.read_table(pa.BufferReader(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pydict() == {"pclass": [1, 2, 3], "passengers": [323, 277, 709]}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+async def test_export_result_arrow_types_change_between_chunks(
+    client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch, export_format: str
+) -> None:
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    # First chunk: only NULLs in late_int and integers in mixed, second chunk: an integer and text
+    sql_string_result = await create_sql_query_result(
+        client,
+        session,
+        "SELECT CASE WHEN pclass < 3 THEN NULL ELSE pclass END AS late_int,"
+        " CASE WHEN pclass = 3 THEN 'third' ELSE pclass END AS mixed"
+        " FROM passenger GROUP BY pclass ORDER BY pclass",
+    )
+    monkeypatch.setattr(config, "export_chunk_rows", 2)
+
+    response = client.get(f"/result/{sql_string_result.id}/export", params={"format": export_format})
+    assert response.status_code == 200
+    if export_format == "parquet":
+        table = pq.read_table(pa.BufferReader(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pydict() == {"late_int": [None, None, 3], "mixed": ["1", "2", "third"]}
+
+
+@pytest.mark.parametrize("export_format", [ExportFormat.parquet, ExportFormat.arrow])
+def test_arrow_chunks_are_converted_to_the_first_schema(export_format: ExportFormat) -> None:
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    # Without the schema of the whole result, as on typed databases
+    partitions = iter([[(None, 1), (None, "a")], [(3, 2), (4, "b")]])
+    content = b"".join(_arrow_chunks(["late_int", "mixed"], partitions, export_format))
+
+    if export_format == ExportFormat.parquet:
+        table = pq.read_table(pa.BufferReader(content))
+    else:
+        table = pa.ipc.open_stream(content).read_all()
+    assert table.to_pydict() == {"late_int": [None, None, "3", "4"], "mixed": ["1", "a", "2", "b"]}
+
+
+@pytest.mark.asyncio
+async def test_export_result_read_only(client: TestClient, session: AsyncSession) -> None:
+    sql_string_result = await create_sql_query_result(client, session, "DELETE FROM passenger")
+    response = client.get(f"/result/{sql_string_result.id}/export")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_result_read_only_disabled(
+    client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config, "read_only_queries", False)
+    # Not a SELECT, runs in the UI when read only queries are disabled
+    sql_string_result = await create_sql_query_result(client, session, "PRAGMA table_info(passenger)")
+    response = client.get(f"/result/{sql_string_result.id}/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0].startswith("cid,name,type")
+
+
+@pytest.mark.asyncio
+async def test_large_result_content_is_stored_compressed(
+    client: TestClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(config, "data_directory", str(tmp_path))
+    monkeypatch.setattr(config, "storage_compression_min_bytes", 100)
+    monkeypatch.setattr(config, "storage_blob_min_bytes", 1000)
+    sql_string_result = await create_sql_query_result(client, session, "SELECT name FROM passenger")
+    result_repo = ResultRepository()
+
+    contents = {}
+    for rows in (10, 10_000):
+        content = SQLQueryRunResultContent(
+            data=QueryRunData(columns=["name"], rows=[[f"passenger {i}"] for i in range(rows)]),
+            is_secure=False,
+            for_chart=False,
+        ).model_dump_json()
+        result = await result_repo.create(
+            session,
+            ResultCreate(
+                content=content,
+                type=QueryResultType.SQL_QUERY_RUN_RESULT.value,
+                message_id=sql_string_result.message_id,
+                linked_id=sql_string_result.id,
+            ),
+        )
+        contents[result.id] = content
+
+    raw_contents = dict((await session.execute(text("SELECT id, content FROM results"))).all())
+    stored = [value for value in raw_contents.values() if not isinstance(value, str) or value.startswith("blob:")]
+    assert len(stored) == 2
+    assert len(await result_repo.list_blob_references(session)) == 1
+
+    session.expire_all()
+    for result_id, content in contents.items():
+        assert (await result_repo.get_by_uuid(session, result_id)).content == content
@@ -1,16 +1,35 @@
 import logging
 from base64 import b64encode
 from io import BytesIO
+from typing import AsyncGenerator, Generator
 from unittest.mock import MagicMock, patch
 
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
-from openai.resources.models import Models as OpenAIModels
+from openai.resources.models import AsyncModels as OpenAIModels
+
+from dataline.services import settings
 
 logger = logging.getLogger(__name__)
 
 
+def set_available_models(mock_openai_model_list: MagicMock, *model_ids: str) -> None:
+    async def list_models() -> AsyncGenerator[MagicMock, None]:
+        for model_id in model_ids:
+            model = MagicMock()
+            model.id = model_id
+            yield model
+
+    mock_openai_model_list.side_effect = lambda **kwargs: list_models()
+
+
+@pytest.fixture(autouse=True)
+def clear_openai_models_cache() -> Generator[None, None, None]:
+    yield
+    settings._openai_models.clear()
+
+
 @pytest.mark.asyncio
 async def test_update_user_info_name(client: TestClient) -> None:
     user_in = {"name": "John"}
@@ -61,9 +80,7 @@ async def test_update_user_info_invalid_openai_key(client: TestClient) -> None:
 @pytest.mark.skip(reason="OpenAI key is now as SecretStr, check the db for a change instead of using the client")
 @patch.object(OpenAIModels, "list")
 async def test_update_user_info_valid_openai_key(mock_openai_model_list: MagicMock, client: TestClient) -> None:
-    mock_model = MagicMock()
-    mock_model.id = "gpt-3.5-turbo"
-    mock_openai_model_list.return_value = [mock_model]
+    set_available_models(mock_openai_model_list, "gpt-3.5-turbo")
     openai_key = "sk-Mioanowida"
     user_in = {"openai_api_key": openai_key}
     response = client.patch("/settings/info", json=user_in)
@@ -75,9 +92,7 @@ async def test_update_user_info_valid_openai_key(mock_openai_model_list: MagicMo
 @pytest.mark.asyncio
 @patch.object(OpenAIModels, "list")
 async def test_update_user_info_extra_fields_ignored(mock_openai_model_list: MagicMock, client: TestClient) -> None:
-    mock_model = MagicMock()
-    mock_model.id = "gpt-3.5-turbo"
-    mock_openai_model_list.return_value = [mock_model]
+    set_available_models(mock_openai_model_list, "gpt-3.5-turbo")
     user_in = {"name": "John", "openai_api_key": "sk-1234", "extra": "extra"}
     response = client.patch("/settings/info", json=user_in)
     assert response.status_code == 200
@@ -88,9 +103,7 @@ async def test_update_user_info_extra_fields_ignored(mock_openai_model_list: Mag
 @pytest_asyncio.fixture
 @patch.object(OpenAIModels, "list")
 async def user_info(mock_openai_model_list: MagicMock, client: TestClient) -> dict[str, str]:
-    mock_model = MagicMock()
-    mock_model.id = "gpt-3.5-turbo"
-    mock_openai_model_list.return_value = [mock_model]
+    set_available_models(mock_openai_model_list, "gpt-3.5-turbo")
     user_in = {
         "name": "John",
         "openai_api_key": "sk-asoiasdfl",
@@ -100,6 +113,29 @@ async def user_info(mock_openai_model_list: MagicMock, client: TestClient) -> di
 
 
 @pytest.mark.asyncio
+@patch.object(OpenAIModels, "list")
+async def test_get_models(mock_openai_model_list: MagicMock, client: TestClient) -> None:
+    set_available_models(mock_openai_model_list, "gpt-4o", "gpt-3.5-turbo")
+    client.patch("/settings/info", json={"name": "John", "openai_api_key": "sk-models"})
+
+    response = client.get("/settings/models")
+    assert response.status_code == 200
+    assert response.json()["data"] == ["gpt-3.5-turbo", "gpt-4o"]
+    # Validating the key and listing the models share one call to OpenAI
+    mock_openai_model_list.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch.object(OpenAIModels, "list")
+async def test_update_user_info_unavailable_model(mock_openai_model_list: MagicMock, client: TestClient) -> None:
+    set_available_models(mock_openai_model_list, "gpt-3.5-turbo")
+    response = client.patch("/settings/info", json={"openai_api_key": "sk-1234"})
+    assert response.status_code == 200
+
+    with pytest.raises(Exception, match="model gpt-4o not accessible"):
+        client.patch("/settings/info", json={"preferred_openai_model": "gpt-4o"}) @ pytest.mark.asyncio
+
+
 @pytest.mark.skip(reason="OpenAI key is now as SecretStr, check the db for a change instead of using the client")
 async def test_get_info(client: TestClient, user_info: dict[str, str]) -> None:
     # Send a GET request to the /settings/info endpoint
@@ -14,6 +14,7 @@ from alembic.config import Config
 from dataline.app import App
 from dataline.models.base import DBModel
 from dataline.repositories.base import AsyncSession, get_session
+from dataline.services import cache
 
 logging.basicConfig(level=logging.INFO)
 
@@ -37,9 +38,15 @@ async def engine() -> AsyncGenerator[AsyncEngine, None]:
 @pytest_asyncio.fixture(scope="function")
 async def session(engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch) -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSession(engine) as session, session.begin():
+
+        async def flush_as_commit() -> None:
+            await session.flush()
+            # Run the after commit hooks, ex. cache updates, as if the transaction was committed
+            session.sync_session.dispatch.after_commit(session.sync_session)
+
         # prevent test from committing anything, only flush
         # only useful in case we move to real DBs not in-mem
-        monkeypatch.setattr(session, "commit", mock.AsyncMock(wraps=session.flush))
+        monkeypatch.setattr(session, "commit", mock.AsyncMock(wraps=flush_as_commit))
         yield session
         await session.rollback()
 
@@ -51,6 +58,13 @@ def apply_migrations() -> None:
     upgrade(config, "head")
 
 
+@pytest.fixture(autouse=True)
+def clear_cache() -> Generator[None, None, None]:
+    # Sessions are rolled back after each test, cached rows must not leak into the next one
+    yield
+    cache.clear()
+
+
 app = App()
 
 
@@ -0,0 +1,66 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from dataline.models.connection.schema import ConnectionOut
+from dataline.repositories.base import AsyncSession
+from dataline.services import cache
+
+
+def make_connection() -> ConnectionOut:
+    return ConnectionOut(
+        id=uuid4(), name="Test", dsn="sqlite:///test.db", database="test.db", dialect="sqlite", is_sample=False
+    )
+
+
+@pytest.mark.asyncio
+async def test_cache_is_updated_after_commit(engine: AsyncEngine) -> None:
+    connection = make_connection()
+    async with AsyncSession(engine) as session:
+        cache.set_connection(session, connection)
+        assert cache.get_connection(connection.id) is None
+
+        await session.commit()
+    assert cache.get_connection(connection.id) == connection
+
+
+@pytest.mark.asyncio
+async def test_cache_is_not_updated_after_rollback(engine: AsyncEngine) -> None:
+    connection = make_connection()
+    async with AsyncSession(engine) as session:
+        await session.execute(text("SELECT 1"))
+        cache.set_connection(session, connection)
+        await session.rollback()
+
+        # Pending updates of the rolled back transaction are not applied by the next commit
+        await session.commit()
+    assert cache.get_connection(connection.id) is None
+
+    # Closed without committing
+    async with AsyncSession(engine) as session:
+        await session.execute(text("SELECT 1"))
+        cache.set_connection(session, connection)
+    assert cache.get_connection(connection.id) is None
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidation_is_applied_again_after_commit(engine: AsyncEngine) -> None:
+    connection = make_connection()
+    async with AsyncSession(engine) as session:
+        cache.set_connection(session, connection)
+        await session.commit()
+
+    async with AsyncSession(engine) as session:
+        cache.invalidate_connection(session, connection.id)
+        assert cache.get_connection(connection.id) is None
+
+        # Another request caches the row before the deletion is committed
+        async with AsyncSession(engine) as other_session:
+            cache.set_connection(other_session, connection)
+            await other_session.commit()
+        assert cache.get_connection(connection.id) == connection
+
+        await session.commit()
+    assert cache.get_connection(connection.id) is None
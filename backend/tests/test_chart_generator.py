@@ -0,0 +1,185 @@
+import json
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from dataline.config import config
+from dataline.models.conversation.schema import render_stored_results
+from dataline.models.llm_flow.enums import QueryResultType
+from dataline.models.llm_flow.schema import (
+    ChartGenerationResult,
+    ChartGenerationResultContent,
+    QueryOptions,
+    QueryRunData,
+    SQLQueryRunResult,
+    SQLQueryRunResultContent,
+)
+from dataline.models.result.model import ResultModel
+from dataline.services.llm_flow import toolkit
+from dataline.services.llm_flow.llm_calls.chart_generator import (
+    ChartType,
+    GeneratedChart,
+    build_chart_json,
+    chart_title_from_request,
+)
+from dataline.services.llm_flow.toolkit import (
+    ChartGeneratorTool,
+    QueryGraphState,
+    query_run_result_to_chart_json,
+)
+from dataline.utils.charts import render_chart_json
+from dataline.utils.downsampling import lttb_indices, top_n_with_other
+
+
+def test_chart_title_from_request() -> None:
+    assert chart_title_from_request("  total sales   per region.") == "Total sales per region"
+    assert len(chart_title_from_request("word " * 50)) <= 80
+
+
+def test_build_chart_json() -> None:
+    chart_json = build_chart_json(ChartType.bar, title="Sales per region", x_label="region", y_label="total")
+    data = QueryRunData(columns=["region", "total"], rows=[["north", 10], ["south", 20]])
+
+    chart = json.loads(query_run_result_to_chart_json(chart_json, ChartType.bar, data))
+
+    assert chart["type"] == "bar"
+    assert chart["data"]["labels"] == ["north", "south"]
+    assert chart["data"]["datasets"][0]["data"] == [10, 20]
+    assert chart["options"]["plugins"]["title"]["text"] == "Sales per region"
+    assert chart["options"]["scales"]["x"]["title"]["text"] == "region"
+
+    doughnut = json.loads(build_chart_json(ChartType.doughnut, title="Share"))
+    assert doughnut["options"]["plugins"]["legend"]["display"] is True
+    assert "scales" not in doughnut["options"]
+
+
+@pytest.mark.parametrize("chart_type", list(ChartType))
+def test_build_chart_json_every_chart_type(chart_type: ChartType) -> None:
+    chart = json.loads(build_chart_json(chart_type, title="Sales"))
+    assert chart["type"] == chart_type.value
+    assert chart["data"]["datasets"][0]["data"] == []
+
+
+def test_unsupported_chart_type() -> None:
+    with pytest.raises(ValueError):
+        build_chart_json("radar", title="Sales")  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        render_chart_json(build_chart_json(ChartType.bar, title="Sales"), "radar", [["north", 10]])
+
+
+def test_lttb_indices_keeps_extremes() -> None:
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 10  # Spike that must survive downsampling
+
+    indices = lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 9_999
+    assert 4321 in indices
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_top_n_with_other() -> None:
+    labels, values = top_n_with_other(["a", "b", "c", "d", "e"], [5, 1, 7, 2, 3], max_points=3)
+    assert labels == ["a", "c", "Other"]
+    assert values == [5, 7, 6.0]
+
+
+def test_line_chart_is_downsampled() -> None:
+    chart_json = build_chart_json(ChartType.line, title="Daily values")
+    data = QueryRunData(
+        columns=["day", "value"], rows=[[f"2024-01-01T00:{i // 60:02}:{i % 60:02}", i] for i in range(3000)]
+    )
+
+    chart = json.loads(query_run_result_to_chart_json(chart_json, ChartType.line, data))
+
+    assert len(chart["data"]["labels"]) == 1000
+    assert chart["options"]["plugins"]["subtitle"]["text"] == "Showing 1000 of 3000 points"
+
+
+def test_stored_chart_is_rendered_with_linked_data() -> None:
+    sql_string_result_id = uuid4()
+    template = build_chart_json(ChartType.bar, title="Sales per region")
+    data = QueryRunData(columns=["region", "total"], rows=[["north", 10], ["south", 20]])
+    chart = ResultModel(
+        id=uuid4(),
+        type=QueryResultType.CHART_GENERATION_RESULT.value,
+        content=ChartGenerationResultContent(chartjs_json=template, chart_type="bar").model_dump_json(),
+        linked_id=sql_string_result_id,
+    )
+    run = ResultModel(
+        id=uuid4(),
+        type=QueryResultType.SQL_QUERY_RUN_RESULT.value,
+        content=SQLQueryRunResultContent(data=data, is_secure=False, for_chart=True).model_dump_json(),
+        linked_id=sql_string_result_id,
+    )
+
+    rendered_chart, _ = render_stored_results([chart, run])
+
+    chartjs = json.loads(rendered_chart.content["chartjs_json"])
+    assert chartjs["data"]["labels"] == ["north", "south"]
+    assert chartjs["data"]["datasets"][0]["data"] == [10, 20]
+    assert "chartjs_template" not in rendered_chart.content
+
+
+def test_stored_chart_is_rendered_with_downsampled_data(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "query_max_rows", 2)
+    sql_string_result_id = uuid4()
+    template = build_chart_json(ChartType.line, title="Daily values")
+    # Stored as queried, already downsampled
+    data = QueryRunData(columns=["day", "value"], rows=[[1, 10], [50, 20], [100, 30]], total_points=100)
+    chart = ResultModel(
+        id=uuid4(),
+        type=QueryResultType.CHART_GENERATION_RESULT.value,
+        content=ChartGenerationResultContent(chartjs_json=template, chart_type="line").model_dump_json(),
+        linked_id=sql_string_result_id,
+    )
+    run = ResultModel(
+        id=uuid4(),
+        type=QueryResultType.SQL_QUERY_RUN_RESULT.value,
+        content=SQLQueryRunResultContent(data=data, is_secure=False, for_chart=True).model_dump_json(),
+        linked_id=sql_string_result_id,
+    )
+
+    rendered_chart, rendered_run = render_stored_results([chart, run])
+
+    chartjs = json.loads(rendered_chart.content["chartjs_json"])
+    assert chartjs["data"]["labels"] == [1, 50, 100]
+    assert chartjs["options"]["plugins"]["subtitle"]["text"] == "Showing 3 of 100 points"
+    # The chart data table is truncated like any other result
+    assert rendered_run.content["rows"] == [[1, 10], [50, 20]]
+    assert rendered_run.content["truncated"]
+
+
+def test_llm_generated_chart_is_populated(monkeypatch: pytest.MonkeyPatch) -> None:
+    generated = build_chart_json(ChartType.bar, title="Sales per region")
+
+    class FakeGenerateChartCall:
+        call_params = toolkit.GenerateChartCall.call_params
+
+        def __init__(self, **kwargs: str) -> None: ...
+
+        def extract(self) -> GeneratedChart:
+            return GeneratedChart(chartjs_json=generated)
+
+    monkeypatch.setattr(config, "llm_chart_generation", True)
+    monkeypatch.setattr(toolkit, "GenerateChartCall", FakeGenerateChartCall)
+    data_result = SQLQueryRunResult(
+        columns=["region", "total"], rows=[["north", 10], ["south", 20]], linked_id=uuid4(), for_chart=True
+    )
+    state = QueryGraphState.construct(
+        messages=[], results=[data_result], options=QueryOptions(openai_api_key="sk-test", model_name="gpt-4o")
+    )
+
+    update = ChartGeneratorTool().get_response(
+        state, {"chart_type": "bar", "request": "sales per region"}, call_id="call"
+    )
+
+    (result,) = update["results"]
+    assert isinstance(result, ChartGenerationResult)
+    chart = json.loads(result.chartjs_json)
+    assert chart["data"]["labels"] == ["north", "south"]
+    assert chart["data"]["datasets"][0]["data"] == [10, 20]
+    assert json.loads(str(result.chartjs_template))["data"]["labels"] == []
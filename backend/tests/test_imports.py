@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+# Loaded on demand: on upload, on the first query or when profiling
+LAZY_MODULES = [
+    "alembic",
+    "duckdb",
+    "langchain_community",
+    "langchain_openai",
+    "langgraph",
+    "mirascope",
+    "numpy",
+    "openai",
+    "pandas",
+    "pyreadstat",
+]
+
+
+def test_app_import_does_not_load_heavy_modules() -> None:
+    code = f"import sys, dataline.main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == ""
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pandas as pd
+
+from dataline.utils.ingestion import optimize_sqlite_table, select_index_columns
+
+
+def test_select_index_columns() -> None:
+    data_df = pd.DataFrame(
+        {
+            "customer_id": [1, 2, 3, 4],
+            "region": ["north", "south", "north", "south"],
+            "amount": [1.5, 2.5, 3.5, 4.5],
+            "constant": ["a", "a", "a", "a"],
+            "comment": ["x" * 100, "y" * 100, "z" * 100, "w" * 100],
+        }
+    )
+    assert select_index_columns(data_df, max_indexes=8) == ["customer_id", "region"]
+    assert select_index_columns(data_df, max_indexes=1) == ["customer_id"]
+
+
+def test_optimize_sqlite_table() -> None:
+    data_df = pd.DataFrame({"order_id": [1, 2, 3], "status": ["new", "new", "done"], "total": [1.0, 2.0, 3.0]})
+    conn = sqlite3.connect(":memory:")
+    data_df.to_sql("my orders", conn, index=False)
+    conn.commit()
+
+    report = optimize_sqlite_table(conn, "my orders", data_df, vacuum=True)
+
+    assert report.indexed_columns == ["order_id", "status"]
+    assert report.vacuum_seconds is not None
+    index_names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert len(index_names) == 2
+    assert {name.rsplit("_", 1)[0] for name in index_names} == {"ix_my_orders_order_id", "ix_my_orders_status"}
+    # ANALYZE populated planner statistics
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    conn.close()
+
+
+def test_optimize_sqlite_table_similar_names() -> None:
+    data_df = pd.DataFrame({"order_id": [1, 2, 3]})
+    conn = sqlite3.connect(":memory:")
+    for table_name in ("my orders", "my_orders"):
+        data_df.to_sql(table_name, conn, index=False)
+        conn.commit()
+        optimize_sqlite_table(conn, table_name, data_df)
+
+    # Both tables get their own index instead of the second one being skipped by IF NOT EXISTS
+    indexed_tables = {row[0] for row in conn.execute("SELECT tbl_name FROM sqlite_master WHERE type = 'index'")}
+    assert indexed_tables == {"my orders", "my_orders"}
+    conn.close()
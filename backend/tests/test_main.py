@@ -0,0 +1,40 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from dataline.config import config
+from dataline.main import (
+    get_alembic_ini_path,
+    get_database_revision,
+    get_head_revision,
+    run_migrations,
+)
+
+VERSIONS_PATH = get_alembic_ini_path().parent / "alembic" / "versions"
+
+
+def test_get_head_revision() -> None:
+    alembic_config = Config(get_alembic_ini_path())
+    alembic_config.set_main_option("script_location", str(VERSIONS_PATH.parent))
+    assert get_head_revision(VERSIONS_PATH) == ScriptDirectory.from_config(alembic_config).get_current_head()
+
+
+def test_run_migrations_skipped_when_up_to_date(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The test database is migrated to head for the session
+    assert get_database_revision("test.sqlite3") == get_head_revision(VERSIONS_PATH)
+    monkeypatch.setattr(config, "sqlite_path", "test.sqlite3")
+    with patch("alembic.command.upgrade") as upgrade:
+        run_migrations()
+    upgrade.assert_not_called()
+
+
+def test_run_migrations_new_database(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    sqlite_path = str(tmp_path / "db.sqlite3")
+    assert get_database_revision(sqlite_path) is None
+    monkeypatch.setattr(config, "sqlite_path", sqlite_path)
+    with patch("alembic.command.upgrade") as upgrade:
+        run_migrations()
+    upgrade.assert_called_once()
@@ -0,0 +1,37 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from dataline.utils.metrics import (
+    STAGE_DURATION,
+    STAGE_ERRORS,
+    render_metrics,
+    timed_stage,
+)
+
+
+def test_timed_stage() -> None:
+    STAGE_DURATION.clear()
+    STAGE_ERRORS.clear()
+
+    with timed_stage("test_stage"):
+        pass
+    with pytest.raises(ValueError), timed_stage("test_stage"):
+        raise ValueError()
+
+    metrics = render_metrics()
+    assert "# TYPE dataline_stage_duration_seconds histogram" in metrics
+    assert 'dataline_stage_duration_seconds_bucket{stage="test_stage",le="+Inf"} 2' in metrics
+    assert 'dataline_stage_duration_seconds_count{stage="test_stage"} 2' in metrics
+    assert 'dataline_stage_errors_total{stage="test_stage"} 1' in metrics
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: TestClient) -> None:
+    client.get("/settings/info")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'dataline_http_request_duration_seconds_count{method="GET",route="/settings/info",status="404"}' in (
+        response.text
+    )
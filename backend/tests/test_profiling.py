@@ -0,0 +1,49 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+from dataline.models.table_profile.schema import TableProfile
+from dataline.services import profiling
+from dataline.services.llm_flow.query_execution import connect_database
+from dataline.services.profiling import ProfilingService, count_rows
+from dataline.utils.utils import get_sqlite_dsn
+
+
+def test_count_rows_is_capped(tmp_path: Path) -> None:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO rentals (id) VALUES (?)", [(i,) for i in range(50)])
+    db = connect_database(get_sqlite_dsn(str(path)))
+    table = db._metadata.tables["rentals"]
+
+    with db._engine.connect() as conn:
+        assert count_rows(db, conn, table, 100) == 50
+        # SQLite has no row estimates, bigger tables are counted up to the cap
+        assert count_rows(db, conn, table, 20) == 20
+
+
+@pytest.mark.asyncio
+async def test_connection_without_tables_is_profiled_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    profiled_dsns = []
+
+    def profile_database(dsn: str, statement_timeout_seconds: int | None = None) -> list[TableProfile]:
+        profiled_dsns.append(dsn)
+        return []
+
+    async def store_table_profiles(*args: object) -> list[TableProfile]:
+        return []
+
+    monkeypatch.setattr(profiling, "profile_database", profile_database)
+    monkeypatch.setattr(ProfilingService, "store_table_profiles", store_table_profiles)
+    connection_id = uuid4()
+
+    profiling.schedule_connection_profiling(connection_id, "sqlite://")
+    await asyncio.gather(*profiling._background_tasks)
+    profiling.schedule_connection_profiling(connection_id, "sqlite://")
+
+    assert not profiling._background_tasks
+    assert profiled_dsns == ["sqlite://"]
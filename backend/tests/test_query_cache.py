@@ -0,0 +1,87 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from dataline.config import config
+from dataline.models.query_cache.model import QueryCacheModel
+from dataline.services import query_cache
+from dataline.services.llm_flow.query_execution import connect_database
+from dataline.services.query_cache import compute_schema_fingerprint, find_match, normalize_question
+from dataline.utils.utils import get_sqlite_dsn
+
+
+def test_normalize_question() -> None:
+    assert (
+        normalize_question("What are the TOP 10 customers, by revenue?") == "what are the top 10 customers by revenue"
+    )
+    assert normalize_question("Average fare above 7.25?") == "average fare above 7.25"
+
+
+def test_find_match() -> None:
+    entries = [
+        QueryCacheModel(normalized_question=normalize_question(question), sql=sql)
+        for question, sql in [
+            ("Top 10 customers by revenue", "SELECT 10"),
+            ("How many passengers survived?", "SELECT survived"),
+        ]
+    ]
+
+    assert find_match(normalize_question("top 10 customers by revenue!"), entries) is entries[0]
+    assert find_match(normalize_question("Top 10 customers by revenue?"), entries) is entries[0]
+    # Only exact matches by default
+    assert find_match(normalize_question("by revenue top 10 customers"), entries) is None
+    assert find_match(normalize_question("how many passengers have survived"), entries) is None
+
+
+def test_find_match_fuzzy(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "query_cache_fuzzy_matching", True)
+    monkeypatch.setattr(config, "query_cache_min_similarity", 90)
+    entries = [
+        QueryCacheModel(normalized_question=normalize_question(question), sql=sql)
+        for question, sql in [
+            ("Top 10 customers by revenue", "SELECT 10"),
+            ("What is the average fare of male passengers?", "SELECT male"),
+            ("List the customers in France who did place an order last year", "SELECT ordered"),
+        ]
+    ]
+
+    # Word order and stopwords do not matter
+    assert find_match(normalize_question("By revenue, top 10 customers"), entries) is entries[0]
+    assert find_match(normalize_question("What was the average fare of male passengers"), entries) is entries[1]
+    # Different numbers, words or negations need different SQL
+    assert find_match(normalize_question("Top 5 customers by revenue"), entries) is None
+    assert find_match(normalize_question("What is the average fare of female passengers?"), entries) is None
+    assert (
+        find_match(normalize_question("List the customers in France who did not place an order last year"), entries)
+        is None
+    )
+    assert (
+        find_match(normalize_question("List the customers in France who didn't place an order last year"), entries)
+        is None
+    )
+
+
+def test_compute_schema_fingerprint(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY)")
+    dsn = get_sqlite_dsn(str(path))
+
+    # Connected like every other query on the database: read only, with the statement timeout
+    databases: list[SQLDatabase] = []
+
+    def connect_database_spy(dsn: str, statement_timeout_seconds: int | None = None) -> SQLDatabase:
+        databases.append(connect_database(dsn, statement_timeout_seconds))
+        return databases[-1]
+
+    monkeypatch.setattr(query_cache, "connect_database", connect_database_spy)
+    fingerprint = compute_schema_fingerprint(dsn, statement_timeout_seconds=5)
+    assert len(databases) == 1
+    assert databases[0]._engine.pool.checkedout() == 0
+
+    assert compute_schema_fingerprint(dsn) == fingerprint
+    with sqlite3.connect(path) as connection:
+        connection.execute("ALTER TABLE rentals ADD COLUMN amount REAL")
+    assert compute_schema_fingerprint(dsn) != fingerprint
@@ -0,0 +1,240 @@
+import gc
+import sqlite3
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from weakref import ref
+
+import pytest
+from langchain_core.messages import ToolMessage
+from sqlalchemy import text
+from sqlalchemy.dialects import mssql, postgresql
+from sqlalchemy.exc import OperationalError
+
+from dataline.config import config
+from dataline.models.llm_flow.enums import ChartType
+from dataline.services.llm_flow import query_execution
+from dataline.services.llm_flow.query_classification import read_only_violation
+from dataline.services.llm_flow.query_execution import (
+    QueryCancelledRunException,
+    QueryTimeoutRunException,
+    ReadOnlyRunException,
+    cancel_running_statements,
+    connect_database,
+    convert_rows,
+    execute_sql_query,
+)
+from dataline.services.llm_flow.query_limit import limit_query
+from dataline.services.llm_flow.query_plan import estimate_query
+from dataline.services.llm_flow.toolkit import QuerySQLDataBaseTool
+from dataline.utils.utils import get_sqlite_dsn
+
+# Never ends on its own
+ENDLESS_QUERY = (
+    "WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers) SELECT COUNT(*) FROM numbers"
+)
+
+
+def test_sqlite_statement_timeout(tmp_path: Path) -> None:
+    db = connect_database(get_sqlite_dsn(str(tmp_path / "test.sqlite3")), statement_timeout_seconds=1)
+
+    start = time.monotonic()
+    with pytest.raises(QueryTimeoutRunException, match="1 seconds statement timeout"):
+        execute_sql_query(db, ENDLESS_QUERY)
+    assert time.monotonic() - start < 5
+
+    # The deadline is reset for every statement
+    assert execute_sql_query(db, "SELECT 1 + 1").rows == [(2,)]
+
+
+def test_cancel_running_statements(tmp_path: Path) -> None:
+    db = connect_database(get_sqlite_dsn(str(tmp_path / "test.sqlite3")), statement_timeout_seconds=0)
+    errors: list[Exception] = []
+
+    def run() -> None:
+        try:
+            execute_sql_query(db, ENDLESS_QUERY)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.2)
+    cancel_running_statements(db)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert [type(error) for error in errors] == [QueryCancelledRunException]
+
+
+def test_statement_guard_is_collected_with_its_engine(tmp_path: Path) -> None:
+    db = connect_database(get_sqlite_dsn(str(tmp_path / "test.sqlite3")), statement_timeout_seconds=1)
+    execute_sql_query(db, "SELECT 1")
+    engine = ref(db._engine)
+    guard = ref(query_execution._guards[db._engine])
+
+    db._engine.dispose()
+    del db
+    gc.collect()
+
+    assert engine() is None
+    assert guard() is None
+
+
+def test_query_plan_check_rejects_cross_join(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY, amount REAL)")
+        connection.executemany("INSERT INTO rentals (amount) VALUES (?)", [(i,) for i in range(2000)])
+    db = connect_database(get_sqlite_dsn(str(path)))
+    monkeypatch.setattr(config, "query_plan_max_rows", 1_000_000)
+
+    assert estimate_query(db, "SELECT COUNT(*) FROM rentals a, rentals AS b").rows == 2000 * 2000
+    assert estimate_query(db, "SELECT * FROM rentals WHERE id = 3").rows == 1
+
+    tool = QuerySQLDataBaseTool(db=db)
+    state = SimpleNamespace(results=[], options=SimpleNamespace(secure_data=True))
+    update = tool.get_response(state, {"query": "SELECT COUNT(*) FROM rentals a, rentals b", "for_chart": False}, "id")
+    [message] = update["messages"]
+    assert isinstance(message, ToolMessage)
+    assert "The query was not run because the database estimates it would process about 4,000,000 rows" in str(
+        message.content
+    )
+
+    update = tool.get_response(state, {"query": "SELECT COUNT(*) FROM rentals", "for_chart": False}, "id")
+    assert update["results"][-1].rows == [(2000,)]
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("SELECT * FROM rentals;", "SELECT * FROM rentals\nLIMIT 100"),
+        ("SELECT * FROM rentals LIMIT 5", "SELECT * FROM rentals LIMIT 5"),
+        ("SELECT * FROM rentals LIMIT 5000 OFFSET 20", "SELECT * FROM rentals LIMIT 100 OFFSET 20"),
+        ("SELECT (SELECT 1 LIMIT 1) -- LIMIT 1", "SELECT (SELECT 1 LIMIT 1) -- LIMIT 1\nLIMIT 100"),
+        ("SELECT 'LIMIT 1; LIMIT 2'", "SELECT 'LIMIT 1; LIMIT 2'\nLIMIT 100"),
+        (
+            "WITH a AS (SELECT 1) SELECT * FROM a ORDER BY 1",
+            "WITH a AS (SELECT 1) SELECT * FROM a ORDER BY 1\nLIMIT 100",
+        ),
+        (
+            "SELECT * FROM rentals ORDER BY id FETCH FIRST 5000 ROWS ONLY",
+            "SELECT * FROM rentals ORDER BY id FETCH FIRST 100 ROWS ONLY",
+        ),
+        ("SELECT * FROM rentals FETCH FIRST 5 ROWS ONLY", "SELECT * FROM rentals FETCH FIRST 5 ROWS ONLY"),
+        (
+            "SELECT * FROM rentals OFFSET 10 ROWS FETCH NEXT ROW ONLY",
+            "SELECT * FROM rentals OFFSET 10 ROWS FETCH NEXT ROW ONLY",
+        ),
+        ("DELETE FROM rentals", None),
+        ("SELECT 1; SELECT 2", None),
+    ],
+)
+def test_limit_query(query: str, expected: str | None) -> None:
+    assert limit_query(postgresql.dialect(), query, 100) == expected
+
+
+def test_limit_query_wraps_for_dialects_without_limit() -> None:
+    assert " ".join(limit_query(mssql.dialect(), "SELECT a FROM t", 100).split()) == (
+        "SELECT TOP 100 * FROM (SELECT a FROM t) AS limited"
+    )
+    # The order would be lost, the rows are only fetched up to the limit
+    assert limit_query(mssql.dialect(), "SELECT a FROM t ORDER BY a", 100) is None
+    assert limit_query(mssql.dialect(), "SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 500 ROWS ONLY", 100) == (
+        "SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 100 ROWS ONLY"
+    )
+
+
+def test_execute_sql_query_row_limit(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO rentals (id) VALUES (?)", [(i,) for i in range(1, 51)])
+    db = connect_database(get_sqlite_dsn(str(path)))
+    monkeypatch.setattr(config, "query_max_rows", 20)
+
+    result = execute_sql_query(db, "SELECT id FROM rentals ORDER BY id")
+    assert result.rows == [(i,) for i in range(1, 21)]
+    assert result.truncated
+
+    # Lower limits are honoured, higher ones capped
+    assert len(execute_sql_query(db, "SELECT id FROM rentals", limit=5).rows) == 5
+    assert len(execute_sql_query(db, "SELECT id FROM rentals", limit=500).rows) == 20
+
+    result = execute_sql_query(db, "SELECT id FROM rentals LIMIT 3")
+    assert len(result.rows) == 3
+    assert not result.truncated
+
+    # Chart queries have their own cap, their data is then downsampled
+    monkeypatch.setattr(config, "chart_query_max_rows", 30)
+    monkeypatch.setattr(config, "chart_max_points", 10)
+    result = execute_sql_query(db, "SELECT id, id FROM rentals", for_chart=True, chart_type=ChartType.line)
+    assert len(result.rows) == 10
+    assert result.rows[0] == (1, 1) and result.rows[-1] == (30, 30)
+    assert result.total_points == 30
+    assert result.truncated
+
+    result = execute_sql_query(db, "SELECT id, id FROM rentals LIMIT 5", for_chart=True, chart_type=ChartType.line)
+    assert len(result.rows) == 5
+    assert result.total_points is None
+
+
+@pytest.mark.parametrize(
+    "query,violation",
+    [
+        ("SELECT * FROM rentals;", None),
+        ("WITH a AS (SELECT 1) SELECT * FROM a", None),
+        ("(SELECT 1) UNION (SELECT 2)", None),
+        ("SELECT 'drop table', \"update\", created_at FROM rentals -- delete", None),
+        ("UPDATE rentals SET amount = 0", "Only SELECT queries can be run, the database is read only."),
+        ("SELECT 1; DROP TABLE rentals", "Only one statement can be run at a time."),
+        ("WITH a AS (DELETE FROM rentals RETURNING *) SELECT * FROM a", "DELETE is not allowed"),
+        ("SELECT * INTO backup FROM rentals", "INTO is not allowed"),
+        ("SELECT * FROM rentals FOR  SHARE", "FOR SHARE is not allowed"),
+        ("EXPLAIN ANALYZE DELETE FROM rentals", "ANALYZE is not allowed"),
+        ("EXPLAIN (ANALYZE, FORMAT JSON) SELECT 1", "ANALYZE is not allowed"),
+        ("EXPLAIN QUERY PLAN SELECT * FROM rentals", None),
+        ("EXPLAIN DELETE FROM rentals", "DELETE is not allowed"),
+        ("WITH a AS MATERIALIZED (UPDATE rentals SET amount = 0 RETURNING *) SELECT * FROM a", "UPDATE is not allowed"),
+        ("SELECT * FROM rentals FOR NO KEY UPDATE", "FOR NO KEY UPDATE is not allowed"),
+        # Write keywords used as names
+        ("select call from calls", None),
+        ("SELECT lock, copy, rename, analyze FROM events WHERE update_count > 0", None),
+        ("WITH lock AS (SELECT 1 AS delete) SELECT * FROM lock", None),
+    ],
+)
+def test_read_only_violation(query: str, violation: str | None) -> None:
+    if violation is None:
+        assert read_only_violation(query) is None
+    else:
+        assert violation in str(read_only_violation(query))
+
+
+def test_read_only_session(tmp_path: Path) -> None:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY)")
+    db = connect_database(get_sqlite_dsn(str(path)))
+
+    with pytest.raises(ReadOnlyRunException):
+        execute_sql_query(db, "DELETE FROM rentals")
+    # Writes are refused by the database itself too
+    with db._engine.connect() as connection, pytest.raises(OperationalError, match="readonly"):
+        connection.execute(text("INSERT INTO rentals (id) VALUES (1)"))
+    assert execute_sql_query(db, "SELECT COUNT(*) FROM rentals").rows == [(0,)]
+
+
+def test_convert_rows() -> None:
+    long_text = "word " * 10
+    rows = [
+        (1, "short", long_text, Decimal("2.50"), date(2024, 1, 31), 1),
+        (2, None, None, None, None, "mixed " * 10),
+    ]
+    assert convert_rows(rows, max_string_length=20) == [
+        (1, "short", "word word word...", 2.5, "2024-01-31", 1),
+        (2, None, None, None, None, "mixed mixed..."),
+    ]
+    assert convert_rows([], max_string_length=20) == []
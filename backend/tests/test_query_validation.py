@@ -0,0 +1,65 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from dataline.config import config
+from dataline.services.llm_flow.query_execution import connect_database
+from dataline.services.llm_flow.query_validation import (
+    QueryValidationRunException,
+    check_query,
+    validate_query,
+)
+from dataline.utils.utils import get_sqlite_dsn
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> SQLDatabase:
+    path = tmp_path / "test.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE rentals (id INTEGER PRIMARY KEY, customer_id INTEGER, amount REAL)")
+        connection.execute('CREATE TABLE "Customers" (id INTEGER PRIMARY KEY, name TEXT, created_at TEXT)')
+        connection.execute("CREATE VIEW big_rentals AS SELECT * FROM rentals WHERE amount > 100")
+    return connect_database(get_sqlite_dsn(str(path)))
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT r.amount, c.name FROM rentals r JOIN Customers AS c ON r.customer_id = c.id",
+        'SELECT "Customers".name FROM "Customers"',
+        "WITH totals AS (SELECT customer_id, SUM(amount) AS total FROM rentals GROUP BY 1) SELECT t.total FROM totals t",
+        "SELECT EXTRACT(YEAR FROM c.created_at) FROM Customers c",
+        "SELECT s.amount FROM (SELECT amount FROM rentals) s",
+        "SELECT 'FROM nowhere' FROM rentals WHERE id IN (SELECT customer_id FROM rentals)",
+        "SELECT * FROM rentals WHERE amount IS DISTINCT FROM customer_id",
+        "SELECT * FROM rentals WHERE amount IS NOT DISTINCT FROM customer_id",
+        "SELECT b.amount FROM big_rentals b JOIN Customers c ON b.customer_id = c.id",
+    ],
+)
+def test_validate_valid_query(db: SQLDatabase, query: str) -> None:
+    assert validate_query(db, query) is None
+
+
+@pytest.mark.parametrize(
+    "query,feedback",
+    [
+        ("SELECT * FROM rental", "Table rental does not exist. Available tables are the following, use them ONLY"),
+        ("SELECT * FROM rentals JOIN customer ON true", "Table customer does not exist"),
+        ("SELECT r.amout FROM rentals r", "Column amout does not exist in table rentals (referenced as r)"),
+        ("SELECT SUM(amount FROM rentals", "Unbalanced parentheses"),
+        ("SELECT * FROM rentals WHERE name = 'Bob", "Unterminated quote '"),
+    ],
+)
+def test_validate_invalid_query(db: SQLDatabase, query: str, feedback: str) -> None:
+    assert feedback in str(validate_query(db, query))
+
+
+def test_check_query_explain(db: SQLDatabase, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Unqualified columns are only caught by the database
+    check_query(db, "SELECT amout FROM rentals")
+
+    monkeypatch.setattr(config, "query_validation_explain", True)
+    with pytest.raises(QueryValidationRunException, match="could not compile the query: no such column: amout"):
+        check_query(db, "SELECT amout FROM rentals")
@@ -0,0 +1,56 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from dataline.config import config
+from dataline.utils.storage import (
+    BLOB_MIN_AGE_SECONDS,
+    BLOB_REFERENCE_PREFIX,
+    decode_payload,
+    delete_unreferenced_blobs,
+    encode_payload,
+    get_blob_directory,
+)
+
+
+@pytest.fixture(autouse=True)
+def storage_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "data_directory", str(tmp_path))
+    monkeypatch.setattr(config, "storage_compression_min_bytes", 100)
+    monkeypatch.setattr(config, "storage_blob_min_bytes", 1000)
+
+
+def test_encode_payload() -> None:
+    small = '{"rows": []}'
+    assert encode_payload(small) == small
+
+    medium = '{"rows": [' + ", ".join(f"[{i}, {i * 2}]" for i in range(50)) + "]}"
+    compressed = encode_payload(medium)
+    assert isinstance(compressed, bytes) and len(compressed) < len(medium)
+    assert decode_payload(compressed) == medium
+
+    large = '{"rows": [' + ", ".join(f'[{i}, "{os.urandom(8).hex()}"]' for i in range(500)) + "]}"
+    reference = encode_payload(large)
+    assert isinstance(reference, str) and reference.startswith(BLOB_REFERENCE_PREFIX)
+    assert decode_payload(reference) == large
+    # Identical payloads are stored once
+    assert encode_payload(large) == reference
+    assert len(list(get_blob_directory().glob("*/*"))) == 1
+
+
+def test_delete_unreferenced_blobs() -> None:
+    payloads = ['{"rows": [' + ", ".join(f'"{os.urandom(8).hex()}"' for _ in range(500)) + "]}" for _ in range(2)]
+    kept, deleted = [str(encode_payload(payload)) for payload in payloads]
+
+    # Recent blobs may belong to rows not committed yet
+    assert delete_unreferenced_blobs([kept]) == 0
+
+    old = time.time() - BLOB_MIN_AGE_SECONDS - 1
+    for path in get_blob_directory().glob("*/*"):
+        os.utime(path, (old, old))
+    assert delete_unreferenced_blobs([kept]) == 1
+    assert decode_payload(kept) == payloads[0]
+    with pytest.raises(FileNotFoundError):
+        decode_payload(deleted)
@@ -0,0 +1,39 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from dataline.services.llm_flow.usage import TokenUsage, estimate_usage, get_model_prices, usage_from_message
+
+
+def test_model_prices_match_longest_prefix() -> None:
+    assert get_model_prices("gpt-4o-2024-08-06") == get_model_prices("gpt-4o")
+    assert get_model_prices("gpt-4o-mini-2024-07-18") == get_model_prices("gpt-4o-mini")
+    assert get_model_prices("gpt-4o-mini") != get_model_prices("gpt-4o")
+    assert get_model_prices("llama3") is None
+
+
+def test_token_usage_cost() -> None:
+    usage = TokenUsage.for_model("gpt-3.5-turbo", 2_000_000, 1_000_000) + TokenUsage.for_model("llama3", 10, 10)
+    assert (usage.prompt_tokens, usage.completion_tokens) == (2_000_010, 1_000_010)
+    assert usage.cost_usd == pytest.approx(2.5)
+
+
+def test_estimate_usage() -> None:
+    usage = estimate_usage("gpt-3.5-turbo", "How many customers are there?", "SELECT COUNT(*) FROM customer")
+    assert usage.prompt_tokens > 0
+    assert usage.completion_tokens > 0
+
+
+def test_usage_from_message() -> None:
+    response = AIMessage(
+        content="",
+        response_metadata={
+            "token_usage": {"prompt_tokens": 1_000_000, "completion_tokens": 100_000, "total_tokens": 1_100_000},
+            "model_name": "gpt-4o-2024-08-06",
+        },
+    )
+    usage = usage_from_message("gpt-4o", response)
+    assert usage is not None
+    assert (usage.prompt_tokens, usage.completion_tokens) == (1_000_000, 100_000)
+    assert usage.cost_usd == pytest.approx(3.5)
+
+    assert usage_from_message("gpt-4o", AIMessage(content="")) is None
@@ -127,12 +127,19 @@ const FileDragAndDrop = ({
   );
 };
 
-type RadioValue = "database" | "sqlite" | "csv" | "sas7bdat" | null;
+type RadioValue =
+  | "database"
+  | "sqlite"
+  | "csv"
+  | "sas7bdat"
+  | "duckdb"
+  | null;
 const fileTypeLabel: { [K in Exclude<RadioValue, null | "database">]: string } =
   {
     sqlite: "SQLite data file",
     csv: "CSV file",
     sas7bdat: "sas7bdat file",
+    duckdb: "CSV or Parquet file",
   };
 
 const ConnectionCreator = ({ name = null }: { name: string | null }) => {
@@ -168,7 +175,9 @@ const ConnectionCreator = ({ name = null }: { name: string | null }) => {
     );
   };
 
-  const handleFileCreate = async (type: "sqlite" | "csv" | "sas7bdat") => {
+  const handleFileCreate = async (
+    type: "sqlite" | "csv" | "sas7bdat" | "duckdb"
+  ) => {
     if (!file) {
       enqueueSnackbar({
         variant: "info",
@@ -236,6 +245,12 @@ const ConnectionCreator = ({ name = null }: { name: string | null }) => {
             <Radio value="sas7bdat" color="white" />
             <Label className="cursor-pointer">sas7bdat file</Label>
           </RadioField>
+          <RadioField>
+            <Radio value="duckdb" color="white" />
+            <Label className="cursor-pointer">
+              CSV or Parquet file (DuckDB, faster for large files)
+            </Label>
+          </RadioField>
         </RadioGroup>
       </Fieldset>
       <div className="mt-10 max-w-2xl">
@@ -144,7 +144,7 @@ export function useCreateFileConnection(options = {}) {
     }: {
       file: File;
       name: string;
-      type: "sqlite" | "csv" | "sas7bdat";
+      type: "sqlite" | "csv" | "sas7bdat" | "duckdb";
     }) => api.createFileConnection(file, name, type),
     onSettled() {
       queryClient.invalidateQueries({